@@ -1,28 +1,73 @@
 # 修改导入语句，添加g对象
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g, send_from_directory, abort, make_response
 from flask_bcrypt import Bcrypt
+import hashlib
 import sqlite3
 import os
 from datetime import datetime, timedelta
 import random
 from functools import wraps
-from config import Config
-from werkzeug.utils import secure_filename
+from config import Config, config
 import uuid
+import sys
+import click
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from utils import db as db_pool
+from utils import assets, avatars, compression, group_commit, profiling, report_cache, seed
+from utils.report_cache import report_key
+from utils.migrations import migrate
+from database import CheckinDB, DailyStatsDB, FocusSessionDB, ReportDB, StatsDB
+from utils.i18n import TranslationCatalogs, compile_all, get_gettext
+from utils.log import configure_logging, get_logger
+
+logger = get_logger(__name__)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['DATABASE'] = os.path.join(app.root_path, 'focusflow.db')
 app.config['LANGUAGES'] = Config.LANGUAGES
 app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static', 'uploads', 'avatars')
 app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file size
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+# 根据环境变量选择配置（FOCUSFLOW_CONFIG=production 等）
+active_config = config.get(os.environ.get('FOCUSFLOW_CONFIG', 'default'), Config)
+app.config['DATABASE'] = active_config.DATABASE
+app.config['DB_POOL_SIZE'] = active_config.DB_POOL_SIZE
+app.config['SQLITE_PRAGMAS'] = active_config.SQLITE_PRAGMAS
+app.config['SQLITE_CACHED_STATEMENTS'] = active_config.SQLITE_CACHED_STATEMENTS
+app.config['WRITE_RETRY_DEADLINE'] = active_config.WRITE_RETRY_DEADLINE
+app.config['WRITE_RETRY_BASE_DELAY'] = active_config.WRITE_RETRY_BASE_DELAY
+app.config['WRITE_RETRY_MAX_DELAY'] = active_config.WRITE_RETRY_MAX_DELAY
+app.config['FOCUS_GROUP_COMMIT'] = active_config.FOCUS_GROUP_COMMIT
+app.config['GROUP_COMMIT_WINDOW_MS'] = active_config.GROUP_COMMIT_WINDOW_MS
+app.config['GROUP_COMMIT_MAX_BATCH'] = active_config.GROUP_COMMIT_MAX_BATCH
+app.config['GROUP_COMMIT_SYNCHRONOUS'] = active_config.GROUP_COMMIT_SYNCHRONOUS
+app.config['LOG_LEVEL'] = active_config.LOG_LEVEL
+app.config['LOG_FORMAT'] = active_config.LOG_FORMAT
+app.config['LOG_DEBUG_SAMPLE_RATE'] = active_config.LOG_DEBUG_SAMPLE_RATE
+configure_logging(app)
+app.config['SQL_INSTRUMENTATION'] = active_config.SQL_INSTRUMENTATION
+app.config['SQL_N_PLUS_ONE_THRESHOLD'] = active_config.SQL_N_PLUS_ONE_THRESHOLD
+app.config['AVATAR_FORMAT'] = active_config.AVATAR_FORMAT
+app.config['AVATAR_GC_INTERVAL'] = active_config.AVATAR_GC_INTERVAL
+app.config['AVATAR_GC_GRACE'] = active_config.AVATAR_GC_GRACE
+app.config['AVATAR_MAX_DIMENSION'] = active_config.AVATAR_MAX_DIMENSION
+app.config['ASSETS_USE_MANIFEST'] = active_config.ASSETS_USE_MANIFEST
+app.config['COMPRESS_ENABLED'] = active_config.COMPRESS_ENABLED
+app.config['COMPRESS_MIN_SIZE'] = active_config.COMPRESS_MIN_SIZE
+app.config['COMPRESS_LEVEL'] = active_config.COMPRESS_LEVEL
+app.config['COMPRESS_BR_QUALITY'] = active_config.COMPRESS_BR_QUALITY
+app.config['COMPRESS_MIMETYPES'] = active_config.COMPRESS_MIMETYPES
+app.config['REPORT_CACHE_BACKEND'] = active_config.REPORT_CACHE_BACKEND
+app.config['REPORT_CACHE_SIZE'] = active_config.REPORT_CACHE_SIZE
+app.config['REPORT_CACHE_TTL'] = active_config.REPORT_CACHE_TTL
+app.config['REPORT_CACHE_PATH'] = active_config.REPORT_CACHE_PATH
 
 bcrypt = Bcrypt(app)
-
-def allowed_file(filename):
-    """Check if the file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# 压缩最先注册，after_request 按注册的逆序执行，它最后处理最终的响应
+compression.init_app(app)
+db_pool.init_app(app)
+profiling.init_app(app)
+assets.init_app(app)
+report_cache.init_app(app)
 
 def get_current_lang() -> str:
     """Get current language from query param or session, defaulting to en-US."""
@@ -39,38 +84,33 @@ def inject_i18n():
         supported_languages=app.config['LANGUAGES'],
         lang=lang,
         translations=get_translations(lang),
+        _=get_gettext(lang).gettext,
     )
 
 
-print("=== FocusFlow应用启动 ===")
-print(f"数据库路径: {app.config['DATABASE']}")
+logger.info('=== FocusFlow应用启动 ===')
+logger.info('数据库路径: %s', app.config['DATABASE'])
 
 
 # 数据库连接函数
 def get_db_connection():
-    print("[调试] 尝试连接数据库...")
-    try:
-        conn = sqlite3.connect(app.config['DATABASE'])
-        conn.row_factory = sqlite3.Row
-        print("[调试] 数据库连接成功")
-        return conn
-    except Exception as e:
-        print(f"[调试] 数据库连接失败: {str(e)}")
-        raise
+    """返回当前请求共享的数据库连接（来自连接池，请求结束时自动归还）"""
+    return db_pool.get_db()
 
 
 # 初始化数据库
 def init_db():
-    print("[调试] 初始化数据库...")
+    logger.debug('初始化数据库...')
     try:
         conn = get_db_connection()
         schema_path = os.path.join(os.path.dirname(__file__), 'schema.sql')
         with open(schema_path, 'r', encoding='utf-8') as f:
             conn.executescript(f.read())
         conn.commit()
-        print("[调试] 数据库初始化成功")
+        migrate(conn)
+        logger.debug('数据库初始化成功')
     except Exception as e:
-        print(f"[调试] 数据库初始化失败: {str(e)}")
+        logger.exception('数据库初始化失败: %s', e)
         raise
     finally:
         conn.close()
@@ -79,14 +119,137 @@ def init_db():
 # 创建所需的数据库表
 @app.cli.command('init-db')
 def init_db_command():
-    print("[调试] 执行init-db命令...")
+    logger.debug('执行init-db命令...')
     init_db()
     print('Initialized the database.')
 
 
-# 语言支持
-def get_translations(lang='en-US'):
-    # print(f"[调试] 获取语言翻译，语言: {lang}")
+# 从明细表重新计算 user_stats（修复统计漂移）
+@app.cli.command('rebuild-stats')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user.')
+def rebuild_stats_command(user_id):
+    conn = get_db_connection()
+    StatsDB.rebuild(user_id, conn)
+    conn.commit()
+    print('Rebuilt user statistics.')
+
+
+# 从明细表重新计算每日汇总 daily_user_stats（回填或修复漂移）
+@app.cli.command('rebuild-daily-stats')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user.')
+def rebuild_daily_stats_command(user_id):
+    conn = get_db_connection()
+    DailyStatsDB.rebuild(user_id, conn)
+    conn.commit()
+    print('Rebuilt daily statistics.')
+
+
+# 预先生成报告页缓存（共享的 sqlite 后端可供所有工作进程使用；memory 后端只对当前进程有效）
+@app.cli.command('warm-report-cache')
+@click.option('--user-id', type=int, default=None, help='Only warm this user.')
+@click.option('--lang', default='en-US', show_default=True)
+def warm_report_cache_command(user_id, lang):
+    cache = app.extensions.get('report_cache')
+    if cache is None:
+        raise click.ClickException('REPORT_CACHE_BACKEND is none.')
+    if app.config['REPORT_CACHE_BACKEND'] == 'memory':
+        print('Warning: the memory backend only lives in this process; use REPORT_CACHE_BACKEND=sqlite.')
+    conn = get_db_connection()
+    query = 'SELECT user_id, data_version FROM user_stats'
+    rows = conn.execute(query + ' WHERE user_id = ?', (user_id,)) if user_id else conn.execute(query)
+    today = datetime.now().date()
+    for row in rows.fetchall():
+        weekly_report(row['user_id'], lang, today, row['data_version'], conn)
+    stats = cache.stats()
+    print(f"Warmed reports: {stats['misses']} built, {stats['hits']} already cached, {stats['entries']} entries.")
+
+
+# 校验 user_stats 中的连续签到状态是否与签到明细一致（--fix 时重建不一致的用户）
+@app.cli.command('verify-streaks')
+@click.option('--fix', is_flag=True, help='Rebuild statistics for mismatched users.')
+def verify_streaks_command(fix):
+    conn = get_db_connection()
+    mismatches = StatsDB.verify_streaks(conn)
+    for row in mismatches:
+        print(f"user {row['user_id']}: current {row['current_streak']} (expected {row['expected_current_streak']}), "
+              f"longest {row['longest_streak']} (expected {row['expected_longest_streak']}), "
+              f"last {row['last_checkin_date']} (expected {row['expected_last_checkin_date']})")
+        if fix:
+            StatsDB.rebuild(row['user_id'], conn)
+    if fix:
+        conn.commit()
+    print(f'{len(mismatches)} mismatched user(s).')
+    if mismatches and not fix:
+        sys.exit(1)
+
+
+# 校验每日汇总是否与专注记录、任务和签到明细一致（--fix 时重建不一致的用户）
+@app.cli.command('verify-daily-stats')
+@click.option('--fix', is_flag=True, help='Rebuild daily statistics for mismatched users.')
+def verify_daily_stats_command(fix):
+    conn = get_db_connection()
+    mismatches = DailyStatsDB.verify(conn)
+    for row in mismatches:
+        print(f"user {row['user_id']} {row['day']}: "
+              f"focus {row['focus_minutes']} (expected {row['expected_focus_minutes']}), "
+              f"sessions {row['sessions']} (expected {row['expected_sessions']}), "
+              f"completed {row['completed_tasks']} (expected {row['expected_completed_tasks']}), "
+              f"checked in {row['checked_in']} (expected {row['expected_checked_in']})")
+    users = sorted({row['user_id'] for row in mismatches})
+    if fix:
+        for user_id in users:
+            DailyStatsDB.rebuild(user_id, conn)
+        conn.commit()
+    print(f'{len(mismatches)} mismatched day(s) for {len(users)} user(s).')
+    if mismatches and not fix:
+        sys.exit(1)
+
+
+# 为上传时尚未生成缩略图的头像（包括旧版本上传的原图）补生成缩略图
+@app.cli.command('process-avatars')
+def process_avatars_command():
+    if avatars.Image is None:
+        print('Pillow is not installed; avatars are served as uploaded.')
+        sys.exit(1)
+    rows = get_db_connection().execute(
+        "SELECT id, profile_picture FROM users WHERE profile_picture IS NOT NULL AND profile_picture != ''"
+    ).fetchall()
+    processed = 0
+    for row in rows:
+        if not avatars.is_processed(row['profile_picture']):
+            if avatars.process_upload(app, row['id'], row['profile_picture']):
+                processed += 1
+    print(f'Processed {processed} avatar(s).')
+
+
+# 删除没有用户引用的头像文件（上传后也会在后台定期执行）
+@app.cli.command('avatars-gc')
+@click.option('--grace', type=int, default=None, help='Keep unreferenced files younger than this many seconds.')
+def avatars_gc_command(grace):
+    removed = avatars.collect_garbage(app, grace)
+    print(f'Removed {removed} unreferenced avatar file(s).')
+
+
+# 对已有数据库执行尚未应用的迁移
+@app.cli.command('migrate-db')
+def migrate_db_command():
+    applied = migrate(get_db_connection())
+    print(f'Applied {applied} migration(s).')
+
+
+# 性能基准命令（flask bench ...）
+from bench import bench_cli
+app.cli.add_command(bench_cli)
+
+# 静态资源构建命令（flask assets build）
+app.cli.add_command(assets.assets_cli)
+
+# 生成模拟数据集（flask seed）
+app.cli.add_command(seed.seed_command)
+
+
+# 语言支持：原始翻译表（只在进程内第一次用到时构建一次）
+def _translation_tables():
     translations = {
         'en-US': {
             'welcome': 'Welcome',
@@ -1838,48 +2001,154 @@ def get_translations(lang='en-US'):
             'focus_session_save_failed': "Échec de l'enregistrement de la session"
         }
     }
-    
-    # 使用英语作为默认回退
-    result = translations['en-US'].copy()
-    if lang in translations and lang != 'en-US':
-        result.update(translations[lang])
-        
-    # print(f"[调试] 语言翻译获取成功，返回了{len(result)}个翻译项")
-    return result
+    return translations
+
+
+# 每种语言合并英语回退后冻结缓存，同一请求内多次调用返回同一个只读对象
+translation_catalogs = TranslationCatalogs(_translation_tables, fallback='en-US')
+app.extensions['i18n'] = translation_catalogs
+
+
+def get_translations(lang='en-US'):
+    return translation_catalogs.get(lang)
+
+
+# 前端翻译脚本的地址带有翻译表版本号，文案变化后地址随之变化
+@app.template_global()
+def translations_url(lang):
+    if lang not in app.config['LANGUAGES']:
+        lang = translation_catalogs.fallback
+    return url_for('translations_script', lang=lang, version=translation_catalogs.version(lang))
+
+
+# 编译 translations/ 下的 .po 文件（供模板中的 _() 使用）
+@app.cli.command('i18n-compile')
+def i18n_compile_command():
+    for mo_path in compile_all():
+        print(f'Compiled {mo_path}')
 
 
 # 身份验证装饰器
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        print(f"[调试] 验证用户登录状态，session中的user_id: {session.get('user_id')}")
+        logger.debug('验证用户登录状态，session中的user_id: %s', session.get('user_id'))
         if 'user_id' not in session:
-            print("[调试] 用户未登录，重定向到登录页面")
+            logger.debug('用户未登录，重定向到登录页面')
             return redirect(url_for('login'))
-        print("[调试] 用户已登录，继续执行请求")
+        logger.debug('用户已登录，继续执行请求')
         return f(*args, **kwargs)
 
     return decorated_function
 
 
+# 模板和代码的版本：部署后页面结构可能变化，需要让旧的 ETag 失效
+def _build_version():
+    template_dir = os.path.join(app.root_path, app.template_folder)
+    paths = [os.path.join(app.root_path, 'app.py'), os.path.join(app.root_path, 'database.py')]
+    paths += [os.path.join(template_dir, name) for name in sorted(os.listdir(template_dir))]
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f'{os.path.basename(path)}:{stat.st_mtime_ns}:{stat.st_size};'.encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+BUILD_VERSION = _build_version()
+
+
+def current_user_stats():
+    """当前登录用户的 user_stats 行：优先使用 before_request 已经读取的行，缺失时按明细重建
+
+    只在只读视图中使用；写操作之后这一行就过时了。
+    """
+    stats = g.get('user_stats')
+    if stats is None:
+        stats = g.user_stats = StatsDB.get(session['user_id'])
+    return stats
+
+
+def user_data_etag():
+    """当前用户页面数据的 ETag：数据版本、语言（及翻译版本）、当天日期和时段、部署版本任一变化都会改变它
+
+    数据版本来自 before_request 已经读取的 user_stats 行，计算 ETag 不需要额外查询；
+    时段对应仪表盘问候语的上午 / 下午 / 晚上。
+    """
+    data_version = g.get('data_version')
+    if data_version is None:
+        return None
+    lang = get_current_lang()
+    if lang not in app.config['LANGUAGES']:
+        lang = translation_catalogs.fallback
+    now = datetime.now()
+    period = 0 if now.hour < 12 else 1 if now.hour < 18 else 2
+    parts = (session['user_id'], data_version, lang, translation_catalogs.version(lang),
+             now.strftime('%Y-%m-%d'), period, BUILD_VERSION)
+    return hashlib.sha1(':'.join(map(str, parts)).encode('utf-8')).hexdigest()[:16]
+
+
+def conditional_on_user_data(f):
+    """用户数据未变化时直接返回 304，跳过视图中的聚合查询和模板渲染
+
+    有待显示的闪现消息时照常渲染且不带 ETag，避免浏览器缓存带消息的页面。
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        etag = None if '_flashes' in session else user_data_etag()
+        if etag is not None and request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = make_response(f(*args, **kwargs))
+            if etag is None or response.status_code != 200:
+                return response
+        # 弱 ETag：压缩后的响应与原文共用同一个 ETag
+        response.set_etag(etag, weak=True)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
+    return decorated_function
+
+
 # 在文件顶部导入辅助函数
 from utils.helpers import generate_avatar_data
 
 
+# 模板中按显示尺寸（CSS 像素）选用头像缩略图，按 2 倍像素密度取不小于它的最小一档
+@app.template_global()
+def avatar_url(name, size):
+    return url_for('avatar_file', filename=avatars.avatar_variant(name, size * 2))
+
+
+# 这些路由只返回文件，不渲染模板，不需要加载用户信息（也不应写入会话 Cookie）
+_ASSET_ENDPOINTS = {'static', 'avatar_file', 'translations_script'}
+
+
 @app.before_request
 def before_request():
+    if request.endpoint in _ASSET_ENDPOINTS:
+        return
     # 如果用户已登录，为模板全局上下文添加头像数据
     if 'user_id' in session:
         lang = get_current_lang()
         translations = get_translations(lang)
         conn = get_db_connection()
         try:
-            user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
+            # 用户信息和完整的累计统计通过一次主键查询取回（两张表的列名不重复）
+            user = conn.execute('''
+                SELECT u.*, s.*
+                FROM users u LEFT JOIN user_stats s ON s.user_id = u.id
+                WHERE u.id = ?
+            ''', (session['user_id'],)).fetchone()
             if user:
+                # 用户数据版本，供条件请求（ETag）使用
+                g.data_version = user['data_version']
+                # 统计行缺失（s.user_id 为空）时由 current_user_stats() 按明细重建
+                if user['user_id'] is not None:
+                    g.user_stats = user
                 # 添加调试信息，显示用户的具体姓名信息
-                print(f"[调试] 用户ID: {session['user_id']}")
-                print(f"[调试] 用户信息: {dict(user)}")
-                
+                logger.debug('用户ID: %s', session['user_id'])
+                    
                 # 调用generate_avatar_data函数生成头像数据
                 initials, user_avatar_color = generate_avatar_data(user)
                 # 将头像数据添加到g对象，使其在所有模板中可用
@@ -1892,7 +2161,7 @@ def before_request():
                 except (KeyError, TypeError):
                     g.user_profile_picture = None
                 
-                print(f"[调试] 生成的头像字母: {initials}")
+                logger.debug('生成的头像字母: %s', initials)
 
                 # 添加用户真实姓名到g对象
                 try:
@@ -1905,31 +2174,25 @@ def before_request():
                         # 直接访问字段，如果不存在会抛出KeyError
                         first_name = str(user['first_name']).strip()
                         last_name = str(user['last_name']).strip()
-                        print(f"[调试] before_request: 字典式访问成功 - 名字: '{first_name}', 姓氏: '{last_name}'")
+                        logger.debug("before_request: 字典式访问成功 - 名字: '%s', 姓氏: '%s'", first_name, last_name)
                     except (KeyError, TypeError) as e:
-                        print(f"[调试] before_request: 字典式访问失败: {str(e)}，尝试属性式访问")
+                        logger.debug('before_request: 字典式访问失败: %s，尝试属性式访问', e)
                         # 方法2：属性式访问（适用于对象）
                         if hasattr(user, 'first_name'):
                             first_name = str(getattr(user, 'first_name', '')).strip()
                         if hasattr(user, 'last_name'):
                             last_name = str(getattr(user, 'last_name', '')).strip()
-                        print(f"[调试] before_request: 属性式访问结果 - 名字: '{first_name}', 姓氏: '{last_name}'")
+                        logger.debug("before_request: 属性式访问结果 - 名字: '%s', 姓氏: '%s'", first_name, last_name)
                     
                     # 组合成完整姓名
                     g.user_name = f"{first_name} {last_name}".strip() if first_name or last_name else "User"
                 except Exception as e:
-                    print(f"[调试] 获取用户姓名时出错: {str(e)}")
+                    logger.warning('获取用户姓名时出错: %s', e)
                     g.user_name = "User"
                 
-                # 计算总学习时间
+                # 计算总学习时间（来自 user_stats，缺失时按明细重建）
                 try:
-                    total_stats = conn.execute('''
-                        SELECT SUM(duration) as total_minutes
-                        FROM focus_sessions
-                        WHERE user_id = ? AND end_time IS NOT NULL
-                    ''', (session['user_id'],)).fetchone()
-                    
-                    total_minutes = total_stats['total_minutes'] or 0
+                    total_minutes = current_user_stats()['total_focus_minutes']
                     hours = total_minutes // 60
                     minutes = total_minutes % 60
                     
@@ -1938,7 +2201,7 @@ def before_request():
                     else:
                         g.total_study_time = f"{minutes}{translations.get('min', 'min')}"
                 except Exception as e:
-                    print(f"[调试] before_request出错: {str(e)}")
+                    logger.exception('before_request出错: %s', e)
                     # 发生错误时不做处理，让模板使用默认值
                     pass
         finally:
@@ -1952,7 +2215,7 @@ def before_request():
 # 路由：登录
 @app.route('/login', methods=['GET', 'POST'])
 def login():
-    print("[调试] 访问登录页面")
+    logger.debug('访问登录页面')
     lang = get_current_lang()
     translations = get_translations(lang)
 
@@ -1966,7 +2229,7 @@ def login():
 
         # 将答案保存到session中
         session['captcha_answer'] = captcha_answer
-        print(f"[调试] 生成验证码: {captcha_question}, 答案: {captcha_answer}")
+        logger.debug('生成验证码: %s, 答案: %s', captcha_question, captcha_answer)
         # 添加GET请求时的返回语句
         return render_template('login.html', translations=translations, lang=lang, captcha_question=captcha_question)
     else:
@@ -1974,19 +2237,19 @@ def login():
         captcha_question = f"{session.get('num1', 0)} + {session.get('num2', 0)} = ?"
 
     if request.method == 'POST':
-        print("[调试] 处理登录POST请求")
+        logger.debug('处理登录POST请求')
         phone = request.form.get('phone')
         password = request.form.get('password')
         user_captcha = request.form.get('captcha')
 
-        print(f"[调试] 登录请求参数 - phone: {phone}, captcha: {user_captcha}")
+        logger.debug('登录请求参数 - phone: %s, captcha: %s', phone, user_captcha)
 
         # 从session中获取正确答案进行验证
         correct_answer = session.get('captcha_answer', '')
-        print(f"[调试] 验证验证码 - 用户输入: {user_captcha}, 正确答案: {correct_answer}")
+        logger.debug('验证验证码 - 用户输入: %s, 正确答案: %s', user_captcha, correct_answer)
 
         if user_captcha != correct_answer:
-            print("[调试] 验证码错误")
+            logger.debug('验证码错误')
             flash('Captcha answer WRONG!')
             # 生成新的验证码
             import random
@@ -2000,26 +2263,26 @@ def login():
 
         conn = get_db_connection()
         try:
-            print("[调试] 查询用户信息")
+            logger.debug('查询用户信息')
             user = conn.execute('SELECT * FROM users WHERE phone = ?', (phone,)).fetchone()
 
             if user:
-                print(f"[调试] 找到用户: {user['phone']}")
+                logger.debug('找到用户: %s', user['phone'])
                 if bcrypt.check_password_hash(user['password'], password):
-                    print("[调试] 密码验证成功，设置用户会话")
+                    logger.debug('密码验证成功，设置用户会话')
                     session['user_id'] = user['id']
                     # 登录成功后清除验证码
                     session.pop('captcha_answer', None)
                     flash('Login SUCCESS!')
                     return redirect(url_for('dashboard', lang=lang))
                 else:
-                    print("[调试] 密码验证失败")
+                    logger.debug('密码验证失败')
                     flash('Password WRONG!')
             else:
-                print("[调试] 未找到用户")
+                logger.debug('未找到用户')
                 flash('User NOT FOUND!')
         except Exception as e:
-            print(f"[调试] 登录过程中出现错误: {str(e)}")
+            logger.exception('登录过程中出现错误: %s', e)
             flash('Login FAILED! Please try again.')
         finally:
             conn.close()
@@ -2039,12 +2302,12 @@ def login():
 # 路由：注册
 @app.route('/register', methods=['GET', 'POST'])
 def register():
-    print("[调试] 访问注册页面")
+    logger.debug('访问注册页面')
     lang = get_current_lang()
     translations = get_translations(lang)
 
     if request.method == 'POST':
-        print("[调试] 处理注册POST请求")
+        logger.debug('处理注册POST请求')
         phone = request.form.get('phone')
         first_name = request.form.get('first_name')
         last_name = request.form.get('last_name')
@@ -2053,46 +2316,50 @@ def register():
         password = request.form.get('password')
         confirm_password = request.form.get('confirm_password')
 
-        print(f"[调试] 注册请求参数 - phone: {phone}, first_name: {first_name}, last_name: {last_name}, email: {email}")
+        logger.debug('注册请求参数 - phone: %s, first_name: %s, last_name: %s, email: %s', phone, first_name, last_name, email)
 
         if password != confirm_password:
-            print("[调试] 两次输入的密码不一致")
+            logger.debug('两次输入的密码不一致')
             flash('Two passwords do NOT match!')
             return redirect(url_for('register', lang=lang))
 
         conn = get_db_connection()
         try:
-            print("[调试] 检查手机号是否已被注册")
+            logger.debug('检查手机号是否已被注册')
             existing_user = conn.execute('SELECT * FROM users WHERE phone = ?', (phone,)).fetchone()
             if existing_user:
-                print("[调试] 手机号已被注册")
+                logger.debug('手机号已被注册')
                 flash('This phone number has already been registered!')
                 return redirect(url_for('register', lang=lang))
-                print("[调试] 检查邮箱是否已被注册")
+                logger.debug('检查邮箱是否已被注册')
             existing_email = conn.execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
             if existing_email:
-                print("[调试] 邮箱已被注册")
+                logger.debug('邮箱已被注册')
                 flash('This email has already been registered!')
                 return redirect(url_for('register', lang=lang))
 
-            print("[调试] 密码加密")
+            logger.debug('密码加密')
             hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
 
-            print("[调试] 插入新用户记录")
-            conn.execute('''
-                INSERT INTO users (phone, first_name, last_name, email, education_level, password)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (phone, first_name, last_name, email, education_level, hashed_password))
-            conn.commit()
+            logger.debug('插入新用户记录')
+            def insert_user(conn):
+                user_id = conn.execute('''
+                    INSERT INTO users (phone, first_name, last_name, email, education_level, password)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (phone, first_name, last_name, email, education_level, hashed_password)).lastrowid
+                # 新用户的统计全为 0，同时写入，首次访问页面时不必从明细重建
+                conn.execute('INSERT INTO user_stats (user_id) VALUES (?)', (user_id,))
+                return user_id
 
-            print("[调试] 注册成功，获取新用户ID")
-            user = conn.execute('SELECT * FROM users WHERE phone = ?', (phone,)).fetchone()
-            session['user_id'] = user['id']
+            user_id = db_pool.write_transaction(insert_user, conn)
+
+            logger.debug('注册成功，新用户ID: %s', user_id)
+            session['user_id'] = user_id
 
             flash('Registration SUCCESS!')
             return redirect(url_for('dashboard', lang=lang))
         except Exception as e:
-            print(f"[调试] 注册过程中出现错误: {str(e)}")
+            logger.exception('注册过程中出现错误: %s', e)
             flash('Registration FAILED! Please try again.')
         finally:
             conn.close()
@@ -2106,23 +2373,23 @@ def register():
 # 路由：忘记密码
 @app.route('/forgot_password', methods=['GET', 'POST'])
 def forgot_password():
-    print("[调试] 访问忘记密码页面")
+    logger.debug('访问忘记密码页面')
     lang = get_current_lang()
     translations = get_translations(lang)
 
     if request.method == 'POST':
-        print("[调试] 处理忘记密码POST请求")
+        logger.debug('处理忘记密码POST请求')
         phone = request.form.get('phone')
         last_name = request.form.get('last_name')
         first_name = request.form.get('first_name')
         school = request.form.get('school')
         email = request.form.get('email')
 
-        print(f"[调试] 忘记密码请求参数 - phone: {phone}, last_name: {last_name}, first_name: {first_name}, school: {school}, email: {email}")
+        logger.debug('忘记密码请求参数 - phone: %s, last_name: %s, first_name: %s, school: %s, email: %s', phone, last_name, first_name, school, email)
 
         conn = get_db_connection()
         try:
-            print("[调试] 查询用户信息")
+            logger.debug('查询用户信息')
             # 修改SQL查询，增加对姓名等信息的验证
             user = conn.execute('''
                 SELECT * FROM users 
@@ -2130,14 +2397,14 @@ def forgot_password():
             ''', (phone, last_name, first_name)).fetchone()
 
             if user:
-                print("[调试] 找到用户，模拟发送重置密码邮件/SMS")
+                logger.debug('找到用户，模拟发送重置密码邮件/SMS')
                 # 这里应该发送重置密码的邮件或短信
                 flash('Processing SUCCESS!')
             else:
-                print("[调试] 未找到用户或信息不匹配")
+                logger.debug('未找到用户或信息不匹配')
                 flash('Phone number or name does NOT match!')
         except Exception as e:
-            print(f"[调试] 处理忘记密码请求时出现错误: {str(e)}")
+            logger.exception('处理忘记密码请求时出现错误: %s', e)
             flash('Processing FAILED! Please try again.')
         finally:
             conn.close()
@@ -2147,7 +2414,7 @@ def forgot_password():
 # 路由：验证手机号（AJAX接口）
 @app.route('/verify_phone', methods=['POST'])
 def verify_phone():
-    print("[调试] 验证手机号")
+    logger.debug('验证手机号')
     translations = get_translations(get_current_lang())
     data = request.get_json()
     phone = data.get('phone')
@@ -2157,11 +2424,11 @@ def verify_phone():
     
     conn = get_db_connection()
     try:
-        print(f"[调试] 查询手机号: {phone}")
+        logger.debug('查询手机号: %s', phone)
         user = conn.execute('SELECT * FROM users WHERE phone = ?', (phone,)).fetchone()
         
         if user:
-            print("[调试] 找到用户，返回用户信息")
+            logger.debug('找到用户，返回用户信息')
             return jsonify({
                 'success': True,
                 'user': {
@@ -2173,10 +2440,10 @@ def verify_phone():
                 }
             })
         else:
-            print("[调试] 未找到用户")
+            logger.debug('未找到用户')
             return jsonify({'success': False, 'message': translations.get('phone_not_found', 'Phone number not found. Please check and try again.')})
     except Exception as e:
-        print(f"[调试] 验证手机号时出现错误: {str(e)}")
+        logger.exception('验证手机号时出现错误: %s', e)
         return jsonify({'success': False, 'message': translations.get('generic_error_try_again', 'An error occurred. Please try again.')})
     finally:
         conn.close()
@@ -2184,7 +2451,7 @@ def verify_phone():
 # 路由：重置密码（AJAX接口）
 @app.route('/reset_password', methods=['POST'])
 def reset_password():
-    print("[调试] 重置密码")
+    logger.debug('重置密码')
     translations = get_translations(get_current_lang())
     data = request.get_json()
     phone = data.get('phone')
@@ -2199,23 +2466,23 @@ def reset_password():
     
     conn = get_db_connection()
     try:
-        print(f"[调试] 查询用户: {phone}")
+        logger.debug('查询用户: %s', phone)
         user = conn.execute('SELECT * FROM users WHERE phone = ?', (phone,)).fetchone()
         
         if not user:
             return jsonify({'success': False, 'message': translations.get('user_not_found', 'User not found')})
         
-        print("[调试] 加密新密码")
+        logger.debug('加密新密码')
         hashed_password = bcrypt.generate_password_hash(new_password).decode('utf-8')
         
-        print("[调试] 更新密码")
-        conn.execute('UPDATE users SET password = ? WHERE phone = ?', (hashed_password, phone))
-        conn.commit()
+        logger.debug('更新密码')
+        db_pool.write_transaction(
+            lambda conn: conn.execute('UPDATE users SET password = ? WHERE phone = ?', (hashed_password, phone)), conn)
         
-        print("[调试] 密码重置成功")
+        logger.debug('密码重置成功')
         return jsonify({'success': True, 'message': translations.get('password_reset_success', 'Password reset successfully')})
     except Exception as e:
-        print(f"[调试] 重置密码时出现错误: {str(e)}")
+        logger.exception('重置密码时出现错误: %s', e)
         return jsonify({'success': False, 'message': translations.get('password_reset_failed', 'Password reset failed. Please try again.')})
     finally:
         conn.close()
@@ -2228,8 +2495,9 @@ def reset_password():
 # 路由：仪表盘
 @app.route('/dashboard')
 @login_required
+@conditional_on_user_data
 def dashboard():
-    print("[调试] 访问仪表盘页面")
+    logger.debug('访问仪表盘页面')
     lang = get_current_lang()
     translations = get_translations(lang)
 
@@ -2253,11 +2521,11 @@ def dashboard():
         else:
             greeting = f"{translations['good_evening']}, {user_name}!"
 
-        print(f"[调试] 获取用户 {user_id} 的任务列表")
+        logger.debug('获取用户 %s 的任务列表', user_id)
         tasks = conn.execute('SELECT * FROM tasks WHERE user_id = ? ORDER BY due_date ASC LIMIT 5',
                              (user_id,)).fetchall()
         
-        print(f"[调试] 获取用户 {user_id} 的签到信息")
+        logger.debug('获取用户 %s 的签到信息', user_id)
         today = datetime.now().strftime('%Y-%m-%d')
         has_checked_in = conn.execute('SELECT * FROM checkins WHERE user_id = ? AND date = ?',
                                       (user_id, today)).fetchone() is not None
@@ -2266,124 +2534,47 @@ def dashboard():
         # 获取今天的日期
         today_date = datetime.now().date()
         today_str = today_date.strftime('%Y-%m-%d')
+        tomorrow_str = (today_date + timedelta(days=1)).strftime('%Y-%m-%d')
 
-        # 获取今天的任务数量
+        # 获取今天的任务数量（半开区间 [今天, 明天)，可以命中 (user_id, due_date) 索引）
         today_tasks_query = conn.execute('''
-            SELECT * FROM tasks WHERE user_id = ? AND date(due_date) = ?
-        ''', (user_id, today_str)).fetchall()
+            SELECT * FROM tasks WHERE user_id = ? AND due_date >= ? AND due_date < ?
+        ''', (user_id, today_str, tomorrow_str)).fetchall()
 
         # 计算已完成和总任务数
         completed_today = sum(1 for task in today_tasks_query if task['status'] == 'completed')
         total_today = len(today_tasks_query)
         task_progress_percentage = (completed_today / total_today * 100) if total_today > 0 else 0
-        # 获取连续签到天数
-        streak_days = 0
-        checkin_dates = conn.execute('''
-            SELECT date FROM checkins WHERE user_id = ? ORDER BY date DESC
-        ''', (user_id,)).fetchall()
-
-        if checkin_dates:
-            current_date = datetime.now().date()
-            for checkin_date in checkin_dates:
-                checkin_date_obj = datetime.strptime(checkin_date['date'], '%Y-%m-%d').date()
-                if (current_date - checkin_date_obj).days == streak_days:
-                    streak_days += 1
-                else:
-                    break
+        # 获取连续签到天数（before_request 已经读取了统计行）
+        streak_days = CheckinDB.streak_from_stats(current_user_stats())['current']
 
-        # 获取本周专注时长（小时）
+        # 获取本周专注时长（小时）和专注会话数（每日汇总，按天数计）
         week_start = (datetime.now() - timedelta(days=datetime.now().weekday())).strftime('%Y-%m-%d')
-        focus_time_query = conn.execute('''
-            SELECT SUM(duration) as total_minutes 
-            FROM focus_sessions 
-            WHERE user_id = ? AND date(start_time) >= ?
-        ''', (user_id, week_start)).fetchone()
+        week_totals = DailyStatsDB.totals(user_id, week_start)
 
         # 修改为计算小时和分钟
-        total_minutes = focus_time_query['total_minutes'] or 0
+        total_minutes = week_totals['focus_minutes']
         focus_hours = total_minutes // 60
         focus_minutes = total_minutes % 60
         weekly_focus_time = {'hours': focus_hours, 'minutes': focus_minutes}
 
-        # 获取已完成任务总数
-        completed_tasks_query = conn.execute('''
-            SELECT COUNT(*) as count FROM tasks WHERE user_id = ? AND status = 'completed'
-        ''', (user_id,)).fetchone()
-        completed_tasks = completed_tasks_query['count']
-
-        # 获取总任务数
-        total_tasks_query = conn.execute('''
-            SELECT COUNT(*) as count FROM tasks WHERE user_id = ?
-        ''', (user_id,)).fetchone()
-        total_tasks = total_tasks_query['count']
-
-        # 获取专注会话统计
-        # 获取专注会话统计 - 修复版本
-        sessions_query = conn.execute('''
-            SELECT COUNT(*) as total, SUM(CASE WHEN end_time IS NOT NULL THEN 1 ELSE 0 END) as completed 
-            FROM focus_sessions 
-            WHERE user_id = ? AND date(start_time) >= ?
-        ''', (user_id, week_start)).fetchone()
-        total_sessions = sessions_query['total'] or 0
-        completed_sessions = sessions_query['completed'] or 0
+        # 获取已完成任务数和总任务数（user_stats 中的累计值）
+        user_stats = current_user_stats()
+        completed_tasks = user_stats['completed_tasks']
+        total_tasks = user_stats['total_tasks']
+
+        # 获取专注会话统计（专注记录保存时即已结束，会话数即完成的会话数）
+        total_sessions = week_totals['sessions']
+        completed_sessions = week_totals['sessions']
 
         # 计算任务完成率
         task_completion_rate = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
 
-        # 生成最近7天的学习趋势数据（基于签到和专注时间）
-        # 在reports路由函数中，修改生成weekly_trend的代码部分（约820-840行）
+        # 生成最近7天的学习趋势数据（基于签到和专注时间），固定三条分组查询
         weekly_trend = []
-        weekdays = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-
-        # 计算最近7天的日期
-        for i in range(6, -1, -1):
-            # 获取日期
-            date = datetime.now() - timedelta(days=i)
-            date_str = date.strftime('%Y-%m-%d')
-            weekday_name = weekdays[date.weekday()]
-
-            # 检查是否签到
-            is_checked_in = conn.execute('''
-            SELECT * FROM checkins WHERE user_id = ? AND date = ?
-            ''', (user_id, date_str)).fetchone() is not None
-
-            # 获取当天的专注时间（分钟转换为小时）
-            focus_query = conn.execute('''
-                SELECT SUM(duration) as total_minutes 
-                FROM focus_sessions 
-                WHERE user_id = ? AND date(start_time) = ?
-            ''', (user_id, date_str)).fetchone()
-
-            focus_hours = focus_query['total_minutes'] / 60 if focus_query['total_minutes'] else 0
-
-            # 获取当天完成的任务 - 添加这部分代码
-            completed_tasks_day = conn.execute('''
-                SELECT t.id, t.title, t.description, t.course, t.updated_at as completion_time 
-                FROM tasks t 
-                WHERE t.user_id = ? AND t.status = 'completed' AND date(t.updated_at) = ?
-                ORDER BY t.updated_at DESC
-            ''', (user_id, date_str)).fetchall()
-
-            # 格式化任务数据 - 添加这部分代码
-            tasks_data = []
-            for task in completed_tasks_day:
-                tasks_data.append({
-                    'id': task['id'],
-                    'title': task['title'],
-                    'description': task['description'],
-                    'course_info': task['course'] if task['course'] else '无课程信息',
-                    'completion_time': task['completion_time']
-                })
-
-            weekly_trend.append({
-                'day': weekday_name,
-                'value': round(focus_hours, 1),
-                'date': date_str,
-                'date_display': date.strftime('%m月%d日'),
-                'checked_in': is_checked_in,
-                'tasks': tasks_data,  # 添加任务数据
-                'task_count': len(tasks_data)  # 添加任务数量
-            })
+        for day_data in ReportDB.get_daily_trend(user_id, days=7):
+            day_data['value'] = round(day_data['focus_minutes'] / 60, 1)
+            weekly_trend.append(day_data)
 
         # 获取签到详情（仅显示签到的日期）
         checked_in_dates = []
@@ -2406,11 +2597,11 @@ def dashboard():
             'productivity_score': task_completion_rate,  # 新增的变量
             'streak_days': streak_days  # 已定义的变量
         }
-        print(f"[调试] 最终统计数据: {weekly_stats}")
-        print(f"[调试] 趋势数据: {weekly_trend}")
+        logger.debug('最终统计数据: %s', weekly_stats)
+        logger.debug('趋势数据: %s', weekly_trend)
 
     except Exception as e:
-        print(f"[调试] 获取报告数据时出现错误: {str(e)}")
+        logger.exception('获取报告数据时出现错误: %s', e)
         weekly_stats = {'focus_time': 0, 'completed_sessions': 0, 'total_sessions': 0, 'completed_tasks': 0,
                         'total_tasks': 0, 'productivity_score': 0, 'streak_days': 0}
         weekly_trend = []
@@ -2458,38 +2649,38 @@ def dashboard():
 @app.route('/checkin', methods=['POST'])
 @login_required
 def checkin():
-    print("[调试] 用户尝试签到")
+    logger.debug('用户尝试签到')
     lang = get_current_lang()
     translations = get_translations(lang)
     user_id = session['user_id']
     today = datetime.now().strftime('%Y-%m-%d')
 
-    conn = get_db_connection()
-    try:
-        # 检查今天是否已经签到
+    def record_checkin(conn):
+        # 检查今天是否已经签到（在写事务中检查，并发的重复签到不会都通过）
         existing_checkin = conn.execute(
             'SELECT * FROM checkins WHERE user_id = ? AND date = ?',
             (user_id, today)
         ).fetchone()
-
         if existing_checkin:
-            print("[调试] 用户今天已经签到过了")
-            flash(translations.get('flash_already_signed_in', 'You have already signed in today!'), 'info')
-        else:
-            # 添加签到记录
-            conn.execute(
-                'INSERT INTO checkins (user_id, date) VALUES (?, ?)',
-                (user_id, today)
-            )
-            conn.commit()
-            print("[调试] 用户签到成功")
+            return False
+        # 添加签到记录
+        conn.execute(
+            'INSERT INTO checkins (user_id, date) VALUES (?, ?)',
+            (user_id, today)
+        )
+        StatsDB.record_checkin(user_id, today, conn)
+        return True
+
+    try:
+        if db_pool.write_transaction(record_checkin):
+            logger.debug('用户签到成功')
             flash(translations.get('flash_signin_success', 'Sign in successful! Keep up the good work!'), 'success')
+        else:
+            logger.debug('用户今天已经签到过了')
+            flash(translations.get('flash_already_signed_in', 'You have already signed in today!'), 'info')
     except Exception as e:
-        print(f"[调试] 签到过程中出现错误: {str(e)}")
+        logger.exception('签到过程中出现错误: %s', e)
         flash(translations.get('flash_signin_failed', 'Sign in failed, please try again later'), 'error')
-        conn.rollback()
-    finally:
-        conn.close()
 
     # 重定向回仪表盘
     return redirect(url_for('dashboard', lang=lang))
@@ -2499,25 +2690,33 @@ def checkin():
 @app.route('/tasks')
 @login_required
 def tasks():
-    print("[调试] 访问任务列表页面")
+    logger.debug('访问任务列表页面')
     lang = get_current_lang()
     translations = get_translations(lang)
 
     user_id = session['user_id']
     conn = get_db_connection()
     try:
-        print(f"[调试] 获取用户 {user_id} 的所有任务")
+        logger.debug('获取用户 %s 的所有任务', user_id)
         tasks = conn.execute('SELECT * FROM tasks WHERE user_id = ? ORDER BY due_date ASC', (user_id,)).fetchall()
 
-        # 为每个任务获取标签并格式化日期
+        # 一次查询取回该用户所有任务的标签，按任务分组
+        tags_by_task = {}
+        for row in conn.execute('''
+            SELECT tt.task_id, tt.tag
+            FROM task_tags tt JOIN tasks t ON t.id = tt.task_id
+            WHERE t.user_id = ?
+            ORDER BY tt.task_id, tt.tag
+        ''', (user_id,)):
+            tags_by_task.setdefault(row['task_id'], []).append(row['tag'])
+
+        # 为每个任务附加标签并格式化日期
         tasks_with_tags = []
         today = datetime.now().date()
         
         for task in tasks:
-            print(f"[调试] 获取任务 {task['id']} 的标签")
-            tags = conn.execute('SELECT tag FROM task_tags WHERE task_id = ?', (task['id'],)).fetchall()
             task_dict = dict(task)
-            task_dict['tags'] = [tag['tag'] for tag in tags]
+            task_dict['tags'] = tags_by_task.get(task['id'], [])
             
             # Localized due date (keep ISO for editing, display separately)
             task_dict['due_date_iso'] = task_dict.get('due_date') or ''
@@ -2545,7 +2744,7 @@ def tasks():
             tasks_with_tags.append(task_dict)
 
     except Exception as e:
-        print(f"[调试] 获取任务列表时出现错误: {str(e)}")
+        logger.exception('获取任务列表时出现错误: %s', e)
         tasks_with_tags = []
     finally:
         conn.close()
@@ -2557,7 +2756,7 @@ def tasks():
 @login_required
 def add_task():
     """处理创建或编辑任务的请求"""
-    print("[调试] 处理创建/编辑任务请求")
+    logger.debug('处理创建/编辑任务请求')
     lang = get_current_lang()
     translations = get_translations(lang)
     user_id = session['user_id']
@@ -2575,20 +2774,20 @@ def add_task():
     estimated_time = request.form.get('task_estimated_time', 60)  # 添加预计时间字段
 
     # 添加详细的日志记录
-    print(f"\n[调试] 任务请求参数:")
-    print(f"[调试] task_id: {task_id}, user_id: {user_id}")
-    print(f"[调试] title: {title}, course: {course}")
-    print(f"[调试] due_date: {due_date}, priority: {priority}")
-    print(f"[调试] estimated_time: {estimated_time}")  # 添加预计时间日志
+    logger.debug('任务请求参数:')
+    logger.debug('task_id: %s, user_id: %s', task_id, user_id)
+    logger.debug('title: %s, course: %s', title, course)
+    logger.debug('due_date: %s, priority: %s', due_date, priority)
+    logger.debug('estimated_time: %s', estimated_time)  # 添加预计时间日志
 
     # 服务器端验证 - 验证必填字段
     if not title:
-        print("[调试] 任务标题为空，返回错误")
+        logger.debug('任务标题为空，返回错误')
         flash(translations.get('task_title_required', 'Please enter a task title!'))
         return redirect(url_for('tasks', lang=lang))
 
     if not due_date:
-        print("[调试] 截止日期为空，返回错误")
+        logger.debug('截止日期为空，返回错误')
         flash(translations.get('task_due_date_required', 'Please select a due date!'))
         return redirect(url_for('tasks', lang=lang))
 
@@ -2600,76 +2799,66 @@ def add_task():
     except (ValueError, TypeError):
         estimated_time = 60  # 如果转换失败，设置为默认值60
 
-    conn = None
-    try:
-        conn = get_db_connection()
-        # 统一使用conn.execute()，避免使用cursor带来的初始化问题
-
+    def save_task(conn):
+        """在一个写事务中保存任务和标签；任务不存在或不属于当前用户时返回 None"""
+        saved_id = task_id
         # 检查是否是编辑任务
-        if task_id:
-            print(f"[调试] 编辑任务模式，任务ID: {task_id}")
+        if saved_id:
+            logger.debug('编辑任务模式，任务ID: %s', saved_id)
             # 验证任务是否属于当前用户
-            task = conn.execute('SELECT * FROM tasks WHERE id = ? AND user_id = ?', (task_id, user_id)).fetchone()
+            task = conn.execute('SELECT * FROM tasks WHERE id = ? AND user_id = ?', (saved_id, user_id)).fetchone()
             if not task:
-                print("[调试] 任务不存在或不属于当前用户")
-                flash(translations.get('task_not_found_or_no_permission', 'Task not found or you do not have permission to edit this task!'))
-                return redirect(url_for('tasks', lang=lang))
+                return None
 
             # 更新任务
-            print("[调试] 更新任务")
+            logger.debug('更新任务')
             conn.execute('''
-                UPDATE tasks 
-                SET title = ?, description = ?, course = ?, priority = ?, 
-                    due_date = ?, repeat = ?, status = ?, estimated_time = ?, updated_at = CURRENT_TIMESTAMP 
-                WHERE id = ? 
-            ''', (title, description, course, priority, due_date, repeat, status, estimated_time, task_id))
-            print("[调试] 任务更新成功")
+                UPDATE tasks
+                SET title = ?, description = ?, course = ?, priority = ?,
+                    due_date = ?, repeat = ?, status = ?, estimated_time = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (title, description, course, priority, due_date, repeat, status, estimated_time, saved_id))
+            StatsDB.record_task_status_change(user_id, task['status'], status, conn, task['updated_at'])
+            logger.debug('任务更新成功')
 
             # 删除旧标签
-            print("[调试] 删除旧标签")
-            conn.execute('DELETE FROM task_tags WHERE task_id = ?', (task_id,))
+            logger.debug('删除旧标签')
+            conn.execute('DELETE FROM task_tags WHERE task_id = ?', (saved_id,))
         else:
-            print("[调试] 创建新任务模式")
+            logger.debug('创建新任务模式')
             # 插入任务到数据库
-            print("[调试] 插入任务到tasks表")
-            cursor = conn.cursor()  # 这里使用cursor是为了获取lastrowid
-            cursor.execute('''
+            logger.debug('插入任务到tasks表')
+            saved_id = conn.execute('''
                 INSERT INTO tasks (user_id, title, description, course, priority, due_date, repeat, status, estimated_time)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (user_id, title, description, course, priority, due_date, repeat, status, estimated_time))
-
-            # 获取新插入任务的ID
-            task_id = cursor.lastrowid
-            print(f"[调试] 任务插入成功，任务ID: {task_id}")
+            ''', (user_id, title, description, course, priority, due_date, repeat, status, estimated_time)).lastrowid
+            StatsDB.record_task_added(user_id, status, conn)
+            logger.debug('任务插入成功，任务ID: %s', saved_id)
 
         # 处理标签（无论是创建还是编辑都需要处理）
         if tags:
-            print(f"[调试] 处理任务标签: {tags}")
+            logger.debug('处理任务标签: %s', tags)
             tag_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
-            print(f"[调试] 解析后的标签列表: {tag_list}")
+            logger.debug('解析后的标签列表: %s', tag_list)
 
             for tag in tag_list:
-                print(f"[调试] 插入标签 '{tag}' 到task_tags表")
+                logger.debug("插入标签 '%s' 到task_tags表", tag)
                 conn.execute(
                     'INSERT INTO task_tags (task_id, tag) VALUES (?, ?)',
-                    (task_id, tag)
+                    (saved_id, tag)
                 )
-            print(f"[调试] 成功插入 {len(tag_list)} 个标签")
-
-        # 提交事务
-        print("[调试] 提交事务")
-        conn.commit()
-        flash(translations.get('task_saved_success', 'Task saved successfully!'))
+            logger.debug('成功插入 %s 个标签', len(tag_list))
+        return saved_id
 
+    try:
+        if db_pool.write_transaction(save_task) is None:
+            logger.debug('任务不存在或不属于当前用户')
+            flash(translations.get('task_not_found_or_no_permission', 'Task not found or you do not have permission to edit this task!'))
+        else:
+            flash(translations.get('task_saved_success', 'Task saved successfully!'))
     except Exception as e:
-        print(f"[调试] 任务保存失败: {str(e)}")
+        logger.exception('任务保存失败: %s', e)
         flash(translations.get('task_save_failed', 'Task save failed, please try again later!'))
-        if conn:
-            conn.rollback()  # 发生错误时回滚事务
-    finally:
-        print("[调试] 关闭数据库连接")
-        if conn:
-            conn.close()
 
     return redirect(url_for('tasks', lang=lang))
 
@@ -2678,47 +2867,45 @@ def add_task():
 @app.route('/tasks/delete/<int:task_id>', methods=['POST'])
 @login_required
 def delete_task(task_id):
-    print(f"[调试] 处理删除任务请求，任务ID: {task_id}")
+    logger.debug('处理删除任务请求，任务ID: %s', task_id)
     lang = get_current_lang()
     translations = get_translations(lang)
     user_id = session['user_id']
 
-    conn = get_db_connection()
-    try:
-        print(f"[调试] 验证任务 {task_id} 是否属于用户 {user_id}")
+    def remove_task(conn):
+        logger.debug('验证任务 %s 是否属于用户 %s', task_id, user_id)
         # 首先验证任务是否属于当前用户
         task = conn.execute('SELECT * FROM tasks WHERE id = ? AND user_id = ?', (task_id, user_id)).fetchone()
-
         if not task:
-            print(f"[调试] 任务 {task_id} 不存在或不属于用户 {user_id}")
-            flash(translations.get('task_not_found_or_no_permission_delete', 'Task not found or you do not have permission to delete this task!'))
-            return redirect(url_for('tasks', lang=lang))
+            return False
 
-        print(f"[调试] 开始删除任务 {task_id}")
+        logger.debug('开始删除任务 %s', task_id)
         # 先删除任务相关的标签
         conn.execute('DELETE FROM task_tags WHERE task_id = ?', (task_id,))
-        print(f"[调试] 已删除任务 {task_id} 的标签")
+        logger.debug('已删除任务 %s 的标签', task_id)
         # 删除任务本身
         conn.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-        conn.commit()
-        print(f"[调试] 成功删除任务 {task_id}")
-        flash(translations.get('task_deleted_success', 'Task deleted successfully!'))
-        return redirect(url_for('tasks', lang=lang))
+        StatsDB.record_task_deleted(user_id, task['status'], conn, task['updated_at'])
+        return True
+
+    try:
+        if db_pool.write_transaction(remove_task):
+            logger.debug('成功删除任务 %s', task_id)
+            flash(translations.get('task_deleted_success', 'Task deleted successfully!'))
+        else:
+            logger.debug('任务 %s 不存在或不属于用户 %s', task_id, user_id)
+            flash(translations.get('task_not_found_or_no_permission_delete', 'Task not found or you do not have permission to delete this task!'))
     except Exception as e:
-        print(f"[调试] 删除任务时发生错误: {str(e)}")
-        conn.rollback()
+        logger.exception('删除任务时发生错误: %s', e)
         flash(translations.get('task_delete_failed', 'Task delete failed, please try again later!'))
-        return redirect(url_for('tasks', lang=lang))
-    finally:
-        print("[调试] 关闭数据库连接")
-        conn.close()
+    return redirect(url_for('tasks', lang=lang))
 
 
 # 路由：统计页面
 @app.route('/stats')
 @login_required
 def stats():
-    print("[调试] 访问统计页面")
+    logger.debug('访问统计页面')
     lang = get_current_lang()
     translations = get_translations(lang)
     # NOTE: The legacy `stats.html` page uses gettext-style `_()` which isn't wired up in this project,
@@ -2727,238 +2914,60 @@ def stats():
     return redirect(url_for('reports', lang=lang))
 
 
+# 报告页数据缓存在 report_cache 中，键包含数据版本，任何写入之后都会重新计算
+def weekly_report(user_id, lang, end_date, data_version, conn=None):
+    """返回 (报告数据, 是否命中缓存)；未启用缓存或没有数据版本时直接计算，命中标记为 None"""
+    cache = app.extensions.get('report_cache')
+    build = lambda: ReportDB.build_weekly_report(user_id, end_date, conn)
+    if cache is None or data_version is None:
+        return build(), None
+    key = report_key(user_id, lang, end_date - timedelta(days=6), end_date, data_version)
+    return cache.get_or_build(key, build)
+
+
 # 路由：报告
 @app.route('/reports')
 @login_required
+@conditional_on_user_data
 def reports():
-    print("[调试] 访问报告页面")
+    logger.debug('访问报告页面')
     lang = get_current_lang()
     translations = get_translations(lang)
-# 初始化变量，避免NameError
-    weekly_stats = {'focus_time': 0, 'completed_sessions': 0, 'total_sessions': 0,
-                    'completed_tasks': 0, 'total_tasks': 0, 'productivity_score': 0, 'streak_days': 0}
-    weekly_trend = []
-    checked_in_dates = []
 
     user_id = session['user_id']
-    conn = get_db_connection()
     try:
-        # 获取专注时长数据 - 限制为最近7天
-        week_start = (datetime.now() - timedelta(days=6)).strftime('%Y-%m-%d')
-        focus_stats = conn.execute('''
-            SELECT 
-                COUNT(*) as total_sessions,
-                COUNT(CASE WHEN end_time IS NOT NULL THEN 1 END) as completed_sessions,
-SUM(duration) as total_duration
-            FROM focus_sessions 
-            WHERE user_id = ? AND date(start_time) >= ?
-        ''', (user_id, week_start)).fetchone()
-
-        total_sessions = focus_stats['total_sessions'] or 0
-        completed_sessions = focus_stats['completed_sessions'] or 0
-        total_duration = focus_stats['total_duration'] or 0
-
-        # 修改为计算小时和分钟
-        focus_hours = total_duration // 60
-        focus_minutes = total_duration % 60
-        # 计算专注时长（小时和分钟）
-        focus_time_info = {'hours': focus_hours, 'minutes': focus_minutes, 'total_minutes': total_duration}
-
-        # 获取任务统计数据 - 限制为最近7天
-        task_stats = conn.execute('''
-            SELECT 
-                COUNT(*) as total_tasks,
-                COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed_tasks
-            FROM tasks 
-            WHERE user_id = ? AND date(created_at) >= ?
-        ''', (user_id, week_start)).fetchone()
-
-        total_tasks = task_stats['total_tasks'] or 0
-        completed_tasks = task_stats['completed_tasks'] or 0
-
-        # 计算任务完成率
-        if total_tasks == 0:
-            task_completion_rate = 0
-        else:
-            task_completion_rate = int((completed_tasks / total_tasks) * 100)
-
-        # 获取连续签到天数
-        checkin_dates = conn.execute('''
-            SELECT date FROM checkins 
-            WHERE user_id = ? 
-            ORDER BY date DESC
-        ''', (user_id,)).fetchall()
-
-        streak_days = 0
-        if checkin_dates:
-            # 计算连续签到天数
-            current_date = datetime.now().date()
-            for checkin_date in checkin_dates:
-                checkin_date_obj = datetime.strptime(checkin_date['date'], '%Y-%m-%d').date()
-                if (current_date - checkin_date_obj).days == streak_days:
-                    streak_days += 1
-                else:
-                    break
-
-        # 组装统计数据
-        weekly_stats = {
-            'focus_time': focus_time_info,  # 总专注时长（小时和分钟）
-            'completed_sessions': completed_sessions,  # 完成的专注会话数
-            'total_sessions': total_sessions,  # 总专注会话数
-            'completed_tasks': completed_tasks,  # 完成任务数
-            'total_tasks': total_tasks,  # 总任务数
-            'productivity_score': task_completion_rate,  # 任务完成率
-            'streak_days': streak_days  # 连续签到天数
-        }
-        # 生成最近7天的学习趋势数据 - 修改这部分以添加任务信息
-        weekdays = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-
-        # 计算最近7天的日期
-        for i in range(6, -1, -1):
-            # 获取日期
-            date = datetime.now() - timedelta(days=i)
-            date_str = date.strftime('%Y-%m-%d')
-            weekday_name = weekdays[date.weekday()]
-
-            # 检查是否签到
-            is_checked_in = conn.execute('''
-            SELECT * FROM checkins WHERE user_id = ? AND date = ?
-            ''', (user_id, date_str)).fetchone() is not None
-
-            # 获取当天的专注时间（分钟转换为小时和分钟）
-            focus_query = conn.execute('''
-                SELECT SUM(duration) as total_minutes 
-                FROM focus_sessions 
-                WHERE user_id = ? AND date(start_time) = ?
-            ''', (user_id, date_str)).fetchone()
-
-            # 修改为计算小时和分钟
-            daily_minutes = focus_query['total_minutes'] or 0
-            daily_hours = daily_minutes // 60
-            daily_minutes_remainder = daily_minutes % 60
-            focus_time = {'hours': daily_hours, 'minutes': daily_minutes_remainder}
-
-            # 获取当天完成的任务 - 添加这部分代码
-            completed_tasks_day = conn.execute('''
-                SELECT t.id, t.title, t.description, t.course, t.updated_at as completion_time 
-                FROM tasks t 
-                WHERE t.user_id = ? AND t.status = 'completed' AND date(t.updated_at) = ?
-                ORDER BY t.updated_at DESC
-            ''', (user_id, date_str)).fetchall()
-
-            # 格式化任务数据 - 添加这部分代码
-            tasks_data = []
-            for task in completed_tasks_day:
-                tasks_data.append({
-                    'id': task['id'],
-                    'title': task['title'],
-                    'description': task['description'],
-                    'course_info': task['course'] if task['course'] else '无课程信息',
-                    'completion_time': task['completion_time']
-                })
-
-            weekly_trend.append({
-                'day': weekday_name,
-                'value': daily_minutes,  # 保留原始分钟数用于图表计算
-                'focus_time': focus_time,  # 添加小时和分钟的字典用于显示
-                'date': date_str,
-                'date_display': date.strftime('%m月%d日'),
-                'checked_in': is_checked_in,
-                'tasks': tasks_data,  # 添加任务数据
-                'task_count': len(tasks_data)  # 添加任务数量
-            })
-
-        # 获取签到详情
-        checked_in_dates = []
-        for trend_data in weekly_trend:
-            if trend_data['checked_in']:
-                # 计算小时和分钟
-                daily_minutes = trend_data['value']
-                daily_hours = daily_minutes // 60
-                daily_minutes_remainder = daily_minutes % 60
-                focus_time = {'hours': daily_hours, 'minutes': daily_minutes_remainder}
-
-                checked_in_dates.append({
-                    'date': trend_data['date'],
-                    'date_display': trend_data['date_display'],
-                    'day': trend_data['day'],
-                    'focus_hours': focus_time,  # 使用小时和分钟的字典
-                    'value': trend_data['value']  # 保留原始分钟数
-                })
-
-        # 获取最近完成的任务列表（最近30天）
-        completed_tasks_query = conn.execute('''
-            SELECT t.id, t.title, t.course, t.updated_at as completion_time
-            FROM tasks t 
-            WHERE t.user_id = ? AND t.status = 'completed'
-            ORDER BY t.updated_at DESC
-            LIMIT 20
-        ''', (user_id,)).fetchall()
-
-        # 格式化已完成任务数据
-        completed_tasks_list = []
-        for task in completed_tasks_query:
-            try:
-                # Try to parse the datetime string
-                if isinstance(task['completion_time'], str):
-                    completion_time = datetime.strptime(task['completion_time'], '%Y-%m-%d %H:%M:%S')
-                else:
-                    completion_time = datetime.fromisoformat(str(task['completion_time']))
-                
-                completed_tasks_list.append({
-                    'id': task['id'],
-                    'title': task['title'],
-                    'course': task['course'] if task['course'] else None,
-                    'completion_date': completion_time.strftime('%m/%d'),
-                    'completion_time': completion_time.strftime('%H:%M')
-                })
-            except Exception as e:
-                print(f"[调试] 解析任务完成时间时出错: {str(e)}")
-                # If parsing fails, use current time as fallback
-                completed_tasks_list.append({
-                    'id': task['id'],
-                    'title': task['title'],
-                    'course': task['course'] if task['course'] else None,
-                    'completion_date': datetime.now().strftime('%m/%d'),
-                    'completion_time': datetime.now().strftime('%H:%M')
-                })
-
+        report, cached = weekly_report(user_id, lang, datetime.now().date(), g.get('data_version'))
+        profiling.mark('report-cache', {True: 'hit', False: 'miss'}.get(cached, 'off'))
     except Exception as e:
-        print(f"[调试] 报告页面出现错误: {str(e)}")
-        # 错误处理中已经有默认值了
-        completed_tasks_list = []
-    finally:
-        conn.close()
+        logger.exception('报告页面出现错误: %s', e)
+        # 出错时使用默认值，避免模板中出现未定义变量
+        report = {
+            'weekly_stats': {'focus_time': 0, 'completed_sessions': 0, 'total_sessions': 0,
+                             'completed_tasks': 0, 'total_tasks': 0, 'productivity_score': 0, 'streak_days': 0},
+            'weekly_trend': [], 'checked_in_dates': [], 'completed_tasks_list': [],
+        }
 
-    return render_template('reports.html', translations=translations, lang=lang, weekly_stats=weekly_stats,
-                           weekly_trend=weekly_trend, checked_in_dates=checked_in_dates, 
-                           completed_tasks_list=completed_tasks_list)
+    return render_template('reports.html', translations=translations, lang=lang, **report)
 
 
 # 路由：专注模式
 @app.route('/focus')
 @login_required
 def focus():
-    print("[调试] 访问专注模式页面")
+    logger.debug('访问专注模式页面')
     lang = get_current_lang()
     translations = get_translations(lang)
 
     user_id = session['user_id']
     conn = get_db_connection()
     try:
-        print(f"[调试] 获取用户 {user_id} 的未完成任务列表")
+        logger.debug('获取用户 %s 的未完成任务列表', user_id)
         tasks = conn.execute('SELECT * FROM tasks WHERE user_id = ? AND status != ?',
                              (user_id, 'completed')).fetchall()
         
-        # 获取今日专注时长
+        # 获取今日专注时长（每日汇总）
         today = datetime.now().strftime('%Y-%m-%d')
-        today_stats = conn.execute('''
-            SELECT SUM(duration) as total_minutes
-            FROM focus_sessions
-            WHERE user_id = ? AND date(start_time) = ?
-        ''', (user_id, today)).fetchone()
-        
-        today_duration = today_stats['total_minutes'] or 0
+        today_duration = DailyStatsDB.totals(user_id, today, today, conn)['focus_minutes']
         hours = today_duration // 60
         minutes = today_duration % 60
         
@@ -2967,7 +2976,7 @@ def focus():
         else:
             today_progress = f"{minutes}{translations.get('min', 'min')}"
     except Exception as e:
-        print(f"[调试] 获取专注模式数据时出现错误: {str(e)}")
+        logger.exception('获取专注模式数据时出现错误: %s', e)
         tasks = []
         today_progress = "0h 0m"
     finally:
@@ -2980,7 +2989,7 @@ def focus():
 @app.route('/focus/save_session', methods=['POST'])
 @login_required
 def save_focus_session():
-    print("[调试] 处理保存专注会话请求")
+    logger.debug('处理保存专注会话请求')
     translations = get_translations(get_current_lang())
     user_id = session['user_id']
 
@@ -2991,83 +3000,66 @@ def save_focus_session():
 
     # 验证参数
     if duration <= 0:
-        print("[调试] 专注时长无效")
+        logger.debug('专注时长无效')
         return jsonify({'success': False, 'message': translations.get('invalid_focus_duration', 'Invalid focus duration')}), 400
 
-    conn = get_db_connection()
-    try:
-        # 验证任务是否存在且属于当前用户
-        if task_id:
-            task = conn.execute('SELECT * FROM tasks WHERE id = ? AND user_id = ?',
-                                (task_id, user_id)).fetchone()
-            if not task:
-                print("[调试] 任务不存在或不属于当前用户")
-                return jsonify({'success': False, 'message': translations.get('task_not_found_or_no_permission', 'Task not found or you do not have permission to edit this task!')}), 403
+    # 验证任务是否存在且属于当前用户，插入专注会话记录并更新统计
+    logger.debug('保存专注会话 - 用户ID: %s, 任务ID: %s, 时长: %s分钟', user_id, task_id, duration)
+    def insert_session(conn):
+        return FocusSessionDB.save_session(user_id, duration, task_id, conn)
 
-        # 插入专注会话记录 - 修复：添加start_time字段
-        print(f"[调试] 保存专注会话 - 用户ID: {user_id}, 任务ID: {task_id}, 时长: {duration}分钟")
-        conn.execute('''
-            INSERT INTO focus_sessions (user_id, task_id, duration, start_time, end_time)
-            VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-        ''', (user_id, task_id, duration))
-        conn.commit()
+    try:
+        # 开启组提交时与同时到达的其他保存合并到一个事务中，提交后才返回
+        # 等待时间有上限：写线程的重试期限加上凑批窗口，再留一秒余量
+        writer = group_commit.get_writer()
+        if writer is not None:
+            saved = writer.run(insert_session, timeout=writer.deadline + writer.window + 1)
+        else:
+            saved = db_pool.write_transaction(insert_session)
+        if not saved:
+            logger.debug('任务不存在或不属于当前用户')
+            return jsonify({'success': False, 'message': translations.get('task_not_found_or_no_permission', 'Task not found or you do not have permission to edit this task!')}), 403
 
-        print("[调试] 专注会话保存成功")
+        logger.debug('专注会话保存成功')
         return jsonify({'success': True, 'message': translations.get('focus_session_saved', 'Focus session saved successfully')})
 
+    except FutureTimeoutError:
+        logger.error('保存专注会话超时：组提交写线程未在期限内返回结果')
+        return jsonify({'success': False, 'message': f"{translations.get('focus_session_save_failed', 'Failed to save focus session')}: timed out"}), 500
+
     except Exception as e:
-        print(f"[调试] 保存专注会话失败: {str(e)}")
-        conn.rollback()
+        logger.exception('保存专注会话失败: %s', e)
         return jsonify({'success': False, 'message': f"{translations.get('focus_session_save_failed', 'Failed to save focus session')}: {str(e)}"}), 500
-    finally:
-        conn.close()
 
 
 # 路由：获取专注统计
 @app.route('/focus/stats')
 @login_required
+@conditional_on_user_data
 def get_focus_stats():
-    print("[调试] 获取专注统计数据")
+    logger.debug('获取专注统计数据')
     user_id = session['user_id']
     today = datetime.now().strftime('%Y-%m-%d')
 
     conn = get_db_connection()
     try:
-        # 获取今日专注时长
-        today_stats = conn.execute('''
-            SELECT SUM(duration) as total_minutes
-            FROM focus_sessions
-            WHERE user_id = ? AND date(start_time) = ?
-        ''', (user_id, today)).fetchone()
-
-        today_duration = today_stats['total_minutes'] or 0
-
-        # 获取已完成的专注会话数
-        completed_sessions = conn.execute('''
-            SELECT COUNT(*) as count
-            FROM focus_sessions
-            WHERE user_id = ? AND end_time IS NOT NULL
-        ''', (user_id,)).fetchone()['count']
+        # 获取今日专注时长（每日汇总）
+        today_duration = DailyStatsDB.totals(user_id, today, today, conn)['focus_minutes']
+
+        # 已完成的专注会话数和任务计数直接读取 before_request 已经取回的 user_stats 行
+        user_stats = current_user_stats()
+        completed_sessions = user_stats['focus_sessions']
 
         # 计算任务完成率（这里可以根据实际需求调整）
-        total_tasks = conn.execute('''
-            SELECT COUNT(*) as count
-            FROM tasks
-            WHERE user_id = ?
-        ''', (user_id,)).fetchone()['count']
-
-        completed_tasks = conn.execute('''
-            SELECT COUNT(*) as count
-            FROM tasks
-            WHERE user_id = ? AND status = 'completed'
-        ''', (user_id,)).fetchone()['count']
+        total_tasks = user_stats['total_tasks']
+        completed_tasks = user_stats['completed_tasks']
 
         completion_rate = 0
         if total_tasks > 0:
             completion_rate = int((completed_tasks / total_tasks) * 100)
 
-        print(
-            f"[调试] 专注统计 - 今日时长: {today_duration}分钟, 已完成会话: {completed_sessions}, 完成率: {completion_rate}%")
+        logger.debug('专注统计 - 今日时长: %s分钟, 已完成会话: %s, 完成率: %s%%',
+                     today_duration, completed_sessions, completion_rate)
 
         return jsonify({
             'today_duration': today_duration,
@@ -3076,7 +3068,7 @@ def get_focus_stats():
         })
 
     except Exception as e:
-        print(f"[调试] 获取专注统计失败: {str(e)}")
+        logger.exception('获取专注统计失败: %s', e)
         # 返回默认值，避免前端出错
         return jsonify({
             'today_duration': 0,
@@ -3091,55 +3083,37 @@ def get_focus_stats():
 @app.route('/profile')
 @login_required
 def profile():
-    print("[调试] 访问个人资料页面")
+    logger.debug('访问个人资料页面')
     lang = get_current_lang()
     translations = get_translations(lang)
 
     user_id = session['user_id']
     conn = get_db_connection()
     try:
-        print(f"[调试] 获取用户 {user_id} 的详细信息")
+        logger.debug('获取用户 %s 的详细信息', user_id)
         user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
 
         if not user:
-            print("[调试] 未找到用户信息")
+            logger.debug('未找到用户信息')
             flash(translations.get('user_profile_not_found', 'User profile not found!'))
             conn.close()
             return redirect(url_for('dashboard', lang=lang))
 
-        # 获取签到统计数据
-        from database import CheckinDB
-        monthly_checkins = CheckinDB.get_monthly_checkins(user_id)
-        total_checkins = CheckinDB.get_total_checkins(user_id)
+        # 获取签到统计数据（本月签到天数读取每日汇总）
+        current_month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d')
+        monthly_checkins = DailyStatsDB.totals(user_id, current_month_start, conn=conn)['checkins']
+        user_stats = current_user_stats()
+        total_checkins = user_stats['total_checkins']
         
         # 获取连续签到天数
-        checkin_dates = conn.execute('''
-            SELECT date FROM checkins 
-            WHERE user_id = ? 
-            ORDER BY date DESC
-        ''', (user_id,)).fetchall()
-        
-        streak_days = 0
-        if checkin_dates:
-            current_date = datetime.now().date()
-            for checkin_date in checkin_dates:
-                checkin_date_obj = datetime.strptime(checkin_date['date'], '%Y-%m-%d').date()
-                if (current_date - checkin_date_obj).days == streak_days:
-                    streak_days += 1
-                else:
-                    break
+        streak_days = CheckinDB.streak_from_stats(user_stats)['current']
         
         # 获取最近30天的签到记录用于日历显示
         thirty_days_ago = (datetime.now() - timedelta(days=29)).date()
         checkin_records = {}
-        checkin_list = conn.execute('''
-            SELECT date FROM checkins 
-            WHERE user_id = ? AND date >= ?
-            ORDER BY date ASC
-        ''', (user_id, thirty_days_ago.strftime('%Y-%m-%d'))).fetchall()
-        
-        for record in checkin_list:
-            checkin_records[record['date']] = True
+        for day, day_stats in DailyStatsDB.get_days(user_id, thirty_days_ago, datetime.now().date(), conn).items():
+            if day_stats['checked_in']:
+                checkin_records[day] = True
         
         # 生成最近30天的日期列表
         calendar_dates = []
@@ -3153,11 +3127,7 @@ def profile():
             })
         
         # 获取本月签到天数
-        current_month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d')
-        this_month_checkins = conn.execute('''
-            SELECT COUNT(*) as count FROM checkins 
-            WHERE user_id = ? AND date >= ?
-        ''', (user_id, current_month_start)).fetchone()['count']
+        this_month_checkins = monthly_checkins
         
         # 获取教育级别显示名称
         education_level_map = {
@@ -3181,7 +3151,7 @@ def profile():
         password_last_changed = "November 1, 2025"  # Placeholder, can be updated if you track this
 
     except Exception as e:
-        print(f"[调试] 获取个人资料时出现错误: {str(e)}")
+        logger.exception('获取个人资料时出现错误: %s', e)
         user = None
         monthly_checkins = 0
         total_checkins = 0
@@ -3205,84 +3175,111 @@ def profile():
                            password_last_changed=password_last_changed)
 
 
+# 路由：前端翻译脚本
+# 地址中的版本号由翻译表内容决定，因此可以长期缓存；版本号过期（旧页面或旧缓存）时跳转到当前版本
+TRANSLATIONS_MAX_AGE = 365 * 24 * 3600
+
+
+@app.route('/i18n/<lang>.<version>.js')
+def translations_script(lang, version):
+    if lang not in app.config['LANGUAGES']:
+        abort(404)
+    current = translation_catalogs.version(lang)
+    if version != current:
+        return redirect(url_for('translations_script', lang=lang, version=current))
+    response = app.response_class(translation_catalogs.script(lang), mimetype='application/javascript')
+    response.set_etag(current)
+    response.cache_control.public = True
+    response.cache_control.max_age = TRANSLATIONS_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+
+# 路由：头像文件
+# 处理后的头像按内容命名，文件名不变内容就不变，因此可以让浏览器和 CDN 长期缓存
+AVATAR_MAX_AGE = 365 * 24 * 3600
+
+
+@app.route('/avatars/<path:filename>')
+def avatar_file(filename):
+    if not avatars.is_processed(filename):
+        # 尚未生成缩略图的原图
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    response = send_from_directory(app.config['UPLOAD_FOLDER'], filename,
+                                   max_age=AVATAR_MAX_AGE, etag=avatars.avatar_etag(filename))
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
 # 路由：上传头像
 @app.route('/upload_avatar', methods=['POST'])
 @login_required
 def upload_avatar():
     """Handle profile picture upload"""
-    print("[调试] 处理头像上传请求")
+    logger.debug('处理头像上传请求')
     lang = get_current_lang()
     translations = get_translations(lang)
     user_id = session['user_id']
     
-    if 'avatar' not in request.files:
-        print("[调试] 未找到上传的文件")
-        return jsonify({'success': False, 'message': translations.get('no_file_selected', 'No file selected')}), 400
-    
-    file = request.files['avatar']
-    
-    if file.filename == '':
-        print("[调试] 文件名为空")
-        return jsonify({'success': False, 'message': translations.get('no_file_selected', 'No file selected')}), 400
-    
-    if file and allowed_file(file.filename):
-        # Generate a unique filename
-        file_ext = file.filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"avatar_{user_id}_{uuid.uuid4().hex[:8]}.{file_ext}"
-        filename = secure_filename(unique_filename)
-        
-        # Ensure upload folder exists
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-        
-        # Save the file
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        print(f"[调试] 头像已保存到: {filepath}")
+    # Ensure upload folder exists
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    # 直接按块读取请求体（不经过 request.files），文件头不是图片时立即拒绝
+    try:
+        tmp_path, file_ext = avatars.receive_upload(
+            request.stream, request.content_type, app.config['UPLOAD_FOLDER'],
+            max_size=app.config['MAX_CONTENT_LENGTH'], max_dimension=app.config['AVATAR_MAX_DIMENSION'])
+    except avatars.UploadRejected as e:
+        logger.debug('头像上传被拒绝: %s', e.reason)
+        if e.reason == 'no_file':
+            message, status = translations.get('no_file_selected', 'No file selected'), 400
+        elif e.reason == 'too_large':
+            message, status = translations.get('file_too_large', 'The image is too large.'), 413
+        else:
+            message, status = translations.get('invalid_file_type', 'Invalid file type. Please upload PNG, JPG, JPEG, GIF, or WebP.'), 400
+        return jsonify({'success': False, 'message': message}), status
+
+    # Generate a unique filename（扩展名取自文件内容而不是客户端文件名）
+    filename = f"avatar_{user_id}_{uuid.uuid4().hex[:8]}.{file_ext}"
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    os.replace(tmp_path, filepath)
+    logger.debug('头像已保存到: %s', filepath)
+
+    # Update user's profile_picture in database
+    # 旧头像不在这里删除：不再被引用的文件由后台垃圾回收清理
+    def set_avatar(conn):
+        # Update the database with new avatar filename
+        conn.execute('UPDATE users SET profile_picture = ? WHERE id = ?', (filename, user_id))
+        StatsDB.touch(user_id, conn)
+
+    try:
+        db_pool.write_transaction(set_avatar)
+        logger.debug('数据库已更新，新头像: %s', filename)
+
+        # 缩略图在后台生成，完成后再把头像切换到处理后的文件
+        avatars.schedule_processing(app, user_id, filename)
         
-        # Update user's profile_picture in database
-        conn = get_db_connection()
-        try:
-            # First, get the old avatar to delete it
-            old_avatar = conn.execute('SELECT profile_picture FROM users WHERE id = ?', (user_id,)).fetchone()
-            if old_avatar and old_avatar['profile_picture']:
-                old_filepath = os.path.join(app.config['UPLOAD_FOLDER'], old_avatar['profile_picture'])
-                if os.path.exists(old_filepath):
-                    os.remove(old_filepath)
-                    print(f"[调试] 已删除旧头像: {old_filepath}")
-            
-            # Update the database with new avatar filename
-            conn.execute('UPDATE users SET profile_picture = ? WHERE id = ?', (filename, user_id))
-            conn.commit()
-            print(f"[调试] 数据库已更新，新头像: {filename}")
-            
-            # Return the URL for the new avatar
-            avatar_url = url_for('static', filename=f'uploads/avatars/{filename}')
-            return jsonify({
-                'success': True, 
-                'message': translations.get('avatar_updated', 'Profile picture updated successfully!'),
-                'avatar_url': avatar_url
-            })
-        except Exception as e:
-            print(f"[调试] 更新头像时出现错误: {str(e)}")
-            # If database update fails, remove the uploaded file
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            return jsonify({'success': False, 'message': translations.get('avatar_update_failed', 'Failed to update profile picture')}), 500
-        finally:
-            conn.close()
-    else:
-        print(f"[调试] 文件类型不支持: {file.filename}")
+        # Return the URL for the new avatar（原图，用于立即预览）
+        avatar_url = url_for('avatar_file', filename=filename)
         return jsonify({
-            'success': False, 
-            'message': translations.get('invalid_file_type', 'Invalid file type. Please upload PNG, JPG, JPEG, GIF, or WebP.')
-        }), 400
+            'success': True, 
+            'message': translations.get('avatar_updated', 'Profile picture updated successfully!'),
+            'avatar_url': avatar_url
+        })
+    except Exception as e:
+        logger.exception('更新头像时出现错误: %s', e)
+        # If database update fails, remove the uploaded file
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        return jsonify({'success': False, 'message': translations.get('avatar_update_failed', 'Failed to update profile picture')}), 500
 
 
 # 路由：更新个人资料
 @app.route('/update_profile', methods=['POST'])
 @login_required
 def update_profile():
-    print("[调试] 处理更新个人资料请求")
+    logger.debug('处理更新个人资料请求')
     lang = get_current_lang()
     user_id = session['user_id']
 
@@ -3296,26 +3293,26 @@ def update_profile():
     school = request.form.get('school', '')
     education_level = request.form.get('education_level')
     grade = request.form.get('grade', '')
-    print(f"[调试] 更新个人资料请求参数 - user_id: {user_id}, first_name: {first_name}, last_name: {last_name}, "
-          f"phone: {phone}, email: {email}, education_level: {education_level}")
+    logger.debug('更新个人资料请求参数 - user_id: %s, first_name: %s, last_name: %s, phone: %s, email: %s, '
+                 'education_level: %s', user_id, first_name, last_name, phone, email, education_level)
 
-    conn = get_db_connection()
-    try:
-        print("[调试] 执行个人资料更新操作")
+    def update_user(conn):
         conn.execute('''
-            UPDATE users 
-            SET first_name = ?, last_name = ?, phone = ?, email = ?, 
+            UPDATE users
+            SET first_name = ?, last_name = ?, phone = ?, email = ?,
                 gender = ?, birth_date = ?, school = ?, education_level = ?, grade = ?
             WHERE id = ?
         ''', (first_name, last_name, phone, email, gender, birth_date, school, education_level, grade, user_id))
-        conn.commit()
-        print("[调试] 个人资料更新成功")
+        StatsDB.touch(user_id, conn)
+
+    try:
+        logger.debug('执行个人资料更新操作')
+        db_pool.write_transaction(update_user)
+        logger.debug('个人资料更新成功')
         flash('Profile updated successfully!')
     except Exception as e:
-        print(f"[调试] 个人信息更新失败: {str(e)}")
+        logger.exception('个人信息更新失败: %s', e)
         flash(f'Profile update failed: {str(e)}')
-    finally:
-        conn.close()
 
     return redirect(url_for('profile', lang=lang))
 
@@ -3324,7 +3321,7 @@ def update_profile():
 @app.route('/change_password', methods=['POST'])
 @login_required
 def change_password():
-    print("[调试] 处理修改密码请求")
+    logger.debug('处理修改密码请求')
     lang = get_current_lang()
     user_id = session['user_id']
 
@@ -3333,42 +3330,42 @@ def change_password():
     new_password = request.form.get('new_password')
     confirm_new_password = request.form.get('confirm_new_password')
 
-    print(f"[调试] 修改密码请求参数 - user_id: {user_id}")
+    logger.debug('修改密码请求参数 - user_id: %s', user_id)
 
     # 验证新密码是否一致
     if new_password != confirm_new_password:
-        print("[调试] 两次输入的新密码不一致")
+        logger.debug('两次输入的新密码不一致')
         flash('New passwords do not match!')
         return redirect(url_for('profile', lang=lang))
 
     # 验证当前密码
     conn = get_db_connection()
     try:
-        print("[调试] 获取用户当前密码信息")
+        logger.debug('获取用户当前密码信息')
         user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
 
         if not user:
-            print("[调试] 未找到用户信息")
+            logger.debug('未找到用户信息')
             flash('User profile not found!')
             return redirect(url_for('profile', lang=lang))
 
         if not bcrypt.check_password_hash(user['password'], current_password):
-            print("[调试] 当前密码不正确")
+            logger.debug('当前密码不正确')
             flash('Current password is incorrect!')
             return redirect(url_for('profile', lang=lang))
 
         # 更新密码
-        print("[调试] 加密新密码")
+        logger.debug('加密新密码')
         hashed_password = bcrypt.generate_password_hash(new_password).decode('utf-8')
 
-        print("[调试] 执行密码更新操作")
-        conn.execute('UPDATE users SET password = ? WHERE id = ?', (hashed_password, user_id))
-        conn.commit()
+        logger.debug('执行密码更新操作')
+        db_pool.write_transaction(
+            lambda conn: conn.execute('UPDATE users SET password = ? WHERE id = ?', (hashed_password, user_id)), conn)
 
-        print("[调试] 密码修改成功")
+        logger.debug('密码修改成功')
         flash('Password updated successfully!')
     except Exception as e:
-        print(f"[调试] 密码修改失败: {str(e)}")
+        logger.exception('密码修改失败: %s', e)
         flash(f'Password update failed: {str(e)}')
     finally:
         conn.close()
@@ -3380,25 +3377,25 @@ def change_password():
 @app.route('/logout')
 @login_required
 def logout():
-    print("[调试] 处理退出登录请求")
+    logger.debug('处理退出登录请求')
     lang = get_current_lang()
     session.clear()
     # keep language after clearing session
     session['lang'] = lang
-    print("[调试] 会话已清除，用户已退出登录")
+    logger.debug('会话已清除，用户已退出登录')
     return redirect(url_for('login', lang=lang))
 
 
 # 路由：根路径
 @app.route('/')
 def index():
-    print("[调试] 访问根路径，检查用户登录状态")
+    logger.debug('访问根路径，检查用户登录状态')
     lang = get_current_lang()
     if 'user_id' in session:
-        print("[调试] 用户已登录，重定向到仪表盘")
+        logger.debug('用户已登录，重定向到仪表盘')
         return redirect(url_for('dashboard', lang=lang))
     else:
-        print("[调试] 用户未登录，重定向到登录页面")
+        logger.debug('用户未登录，重定向到登录页面')
         return redirect(url_for('login', lang=lang))
 
 
@@ -3406,45 +3403,47 @@ def index():
 @app.route('/tasks/update_status/<int:task_id>', methods=['POST'])
 @login_required
 def update_task_status(task_id):
-    print(f"[调试] 处理更新任务状态请求，任务ID: {task_id}")
+    logger.debug('处理更新任务状态请求，任务ID: %s', task_id)
     translations = get_translations(get_current_lang())
     user_id = session['user_id']
     # 获取请求数据
     data = request.get_json()
     new_status = data.get('status', 'completed')
 
-    print(f"[调试] 更新任务状态 - 任务ID: {task_id}, 新状态: {new_status}")
+    logger.debug('更新任务状态 - 任务ID: %s, 新状态: %s', task_id, new_status)
 
-    conn = get_db_connection()
-    try:
-        print(f"[调试] 验证任务 {task_id} 是否属于用户 {user_id}")
+    def update_status(conn):
+        logger.debug('验证任务 %s 是否属于用户 %s', task_id, user_id)
         # 首先验证任务是否属于当前用户
         task = conn.execute('SELECT * FROM tasks WHERE id = ? AND user_id = ?', (task_id, user_id)).fetchone()
-
         if not task:
-            print(f"[调试] 任务 {task_id} 不存在或不属于用户 {user_id}")
-            return jsonify({'success': False, 'message': translations.get('task_not_found_or_no_permission', 'Task not found or you do not have permission to edit this task!')}), 403
+            return False
 
-        print(f"[调试] 更新任务 {task_id} 的状态为 {new_status}")
+        logger.debug('更新任务 %s 的状态为 %s', task_id, new_status)
         # 更新任务状态
         conn.execute('UPDATE tasks SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?', (new_status, task_id))
-        conn.commit()
+        StatsDB.record_task_status_change(user_id, task['status'], new_status, conn, task['updated_at'])
+        return True
 
-        print(f"[调试] 任务 {task_id} 状态更新成功")
+    try:
+        if not db_pool.write_transaction(update_status):
+            logger.debug('任务 %s 不存在或不属于用户 %s', task_id, user_id)
+            return jsonify({'success': False, 'message': translations.get('task_not_found_or_no_permission', 'Task not found or you do not have permission to edit this task!')}), 403
+
+        logger.debug('任务 %s 状态更新成功', task_id)
         return jsonify({'success': True, 'message': translations.get('task_status_updated', 'Task status updated successfully!')})
 
     except Exception as e:
-        print(f"[调试] 更新任务状态失败: {str(e)}")
+        logger.exception('更新任务状态失败: %s', e)
         return jsonify({'success': False, 'message': f"{translations.get('task_status_update_failed', 'Failed to update task status')}: {str(e)}"}), 500
-    finally:
-        conn.close()
 
 
 if __name__ == '__main__':
-    print("[调试] 应用启动中...")
+    logger.info('应用启动中...')
     # 初始化数据库
     if not os.path.exists(app.config['DATABASE']):
-        print("[调试] 数据库文件不存在，正在初始化...")
-        init_db()
-    print("[调试] 应用启动成功，运行在debug模式")
+        logger.info('数据库文件不存在，正在初始化...')
+        with app.app_context():
+            init_db()
+    logger.info('应用启动成功，运行在debug模式')
     app.run(debug=True)
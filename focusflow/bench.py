@@ -0,0 +1,1377 @@
+import contextvars
+import importlib.util
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import re
+import resource
+import shutil
+import socket
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, g, request_finished
+from flask.cli import AppGroup, ScriptInfo
+from flask.testing import FlaskClient
+
+from database import DailyStatsDB, FocusSessionDB, StatsDB
+from utils import avatars, group_commit
+from utils.db import connect, write_stats, write_transaction
+from utils.migrations import migrate
+
+# 性能基准与检查命令：flask bench <name>
+bench_cli = AppGroup('bench', help='Performance benchmarks and checks.')
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+
+
+def _load_app():
+    """获取应用对象（不通过 with_appcontext 再推入一层应用上下文）"""
+    return click.get_current_context().find_object(ScriptInfo).load_app()
+
+
+class _BenchClient(FlaskClient):
+    """每个请求都在全新的 contextvars 上下文中执行
+
+    flask 命令行在加载应用时已经推入了一个应用上下文，测试请求会复用它，
+    导致 g.db 等状态在请求之间泄漏；放到空上下文里运行可以保证每个请求
+    和线上一样拥有独立的应用上下文，连接在请求结束时归还。
+    """
+
+    def open(self, *args, **kwargs):
+        return contextvars.Context().run(super().open, *args, **kwargs)
+
+
+def _create_bench_db(directory, name):
+    """在临时目录中按 schema.sql 建一个空库并插入一个测试用户"""
+    path = os.path.join(directory, name)
+    conn = sqlite3.connect(path)
+    with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
+        conn.executescript(f.read())
+    migrate(conn)
+    conn.execute('''
+        INSERT INTO users (phone, first_name, last_name, email, education_level, password)
+        VALUES ('10000000000', 'Bench', 'User', 'bench@example.com', 'Undergraduate', 'x')
+    ''')
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _run_concurrency(path, pragmas, cached_statements, readers, writers, seconds):
+    """读线程模拟仪表盘查询，写线程模拟 /focus/save_session，统计吞吐和锁错误"""
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0}
+    lock = threading.Lock()
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def reader():
+        conn = connect(path, pragmas, cached_statements)
+        while not stop.is_set():
+            try:
+                conn.execute('''
+                    SELECT SUM(duration) FROM focus_sessions
+                    WHERE user_id = 1 AND end_time IS NOT NULL
+                ''').fetchone()
+                bump('reads')
+            except sqlite3.OperationalError:
+                bump('read_errors')
+        conn.close()
+
+    def writer():
+        conn = connect(path, pragmas, cached_statements)
+        while not stop.is_set():
+            try:
+                conn.execute('''
+                    INSERT INTO focus_sessions (user_id, task_id, duration, start_time, end_time)
+                    VALUES (1, NULL, 25, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                ''')
+                conn.commit()
+                bump('writes')
+            except sqlite3.OperationalError:
+                conn.rollback()
+                bump('write_errors')
+        conn.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return counts
+
+
+@bench_cli.command('sqlite-tuning')
+@click.option('--readers', default=4, show_default=True, help='Concurrent reader threads.')
+@click.option('--writers', default=2, show_default=True, help='Concurrent writer threads.')
+@click.option('--seconds', default=3.0, show_default=True, help='Duration of each run.')
+def sqlite_tuning_command(readers, writers, seconds):
+    """Compare read/write concurrency with SQLite defaults vs. the configured tuning profile."""
+    profiles = [
+        ('defaults', {}, 128),
+        ('tuned', current_app.config.get('SQLITE_PRAGMAS') or {},
+         current_app.config.get('SQLITE_CACHED_STATEMENTS', 128)),
+    ]
+    workdir = tempfile.mkdtemp(prefix='focusflow-bench-')
+    try:
+        click.echo(f'readers={readers} writers={writers} seconds={seconds}')
+        click.echo(f"{'profile':<10}{'reads/s':>12}{'writes/s':>12}{'read err':>10}{'write err':>11}")
+        for name, pragmas, cached in profiles:
+            path = _create_bench_db(workdir, f'{name}.db')
+            counts = _run_concurrency(path, pragmas, cached, readers, writers, seconds)
+            click.echo(f"{name:<10}{counts['reads'] / seconds:>12.0f}{counts['writes'] / seconds:>12.0f}"
+                       f"{counts['read_errors']:>10}{counts['write_errors']:>11}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _seed_user_activity(path, user_id=1, days=30, tasks_per_day=3, sessions_per_day=4):
+    """为测试用户生成最近若干天的任务、标签、专注记录和签到"""
+    conn = sqlite3.connect(path)
+    now = datetime.now()
+    tasks, sessions, checkins = [], [], []
+    for day in range(days):
+        moment = now - timedelta(days=day)
+        date_str = moment.strftime('%Y-%m-%d')
+        stamp = moment.strftime('%Y-%m-%d %H:%M:%S')
+        for i in range(tasks_per_day):
+            status = 'completed' if i % 2 == 0 else 'pending'
+            tasks.append((user_id, f'Task {day}-{i}', 'Bench', status, date_str, stamp, stamp))
+        for _ in range(sessions_per_day):
+            sessions.append((user_id, 25, stamp, stamp))
+        if day % 3 != 2:
+            checkins.append((user_id, date_str))
+    conn.executemany('''
+        INSERT INTO tasks (user_id, title, course, status, due_date, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', tasks)
+    conn.executemany('''
+        INSERT INTO task_tags (task_id, tag) SELECT id, 'bench' FROM tasks WHERE user_id = ?
+    ''', [(user_id,)])
+    conn.executemany('''
+        INSERT INTO focus_sessions (user_id, duration, start_time, end_time) VALUES (?, ?, ?, ?)
+    ''', sessions)
+    conn.executemany('INSERT INTO checkins (user_id, date) VALUES (?, ?)', checkins)
+    # 直接写入的明细不经过增量维护，按明细重建该用户的每日汇总
+    DailyStatsDB.rebuild(user_id, conn)
+    conn.commit()
+    conn.close()
+
+
+@contextmanager
+def _capture_statements(app, statements):
+    """收集测试请求执行过的 SQL（已代入参数），数据来自请求级 SQL 统计"""
+
+    def collect(sender, response, **extra):
+        profile = g.get('sql_profile')
+        if profile is not None:
+            statements.extend(sql for sql, _ in profile.statements)
+
+    original = app.config.get('SQL_INSTRUMENTATION')
+    app.config['SQL_INSTRUMENTATION'] = True
+    request_finished.connect(collect, app)
+    try:
+        yield statements
+    finally:
+        request_finished.disconnect(collect, app)
+        app.config['SQL_INSTRUMENTATION'] = original
+
+
+@contextmanager
+def _bench_database(app, path, pool=None):
+    """把应用临时指向基准库，结束后恢复原数据库配置"""
+    original = app.config['DATABASE']
+    app.config['DATABASE'] = path
+    if pool is not None:
+        app.extensions['sqlite_pool'] = pool
+    try:
+        yield
+    finally:
+        app.config['DATABASE'] = original
+        stale = app.extensions.pop('sqlite_pool', None)
+        if stale is not None:
+            stale.close_all()
+
+
+@contextmanager
+def _bench_client(app, path, pool=None, user_id=1):
+    """返回一个已登录测试用户、指向基准库的测试客户端"""
+    with _bench_database(app, path, pool):
+        client = _BenchClient(app, app.response_class, use_cookies=True)
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+        yield client
+
+
+# 查询计划中的全表扫描：SCAN 表名 且没有 USING INDEX
+_FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+# 把时间列包在 date() 里会让复合索引只能用到 user_id 前缀
+_WRAPPED_DATE_COLUMN = re.compile(r'\bdate\(\s*(?:\w+\.)?(start_time|end_time|due_date|updated_at|created_at|date)\s*\)',
+                                  re.IGNORECASE)
+
+# 查询计划检查覆盖的页面（before_request 会在每个页面中一并执行）
+PLAN_CHECK_ROUTES = ['/dashboard', '/reports', '/focus', '/focus/stats', '/profile', '/tasks']
+
+
+@bench_cli.command('query-plans', with_appcontext=False)
+def query_plans_command():
+    """Fail if any query issued by the analytics pages does a full table scan."""
+    app = _load_app()
+    workdir = tempfile.mkdtemp(prefix='focusflow-bench-')
+    try:
+        path = _create_bench_db(workdir, 'plans.db')
+        _seed_user_activity(path)
+        statements = []
+        with _bench_client(app, path) as client, _capture_statements(app, statements):
+            for route in PLAN_CHECK_ROUTES:
+                response = client.get(route)
+                if response.status_code != 200:
+                    raise click.ClickException(f'{route} returned {response.status_code}')
+
+        conn = sqlite3.connect(path)
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        failures = []
+        checked = set()
+        for sql in statements:
+            sql = sql.strip()
+            if not sql.upper().startswith(('SELECT', 'WITH')) or sql in checked:
+                continue
+            checked.add(sql)
+            if _WRAPPED_DATE_COLUMN.search(sql):
+                failures.append(('non-sargable date()', ' '.join(sql.split())))
+            for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}'):
+                match = _FULL_SCAN.match(row[3])
+                if match and match.group(1) in tables:
+                    failures.append((row[3], ' '.join(sql.split())))
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    click.echo(f'Checked {len(checked)} distinct queries from {len(PLAN_CHECK_ROUTES)} routes.')
+    for detail, sql in failures:
+        click.echo(f'FAIL ({detail}): {sql}', err=True)
+    if failures:
+        sys.exit(1)
+    click.echo('No full table scans or non-sargable date predicates.')
+
+
+def _legacy_trend(conn, user_id, days):
+    """旧的逐日循环实现（每天三条查询），仅用于对比"""
+    trend = []
+    for i in range(days - 1, -1, -1):
+        date = datetime.now() - timedelta(days=i)
+        date_str = date.strftime('%Y-%m-%d')
+        next_date_str = (date + timedelta(days=1)).strftime('%Y-%m-%d')
+        checked_in = conn.execute('SELECT * FROM checkins WHERE user_id = ? AND date = ?',
+                                  (user_id, date_str)).fetchone() is not None
+        minutes = conn.execute('''
+            SELECT SUM(duration) as total_minutes FROM focus_sessions
+            WHERE user_id = ? AND start_time >= ? AND start_time < ?
+        ''', (user_id, date_str, next_date_str)).fetchone()['total_minutes'] or 0
+        tasks = conn.execute('''
+            SELECT id, title, description, course, updated_at as completion_time FROM tasks
+            WHERE user_id = ? AND status = 'completed' AND updated_at >= ? AND updated_at < ?
+            ORDER BY updated_at DESC
+        ''', (user_id, date_str, next_date_str)).fetchall()
+        trend.append((date_str, checked_in, minutes, len(tasks)))
+    return trend
+
+
+def _time_queries(conn, func, repeat):
+    """返回 (单次平均毫秒数, 单次查询条数)"""
+    statements = []
+    conn.set_trace_callback(statements.append)
+    func()
+    conn.set_trace_callback(None)
+    queries = sum(1 for sql in statements if sql.lstrip().upper().startswith('SELECT'))
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) * 1000 / repeat, queries
+
+
+@bench_cli.command('trend', with_appcontext=False)
+@click.option('--days', 'windows', default='7,30,365', show_default=True, help='Comma separated window sizes.')
+@click.option('--repeat', default=20, show_default=True, help='Iterations per measurement.')
+def trend_command(windows, repeat):
+    """Compare the per-day trend loop with the grouped trend queries."""
+    from database import ReportDB
+    from utils.db import get_db
+
+    app = _load_app()
+    windows = [int(value) for value in windows.split(',')]
+    workdir = tempfile.mkdtemp(prefix='focusflow-bench-')
+    try:
+        path = _create_bench_db(workdir, 'trend.db')
+        _seed_user_activity(path, days=max(windows))
+        with _bench_database(app, path), app.app_context():
+            conn = get_db()
+            click.echo(f"{'days':>6}{'loop ms':>12}{'loop queries':>14}{'grouped ms':>12}{'grouped queries':>17}")
+            for days in windows:
+                loop_ms, loop_queries = _time_queries(conn, lambda: _legacy_trend(conn, 1, days), repeat)
+                grouped_ms, grouped_queries = _time_queries(
+                    conn, lambda: ReportDB.get_daily_trend(1, days=days), repeat)
+                click.echo(f'{days:>6}{loop_ms:>12.2f}{loop_queries:>14}{grouped_ms:>12.2f}{grouped_queries:>17}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _raw_window_totals(conn, user_id, start_date):
+    """直接聚合明细表的窗口统计（每日汇总之前的做法），仅用于对比"""
+    focus = conn.execute('''
+        SELECT COALESCE(SUM(duration), 0), COUNT(*) FROM focus_sessions WHERE user_id = ? AND start_time >= ?
+    ''', (user_id, start_date)).fetchone()
+    completed = conn.execute('''
+        SELECT COUNT(*) FROM tasks WHERE user_id = ? AND status = 'completed' AND updated_at >= ?
+    ''', (user_id, start_date)).fetchone()[0]
+    checkins = conn.execute('SELECT COUNT(*) FROM checkins WHERE user_id = ? AND date >= ?',
+                            (user_id, start_date)).fetchone()[0]
+    return focus[0], focus[1], completed, checkins
+
+
+@bench_cli.command('rollup', with_appcontext=False)
+@click.option('--years', default=3, show_default=True, help='Years of history for the test user.')
+@click.option('--sessions-per-day', default=8, show_default=True)
+@click.option('--windows', default='7,30,365', show_default=True, help='Comma separated window sizes in days.')
+@click.option('--repeat', default=200, show_default=True, help='Iterations per measurement.')
+def rollup_command(years, sessions_per_day, windows, repeat):
+    """Window totals aggregated from the raw tables vs. read from daily_user_stats."""
+    windows = [int(value) for value in windows.split(',')]
+    workdir = tempfile.mkdtemp(prefix='focusflow-bench-')
+    try:
+        path = _create_bench_db(workdir, 'rollup.db')
+        _seed_user_activity(path, days=365 * years, tasks_per_day=2, sessions_per_day=sessions_per_day)
+        conn = connect(path)
+        conn.row_factory = sqlite3.Row
+        today = datetime.now().date()
+        click.echo(f'{365 * years} days, {sessions_per_day} sessions/day')
+        click.echo(f"{'days':>6}{'raw ms':>10}{'rollup ms':>11}{'speedup':>9}  match")
+        for days in windows:
+            start_date = (today - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+            raw = _raw_window_totals(conn, 1, start_date)
+            rollup = tuple(DailyStatsDB.totals(1, start_date, conn=conn))
+            raw_ms, _ = _time_queries(conn, lambda: _raw_window_totals(conn, 1, start_date), repeat)
+            rollup_ms, _ = _time_queries(conn, lambda: DailyStatsDB.totals(1, start_date, conn=conn), repeat)
+            click.echo(f'{days:>6}{raw_ms:>10.3f}{rollup_ms:>11.3f}{raw_ms / rollup_ms:>8.1f}x  {raw == rollup}')
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+@bench_cli.command('i18n')
+@click.option('--lang', default='zh-CN', show_default=True)
+@click.option('--lookups', default=3, show_default=True,
+              help='get_translations() calls per request (context processor, before_request, route).')
+@click.option('--repeat', default=2000, show_default=True, help='Simulated requests.')
+def i18n_command(lang, lookups, repeat):
+    """Per-request translation cost: rebuilding the tables vs. the cached catalogs."""
+    catalogs = current_app.extensions['i18n']
+    loader = catalogs._loader
+
+    def rebuild():
+        # 旧实现：每次调用都重新构建全部语言的字面量并复制英语回退
+        tables = loader()
+        result = tables[catalogs.fallback].copy()
+        if lang in tables and lang != catalogs.fallback:
+            result.update(tables[lang])
+        return result
+
+    results = []
+    for name, lookup in [('rebuild', rebuild), ('cached', lambda: catalogs.get(lang))]:
+        lookup()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for _ in range(lookups):
+                lookup()
+        results.append((name, (time.perf_counter() - started) * 1e6 / repeat))
+    click.echo(f'lang={lang} lookups/request={lookups} requests={repeat}')
+    for name, per_request in results:
+        click.echo(f'{name:<8}{per_request:>10.1f} us/request')
+
+
+def _seed_tasks(path, count, user_id=1, tags_per_task=2):
+    """为测试用户批量生成 count 个任务及其标签"""
+    conn = sqlite3.connect(path)
+    today = datetime.now().date()
+    conn.executemany('''
+        INSERT INTO tasks (user_id, title, description, course, priority, status, due_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(user_id, f'Task {i}', 'Synthetic task', f'Course {i % 7}', ('high', 'medium', 'low')[i % 3],
+           ('pending', 'in_progress', 'completed')[i % 3], (today + timedelta(days=i % 60 - 20)).strftime('%Y-%m-%d'))
+          for i in range(count)])
+    conn.execute('''
+        INSERT INTO task_tags (task_id, tag)
+        SELECT t.id, 'tag' || ((t.id + n.value) % 12)
+        FROM tasks t JOIN (SELECT 0 AS value UNION ALL SELECT 1 UNION ALL SELECT 2) n ON n.value < ?
+        WHERE t.user_id = ?
+    ''', (tags_per_task, user_id))
+    DailyStatsDB.rebuild(user_id, conn)
+    conn.commit()
+    conn.close()
+
+
+@bench_cli.command('tasks-page', with_appcontext=False)
+@click.option('--sizes', default='10,100,1000,10000', show_default=True, help='Tasks per user, comma separated.')
+@click.option('--repeat', default=5, show_default=True, help='Requests per size.')
+def tasks_page_command(sizes, repeat):
+    """Render time and query count of /tasks for users with N tasks."""
+    app = _load_app()
+    workdir = tempfile.mkdtemp(prefix='focusflow-bench-')
+    try:
+        click.echo(f"{'tasks':>7}{'queries':>9}{'mean ms':>10}{'min ms':>10}")
+        for size in [int(value) for value in sizes.split(',')]:
+            path = _create_bench_db(workdir, f'tasks-{size}.db')
+            _seed_tasks(path, size)
+            statements = []
+            with _bench_client(app, path) as client:
+                with _capture_statements(app, statements):
+                    client.get('/tasks')
+                queries = sum(1 for sql in statements if sql.lstrip().upper().startswith('SELECT'))
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    response = client.get('/tasks')
+                    timings.append((time.perf_counter() - started) * 1000)
+                    if response.status_code != 200:
+                        raise click.ClickException(f'/tasks returned {response.status_code}')
+            click.echo(f'{size:>7}{queries:>9}{sum(timings) / len(timings):>10.1f}{min(timings):>10.1f}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# 响应压缩基准覆盖的页面和接口
+COMPRESSION_ROUTES = ['/dashboard', '/tasks', '/reports', '/focus/stats']
+
+
+@bench_cli.command('compression', with_appcontext=False)
+@click.option('--tasks', default=300, show_default=True, help='Extra tasks for the test user (task cards on /tasks).')
+@click.option('--repeat', default=50, show_default=True, help='Compressions per route for the CPU timing.')
+def compression_command(tasks, repeat):
+    """Bytes on the wire and compression CPU time per route for identity, gzip and br."""
+    from utils import compression
+
+    app = _load_app()
+    level = app.config['COMPRESS_LEVEL']
+    br_quality = app.config['COMPRESS_BR_QUALITY']
+    encodings = ['gzip'] + (['br'] if compression.brotli is not None else [])
+    workdir = tempfile.mkdtemp(prefix='focusflow-bench-')
+    original = app.config['COMPRESS_ENABLED']
+    app.config['COMPRESS_ENABLED'] = True
+    try:
+        path = _create_bench_db(workdir, 'compression.db')
+        _seed_user_activity(path)
+        _seed_tasks(path, tasks)
+        header = f"{'route':<14}{'identity':>10}"
+        for encoding in encodings:
+            header += f'{encoding:>9}{"ratio":>7}{"cpu ms":>8}'
+        click.echo(f'gzip level={level} br quality={br_quality} min size={app.config["COMPRESS_MIN_SIZE"]}')
+        click.echo(header)
+        with _bench_client(app, path) as client:
+            for route in COMPRESSION_ROUTES:
+                response = client.get(route, headers={'Accept-Encoding': 'identity'})
+                if response.status_code != 200:
+                    raise click.ClickException(f'{route} returned {response.status_code}')
+                body = response.get_data()
+                line = f'{route:<14}{len(body):>10}'
+                for encoding in encodings:
+                    wire = len(client.get(route, headers={'Accept-Encoding': encoding}).get_data())
+                    started = time.process_time()
+                    for _ in range(repeat):
+                        compression.compress(body, encoding, level, br_quality)
+                    cpu_ms = (time.process_time() - started) * 1000 / repeat
+                    line += f'{wire:>9}{len(body) / wire:>7.1f}{cpu_ms:>8.2f}'
+                click.echo(line)
+    finally:
+        app.config['COMPRESS_ENABLED'] = original
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# 支持条件请求（ETag / 304）的页面和接口
+CONDITIONAL_ROUTES = ['/focus/stats', '/dashboard', '/reports']
+
+
+@bench_cli.command('conditional', with_appcontext=False)
+@click.option('--repeat', default=50, show_default=True, help='Requests per route and mode.')
+def conditional_command(repeat):
+    """Query count and latency of a full response vs. a 304 revalidation per route."""
+    app = _load_app()
+    workdir = tempfile.mkdtemp(prefix='focusflow-bench-')
+    try:
+        path = _create_bench_db(workdir, 'conditional.db')
+        _seed_user_activity(path, days=365)
+        click.echo(f"{'route':<14}{'200 queries':>12}{'200 ms':>9}{'304 queries':>13}{'304 ms':>9}")
+        with _bench_client(app, path) as client:
+            # 第一个请求会从明细重建 user_stats，之后才有数据版本
+            client.get('/focus/stats')
+            for route in CONDITIONAL_ROUTES:
+                etag = client.get(route).headers.get('ETag')
+                if etag is None:
+                    raise click.ClickException(f'{route} returned no ETag')
+                line = f'{route:<14}'
+                for headers, expected in [({}, 200), ({'If-None-Match': etag}, 304)]:
+                    statements = []
+                    with _capture_statements(app, statements):
+                        client.get(route, headers=headers)
+                    started = time.perf_counter()
+                    for _ in range(repeat):
+                        response = client.get(route, headers=headers)
+                        if response.status_code != expected:
+                            raise click.ClickException(f'{route} returned {response.status_code}, expected {expected}')
+                    elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+                    line += f'{len(statements):>12}{elapsed_ms:>9.2f}' if expected == 200 else \
+                        f'{len(statements):>13}{elapsed_ms:>9.2f}'
+                click.echo(line)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+@bench_cli.command('report-cache', with_appcontext=False)
+@click.option('--users', default=50, show_default=True, help='Users with a year of activity.')
+@click.option('--repeat', default=5, show_default=True, help='Report views per user.')
+@click.option('--size', default=512, show_default=True, help='Cache capacity (entries).')
+def report_cache_command(users, repeat, size):
+    """Report build time uncached vs. memory and shared SQLite cache hits, with cache metrics."""
+    from database import ReportDB
+    from utils.report_cache import MemoryBackend, ReportCache, SQLiteBackend, report_key
+
+    workdir = tempfile.mkdtemp(prefix='focusflow-bench-')
+    try:
+        path = _create_bench_db(workdir, 'reports.db')
+        conn = sqlite3.connect(path)
+        conn.executemany('''
+            INSERT INTO users (phone, first_name, last_name, email, education_level, password)
+            VALUES (?, 'Bench', 'User', ?, 'Undergraduate', 'x')
+        ''', [(f'1{n:010d}', f'bench{n}@example.com') for n in range(2, users + 1)])
+        conn.commit()
+        conn.close()
+        for user_id in range(1, users + 1):
+            _seed_user_activity(path, user_id=user_id, days=365, tasks_per_day=1, sessions_per_day=2)
+        conn = connect(path)
+        conn.row_factory = sqlite3.Row
+        today = datetime.now().date()
+        # 先完整计算一轮，让各后端的对比不受数据库页缓存冷启动影响
+        for user_id in range(1, users + 1):
+            ReportDB.build_weekly_report(user_id, today, conn)
+        caches = [
+            ('none', None),
+            ('memory', ReportCache(MemoryBackend(size))),
+            ('sqlite', ReportCache(SQLiteBackend(os.path.join(workdir, 'cache.db'), size))),
+        ]
+        click.echo(f"{'backend':<9}{'ms/view':>9}{'hits':>7}{'misses':>8}{'evicted':>9}{'entries':>9}")
+        for name, cache in caches:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                for user_id in range(1, users + 1):
+                    build = lambda: ReportDB.build_weekly_report(user_id, today, conn)
+                    if cache is None:
+                        build()
+                    else:
+                        cache.get_or_build(report_key(user_id, 'en-US', today - timedelta(days=6), today, 1), build)
+            elapsed_ms = (time.perf_counter() - started) * 1000 / (repeat * users)
+            if cache is None:
+                click.echo(f'{name:<9}{elapsed_ms:>9.3f}')
+                continue
+            stats = cache.stats()
+            click.echo(f"{name:<9}{elapsed_ms:>9.3f}{stats['hits']:>7}{stats['misses']:>8}"
+                       f"{stats['evictions']:>9}{stats['entries']:>9}")
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# 路由基准使用的数据规模：(用户数, 月数)，由 flask seed 的生成器按固定种子生成
+ROUTE_BENCH_SIZES = {'small': (10, 1), 'medium': (100, 6), 'large': (400, 12)}
+# 基线与机器相关，保存在本地（不纳入版本库）
+ROUTE_BENCH_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+
+def _route_calls(task_id):
+    """路由基准覆盖的请求：路由 -> (发送第 i 次请求的函数, 期望的状态码)"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    return {
+        '/dashboard': (lambda client, i: client.get('/dashboard'), 200),
+        '/tasks': (lambda client, i: client.get('/tasks'), 200),
+        '/reports': (lambda client, i: client.get('/reports'), 200),
+        '/focus': (lambda client, i: client.get('/focus'), 200),
+        '/focus/stats': (lambda client, i: client.get('/focus/stats'), 200),
+        '/profile': (lambda client, i: client.get('/profile'), 200),
+        '/focus/save_session': (lambda client, i: client.post(
+            '/focus/save_session', json={'duration': 25, 'task_id': task_id}), 200),
+        '/tasks/add': (lambda client, i: client.post('/tasks/add', data={
+            'task_title': f'Bench task {i}', 'task_due_date': today, 'task_tags': 'bench,load'}), 302),
+        '/tasks/update_status': (lambda client, i: client.post(
+            f'/tasks/update_status/{task_id}', json={'status': ('completed', 'pending')[i % 2]}), 200),
+    }
+
+
+def _percentile(samples, percent):
+    """最近秩法百分位数"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(len(ordered) * percent / 100) - 1)]
+
+
+def _measure_routes(app, path, user_id, task_id, warmup, repeat):
+    """每个路由请求 warmup + repeat 次，返回 {路由: {'p50_ms', 'p95_ms', 'queries'}}"""
+    query_counts = []
+
+    def count_queries(sender, response, **extra):
+        profile = g.get('sql_profile')
+        if profile is not None:
+            query_counts.append(len(profile.statements))
+
+    results = {}
+    original = app.config.get('SQL_INSTRUMENTATION')
+    app.config['SQL_INSTRUMENTATION'] = True
+    request_finished.connect(count_queries, app)
+    try:
+        with _bench_client(app, path, user_id=user_id) as client:
+            for route, (call, expected) in _route_calls(task_id).items():
+                timings = []
+                query_counts.clear()
+                for i in range(warmup + repeat):
+                    started = time.perf_counter()
+                    response = call(client, i)
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    if response.status_code != expected:
+                        raise click.ClickException(f'{route} returned {response.status_code}, expected {expected}')
+                    if i >= warmup:
+                        timings.append(elapsed_ms)
+                    # 写请求留下的提示消息不带到后面的请求（会话 cookie 会越来越大）
+                    with client.session_transaction() as sess:
+                        sess.pop('_flashes', None)
+                results[route] = {'p50_ms': round(_percentile(timings, 50), 3),
+                                  'p95_ms': round(_percentile(timings, 95), 3),
+                                  'queries': max(query_counts, default=0)}
+    finally:
+        request_finished.disconnect(count_queries, app)
+        app.config['SQL_INSTRUMENTATION'] = original
+    return results
+
+
+def _compare_routes(results, baseline, tolerance, slack_ms):
+    """与基线比较：p95 超过 基线 × (1 + tolerance) + slack_ms，或查询条数增加，都算回归"""
+    failures = []
+    for size, routes in results.items():
+        for route, current in routes.items():
+            previous = baseline.get(size, {}).get(route)
+            if previous is None:
+                continue
+            limit = previous['p95_ms'] * (1 + tolerance) + slack_ms
+            if current['p95_ms'] > limit:
+                failures.append(f"{size} {route}: p95 {current['p95_ms']:.2f} ms > {limit:.2f} ms "
+                                f"(baseline {previous['p95_ms']:.2f} ms)")
+            if current['queries'] > previous['queries']:
+                failures.append(f"{size} {route}: {current['queries']} queries > baseline {previous['queries']}")
+    return failures
+
+
+@bench_cli.command('routes', with_appcontext=False)
+@click.option('--sizes', default=','.join(ROUTE_BENCH_SIZES), show_default=True,
+              help='Comma separated dataset sizes: ' + ', '.join(
+                  f'{name} = {users} users x {months} months' for name, (users, months) in ROUTE_BENCH_SIZES.items()))
+@click.option('--warmup', default=3, show_default=True, help='Untimed requests per route.')
+@click.option('--repeat', default=30, show_default=True, help='Timed requests per route.')
+@click.option('--baseline', type=click.Path(dir_okay=False), default=ROUTE_BENCH_BASELINE, show_default=True,
+              help='JSON baseline to compare with (or to write with --save).')
+@click.option('--save', is_flag=True, help='Store these results as the new baseline instead of comparing.')
+@click.option('--tolerance', default=0.25, show_default=True, help='Allowed relative p95 increase.')
+@click.option('--slack-ms', default=2.0, show_default=True, help='Allowed absolute p95 increase (timer noise).')
+def routes_command(sizes, warmup, repeat, baseline, save, tolerance, slack_ms):
+    """p50/p95 latency and query count of the hot routes on seeded databases, checked against a baseline."""
+    from utils.seed import SeedProfile, generate
+
+    app = _load_app()
+    sizes = [size.strip() for size in sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in ROUTE_BENCH_SIZES]
+    if unknown:
+        raise click.BadParameter(f"unknown size(s): {', '.join(unknown)}", param_hint='--sizes')
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='focusflow-bench-')
+    try:
+        for size in sizes:
+            users, months = ROUTE_BENCH_SIZES[size]
+            path = os.path.join(workdir, f'{size}.db')
+            conn = sqlite3.connect(path)
+            generate(conn, users, SeedProfile(months=months), seed=42)
+            # 测量数据最多的用户（最坏情况），写请求针对其最新的任务
+            user_id = conn.execute('''
+                SELECT user_id FROM user_stats ORDER BY total_tasks + focus_sessions DESC, user_id LIMIT 1
+            ''').fetchone()[0]
+            task_id = conn.execute('SELECT MAX(id) FROM tasks WHERE user_id = ?', (user_id,)).fetchone()[0]
+            conn.close()
+            click.echo(f'{size}: {users} users x {months} months, measuring user {user_id}')
+            results[size] = _measure_routes(app, path, user_id, task_id, warmup, repeat)
+            for route, current in results[size].items():
+                click.echo(f"  {route:<24}{current['p50_ms']:>9.2f} ms p50{current['p95_ms']:>9.2f} ms p95"
+                           f"{current['queries']:>5} queries")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if save:
+        with open(baseline, 'w', encoding='utf-8') as f:
+            json.dump({'created': datetime.now().isoformat(timespec='seconds'), 'repeat': repeat,
+                       'results': results}, f, indent=2, sort_keys=True)
+        click.echo(f'Saved baseline to {baseline}.')
+        return
+    if not os.path.exists(baseline):
+        click.echo(f'No baseline at {baseline}; run with --save to create one.')
+        return
+    with open(baseline, 'r', encoding='utf-8') as f:
+        failures = _compare_routes(results, json.load(f)['results'], tolerance, slack_ms)
+    for failure in failures:
+        click.echo(f'REGRESSION {failure}', err=True)
+    if failures:
+        sys.exit(1)
+    click.echo('No regressions against the baseline.')
+
+
+class _FormatProbe:
+    """记录被格式化次数的日志参数"""
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return 'probe'
+
+    __repr__ = __str__
+
+    def __format__(self, spec):
+        return str(self)
+
+
+@bench_cli.command('logging', with_appcontext=False)
+@click.option('--calls', default=200000, show_default=True, help='Log calls per variant.')
+def logging_command(calls):
+    """Cost of a debug log call when debug is disabled vs. the old print() calls."""
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    logger = logging.getLogger('focusflow.bench.logging')
+    logger.addHandler(handler)
+    logger.propagate = False
+    probe = _FormatProbe()
+    payload = {'weekly_trend': [{'day': '周一', 'value': 1.5}] * 7}
+
+    def run(func):
+        started = time.perf_counter()
+        for _ in range(calls):
+            func()
+        return (time.perf_counter() - started) / calls * 1e9
+
+    try:
+        logger.setLevel(logging.INFO)
+        disabled = run(lambda: logger.debug('趋势数据: %s %s', probe, payload))
+        disabled_output = stream.tell()
+        disabled_formatted = probe.formatted
+
+        old_stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            printed = run(lambda: print(f"[调试] 趋势数据: {probe} {payload}"))
+        finally:
+            sys.stdout = old_stdout
+
+        logger.setLevel(logging.DEBUG)
+        enabled = run(lambda: logger.debug('趋势数据: %s %s', probe, payload))
+    finally:
+        logger.removeHandler(handler)
+
+    click.echo(f"{'variant':<22}{'ns/call':>10}")
+    click.echo(f"{'debug disabled':<22}{disabled:>10.0f}")
+    click.echo(f"{'debug enabled':<22}{enabled:>10.0f}")
+    click.echo(f"{'print(f-string)':<22}{printed:>10.0f}")
+    if disabled_formatted or disabled_output:
+        click.echo(f'Disabled debug calls formatted arguments {disabled_formatted} time(s).')
+        sys.exit(1)
+    click.echo('Disabled debug calls never formatted their arguments.')
+
+
+class _SyntheticUpload:
+    """按需生成的 multipart 请求体：JPEG 文件头加 size 字节的文件内容，本身几乎不占内存"""
+
+    boundary = 'focusflowbenchboundary'
+
+    def __init__(self, size):
+        self.head = (f'--{self.boundary}\r\n'
+                     'Content-Disposition: form-data; name="avatar"; filename="avatar.jpg"\r\n'
+                     'Content-Type: image/jpeg\r\n\r\n').encode() + b'\xff\xd8\xff\xe0'
+        self.tail = f'\r\n--{self.boundary}--\r\n'.encode()
+        self.body_end = len(self.head) + size
+        self.length = self.body_end + len(self.tail)
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        self.position = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length - self.position
+        pieces = []
+        while size > 0 and self.position < self.length:
+            if self.position < len(self.head):
+                piece = self.head[self.position:self.position + size]
+            elif self.position < self.body_end:
+                piece = bytes(min(size, self.body_end - self.position))
+            else:
+                offset = self.position - self.body_end
+                piece = self.tail[offset:offset + size]
+            pieces.append(piece)
+            self.position += len(piece)
+            size -= len(piece)
+        return b''.join(pieces)
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=0):
+        base = {0: 0, 1: self.position, 2: self.length}[whence]
+        self.position = base + offset
+        return self.position
+
+
+def _current_rss_kb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() // 1024
+
+
+def _upload_worker(app, mode, concurrency, size, directory, results):
+    """在子进程中并发接收 concurrency 个上传，返回 (峰值 RSS 增量 KiB, 耗时秒)"""
+    from flask import request
+
+    def receive(index):
+        body = _SyntheticUpload(size)
+        with app.test_request_context('/upload_avatar', method='POST', input_stream=body,
+                                      content_type=body.content_type, content_length=body.length):
+            if mode == 'form':
+                request.files['avatar'].save(os.path.join(directory, f'{mode}-{index}.jpg'))
+            else:
+                # 合成数据只有 JPEG 文件头，不做尺寸检查（它需要真实的图片头）
+                path, _ = avatars.receive_upload(request.stream, request.content_type, directory,
+                                                 max_size=size + 16)
+                os.replace(path, os.path.join(directory, f'{mode}-{index}.jpg'))
+
+    baseline = _current_rss_kb()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=receive, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    results.put((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline, elapsed))
+
+
+@bench_cli.command('uploads', with_appcontext=False)
+@click.option('--concurrency', default=8, show_default=True, help='Concurrent uploads.')
+@click.option('--size-mb', default=4.5, show_default=True, help='Upload size in MiB.')
+def uploads_command(concurrency, size_mb):
+    """Peak RSS while receiving N concurrent avatar uploads: request.files vs. streaming."""
+    app = _load_app()
+    size = int(size_mb * 1024 * 1024)
+    workdir = tempfile.mkdtemp(prefix='focusflow-bench-')
+    context = multiprocessing.get_context('fork')
+    try:
+        click.echo(f'{concurrency} concurrent uploads of {size_mb} MiB')
+        click.echo(f"{'path':<18}{'peak RSS +MiB':>15}{'seconds':>10}")
+        for mode, label in (('form', 'request.files'), ('stream', 'streaming')):
+            # 每种方式在独立的子进程中运行，峰值 RSS 互不影响
+            results = context.Queue()
+            process = context.Process(target=_upload_worker,
+                                      args=(app, mode, concurrency, size, workdir, results))
+            process.start()
+            peak_kb, elapsed = results.get()
+            process.join()
+            click.echo(f'{label:<18}{peak_kb / 1024:>15.1f}{elapsed:>10.2f}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# 没有安装 gunicorn 时用 werkzeug 的多进程（每个请求 fork 一个子进程）服务器代替
+_LOCAL_SERVER_SCRIPT = '''
+import sys
+from werkzeug.serving import run_simple
+from wsgi import app
+run_simple('127.0.0.1', int(sys.argv[1]), app, processes=int(sys.argv[2]), threaded=False)
+'''
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(database, workers, log_path):
+    """在本机启动 wsgi.py（gunicorn 或 werkzeug 多进程），返回 (进程, 基础 URL)"""
+    port = _free_port()
+    env = dict(os.environ, FOCUSFLOW_DATABASE=database, LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'),
+               FOCUSFLOW_CONFIG=os.environ.get('FOCUSFLOW_CONFIG', 'production'))
+    if importlib.util.find_spec('gunicorn') is not None:
+        command = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+                   '--log-level', 'warning', 'wsgi:app']
+    else:
+        command = [sys.executable, '-c', _LOCAL_SERVER_SCRIPT, str(port), str(workers)]
+    log = open(log_path, 'wb')
+    process = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                               stdout=log, stderr=subprocess.STDOUT)
+    log.close()
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise click.ClickException(f'Server exited with {process.returncode}; see {log_path}')
+        try:
+            with urllib.request.urlopen(base_url + '/login', timeout=2):
+                return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise click.ClickException(f'Server did not start within 30s; see {log_path}')
+
+
+def _run_load_level(base_url, phones, password, mix, options, processes):
+    """以 len(phones) 个虚拟用户压测一轮，返回 (样本, 登录失败信息)"""
+    from utils.loadgen import run_client_process
+
+    context = multiprocessing.get_context('fork')
+    results, go, start_at = context.Queue(), context.Event(), context.Value('d', 0.0)
+    workers = [context.Process(target=run_client_process,
+                               args=(base_url, phones[index::processes], password, mix, options, index + 1,
+                                     start_at, go, results))
+               for index in range(processes)]
+    for worker in workers:
+        worker.start()
+    failures, samples = [], []
+    try:
+        # 所有客户端进程登录完成后再统一开始计时
+        for _ in workers:
+            failures.extend(results.get(timeout=300)[1])
+        start_at.value = time.time() + 0.2
+        go.set()
+        for _ in workers:
+            samples.extend(results.get(timeout=options['duration'] + 300)[1])
+    finally:
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+    return samples, failures
+
+
+@bench_cli.command('load', with_appcontext=False)
+@click.option('--url', default=None, help='Base URL of a running server; by default one is started locally.')
+@click.option('--workers', default=4, show_default=True, help='Worker processes of the locally started server.')
+@click.option('--database', type=click.Path(dir_okay=False), default=None,
+              help='Seeded database for the local server (default: seed --users users into a temporary file).')
+@click.option('--concurrency', default='1,4,16,32', show_default=True, help='Comma separated virtual user counts.')
+@click.option('--duration', default=10.0, show_default=True, help='Seconds per concurrency level.')
+@click.option('--users', default=50, show_default=True, help='Seeded accounts to log in (virtual users cycle over them).')
+@click.option('--first-user-id', default=1, show_default=True)
+@click.option('--password', default=None, help='Password of the seeded accounts (default: the flask seed default).')
+@click.option('--mix', default=None, help='Weighted scenarios (default: dashboard=5,timer=2,task_edit=2,report=1).')
+@click.option('--timer-minutes', default=25, show_default=True, help='Duration saved by each timer scenario.')
+@click.option('--think-ms', default=0.0, show_default=True, help='Mean pause between a user\'s requests.')
+@click.option('--client-processes', default=os.cpu_count() or 1, show_default=True,
+              help='Load generator processes (virtual users run as threads inside them).')
+@click.option('--json-output', type=click.Path(dir_okay=False), default=None, help='Also write the results as JSON.')
+def load_command(url, workers, database, concurrency, duration, users, first_user_id, password, mix, timer_minutes,
+                 think_ms, client_processes, json_output):
+    """Closed-loop load test: logged-in users replay a weighted scenario mix at increasing concurrency."""
+    from utils import loadgen
+    from utils.seed import DEFAULT_PASSWORD, SEED_PHONE_PREFIX, SeedProfile, generate
+
+    password = password or DEFAULT_PASSWORD
+    try:
+        mix = loadgen.parse_mix(mix or loadgen.DEFAULT_MIX)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--mix')
+    levels = [int(value) for value in concurrency.split(',')]
+    options = {'duration': duration, 'timer_minutes': timer_minutes, 'think_ms': think_ms}
+    phones = [f'{SEED_PHONE_PREFIX}{first_user_id + index:08d}' for index in range(users)]
+
+    workdir = tempfile.mkdtemp(prefix='focusflow-load-')
+    server = None
+    report = []
+    try:
+        if url is None:
+            if database is None:
+                app = _load_app()
+                database = os.path.join(workdir, 'load.db')
+                with app.app_context():
+                    from flask_bcrypt import generate_password_hash
+                    password_hash = generate_password_hash(password).decode('utf-8')
+                conn = sqlite3.connect(database)
+                generate(conn, users, SeedProfile(months=3), seed=42, password_hash=password_hash)
+                conn.close()
+                click.echo(f'Seeded {users} users into {database}')
+            server, url = _start_server(database, workers, os.path.join(workdir, 'server.log'))
+            click.echo(f'Started {workers} worker process(es) at {url}')
+
+        click.echo(f"{'users':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>9}{'locked':>9}")
+        for level in levels:
+            level_phones = [phones[index % len(phones)] for index in range(level)]
+            samples, failures = _run_load_level(url, level_phones, password, mix, options,
+                                                max(1, min(level, client_processes)))
+            for failure in failures[:3]:
+                click.echo(f'  login failed: {failure}', err=True)
+            if len(failures) == level:
+                raise click.ClickException('No virtual user could log in.')
+            summary = loadgen.summarize(samples, duration)
+            summary['users'] = level
+            report.append(summary)
+            click.echo(f"{level:>6}{summary['throughput']:>9.1f}{summary['p50_ms']:>9.1f}{summary['p95_ms']:>9.1f}"
+                       f"{summary['p99_ms']:>9.1f}{summary['error_rate']:>9.2%}{summary['lock_rate']:>9.2%}")
+            for name, stats in summary['scenarios'].items():
+                click.echo(f"{'':>8}{name:<12}{stats['requests']:>7} req{stats['p50_ms']:>9.1f} ms p50"
+                           f"{stats['p95_ms']:>9.1f} ms p95")
+            for line in loadgen.format_histogram(summary['histogram']):
+                click.echo(f'{"":>6}{line}')
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if json_output:
+        with open(json_output, 'w', encoding='utf-8') as f:
+            json.dump({'url': url, 'workers': workers if server is not None else None, 'mix': mix,
+                       'duration': duration, 'levels': report}, f, indent=2)
+        click.echo(f'Wrote {json_output}.')
+
+
+def _tiny_png():
+    """1x1 像素的 PNG（压测头像上传用）"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(b'\x00\xff\xff\xff')) + chunk(b'IEND', b''))
+
+
+def _record_session(conn):
+    # 和 /focus/save_session 一样：先读后写
+    conn.execute('SELECT * FROM user_stats WHERE user_id = 1').fetchone()
+    conn.execute('''
+        INSERT INTO focus_sessions (user_id, duration, start_time, end_time)
+        VALUES (1, 25, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    ''')
+    StatsDB.record_focus_session(1, 25, conn)
+
+
+def _run_write_modes(path, pragmas, mode, threads, seconds):
+    """多个线程各用一个连接反复执行写事务，返回 (提交数, 失败数)
+
+    implicit：路由原来的写法，读在自动提交模式下执行，sqlite3 模块在第一条写语句前隐式 BEGIN
+    deferred：BEGIN 后先读再写，升级为写锁时可能直接失败（busy_timeout 对它无效）
+    immediate：write_transaction（BEGIN IMMEDIATE + 退避重试）
+    """
+    # 连接在启动线程前依次建立，切换 WAL 的 PRAGMA 不参与争抢
+    connections = [connect(path, pragmas) for _ in range(threads)]
+    stop = threading.Event()
+    counts = {'commits': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def writer(conn):
+        while not stop.is_set():
+            try:
+                if mode == 'immediate':
+                    write_transaction(_record_session, conn)
+                else:
+                    if mode == 'deferred':
+                        conn.execute('BEGIN')
+                    _record_session(conn)
+                    conn.commit()
+                key = 'commits'
+            except sqlite3.OperationalError:
+                if conn.in_transaction:
+                    conn.rollback()
+                key = 'errors'
+            with lock:
+                counts[key] += 1
+
+    workers = [threading.Thread(target=writer, args=(conn,)) for conn in connections]
+    for worker in workers:
+        worker.start()
+    time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    for conn in connections:
+        conn.close()
+    return counts['commits'], counts['errors']
+
+
+# 压测的写路由：(名称, 发送请求的函数)；每个线程以自己的用户登录，task_ids 是它预先拥有的任务
+def _stress_calls(client, rng, user_id, task_ids, avatar):
+    return [
+        ('checkin', lambda: client.post('/checkin')),
+        ('add_task', lambda: client.post('/tasks/add', data={
+            'task_title': 'Stress', 'task_due_date': '2030-01-01', 'task_tags': 'stress,bench',
+            'task_status': rng.choice(['pending', 'completed'])})),
+        ('update_status', lambda: client.post(f'/tasks/update_status/{rng.choice(task_ids)}',
+                                              json={'status': rng.choice(['pending', 'in_progress', 'completed'])})),
+        ('save_session', lambda: client.post('/focus/save_session',
+                                             json={'duration': 25, 'task_id': rng.choice(task_ids)})),
+        ('edit_task', lambda: client.post('/tasks/add', data={
+            'task_id': rng.choice(task_ids), 'task_title': 'Edited', 'task_due_date': '2030-01-02',
+            'task_tags': 'edited', 'task_status': rng.choice(['pending', 'completed'])})),
+        ('update_profile', lambda: client.post('/update_profile', data={
+            'first_name': 'Stress', 'last_name': str(user_id), 'phone': f'1380000{user_id:04d}',
+            'email': f'stress{user_id}@example.com', 'education_level': 'Undergraduate'})),
+        ('upload_avatar', lambda: client.post('/upload_avatar', content_type='multipart/form-data',
+                                              data={'avatar': (io.BytesIO(avatar), 'avatar.png', 'image/png')})),
+    ]
+
+
+def _stress_failed(client, response):
+    """请求是否失败：4xx/5xx、JSON 接口返回 success=false，或页面提示保存失败"""
+    if response.status_code >= 400:
+        return True
+    if response.is_json:
+        return not response.get_json().get('success')
+    with client.session_transaction() as sess:
+        flashes = sess.pop('_flashes', [])
+    return any('failed' in message.lower() for _, message in flashes)
+
+
+def _stress_routes(app, users, iterations, results, lock):
+    avatar = _tiny_png()
+
+    def worker(user_id, task_ids):
+        rng = random.Random(user_id)
+        client = _BenchClient(app, app.response_class, use_cookies=True)
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+        calls = _stress_calls(client, rng, user_id, task_ids, avatar)
+        local = []
+        for index in range(iterations):
+            name, call = calls[index % len(calls)]
+            started = time.perf_counter()
+            try:
+                failed = _stress_failed(client, call())
+            except Exception:
+                failed = True
+            local.append((name, (time.perf_counter() - started) * 1000, failed))
+        with lock:
+            results.extend(local)
+
+    return [threading.Thread(target=worker, args=(user_id, task_ids)) for user_id, task_ids in users]
+
+
+def _stats_drift(conn):
+    """重建前后 user_stats 的累计值不同的用户数（增量维护是否与明细一致）"""
+    columns = ('user_id, total_focus_minutes, focus_sessions, total_tasks, completed_tasks, total_checkins, '
+               'current_streak, longest_streak, last_checkin_date')
+    before = set(map(tuple, conn.execute(f'SELECT {columns} FROM user_stats').fetchall()))
+    StatsDB.rebuild(None, conn)
+    after = set(map(tuple, conn.execute(f'SELECT {columns} FROM user_stats').fetchall()))
+    conn.rollback()
+    return len({row[0] for row in before ^ after})
+
+
+@bench_cli.command('write-contention', with_appcontext=False)
+@click.option('--threads', default=16, show_default=True, help='Concurrent writer threads.')
+@click.option('--seconds', default=3.0, show_default=True, help='Duration of each transaction mode.')
+@click.option('--iterations', default=70, show_default=True, help='Route requests per stress thread.')
+@click.option('--busy-timeout-ms', default=50, show_default=True,
+              help='busy_timeout for the run; short values make lock waits outlast SQLite\'s own busy handler.')
+@click.option('--join-timeout', default=120.0, show_default=True,
+              help='Seconds to wait for the stress threads before reporting a deadlock.')
+def write_contention_command(threads, seconds, iterations, busy_timeout_ms, join_timeout):
+    """Lock errors per write-transaction style, then a zero-error stress run of the write routes."""
+    app = _load_app()
+    pragmas = dict(app.config.get('SQLITE_PRAGMAS') or {}, busy_timeout=busy_timeout_ms)
+    workdir = tempfile.mkdtemp(prefix='focusflow-bench-')
+    failed = False
+    try:
+        click.echo(f'{threads} threads, busy_timeout {busy_timeout_ms} ms, {seconds}s per mode')
+        click.echo(f"{'mode':<11}{'commits/s':>11}{'errors':>9}{'retries':>9}{'gave up':>9}")
+        for mode in ('implicit', 'deferred', 'immediate'):
+            path = _create_bench_db(workdir, f'{mode}.db')
+            before = write_stats()
+            commits, errors = _run_write_modes(path, pragmas, mode, threads, seconds)
+            after = write_stats()
+            click.echo(f'{mode:<11}{commits / seconds:>11.0f}{errors:>9}'
+                       f"{after['retries'] - before['retries']:>9}{after['conflicts'] - before['conflicts']:>9}")
+            failed |= mode == 'immediate' and errors > 0
+
+        # 路由压测：每个线程一个用户，轮流调用所有写路由
+        path = _create_bench_db(workdir, 'routes.db')
+        conn = sqlite3.connect(path)
+        conn.executemany('''
+            INSERT INTO users (id, phone, first_name, last_name, email, education_level, password)
+            VALUES (?, ?, 'Stress', ?, ?, 'Undergraduate', 'x')
+        ''', [(user_id, f'1380000{user_id:04d}', str(user_id), f'stress{user_id}@example.com')
+              for user_id in range(2, threads + 1)])
+        conn.executemany('''
+            INSERT INTO tasks (user_id, title, course, status, due_date) VALUES (?, 'Owned', 'Bench', 'pending', '2030-01-01')
+        ''', [(user_id,) for user_id in range(1, threads + 1) for _ in range(5)])
+        users = [(user_id, [row[0] for row in conn.execute('SELECT id FROM tasks WHERE user_id = ?', (user_id,))])
+                 for user_id in range(1, threads + 1)]
+        StatsDB.rebuild(None, conn)
+        conn.commit()
+        conn.close()
+
+        original = {key: app.config[key] for key in ('SQLITE_PRAGMAS', 'UPLOAD_FOLDER', 'SQL_INSTRUMENTATION')}
+        app.config.update(SQLITE_PRAGMAS=pragmas, UPLOAD_FOLDER=os.path.join(workdir, 'avatars'),
+                          SQL_INSTRUMENTATION=False)
+        # 记录后台头像处理任务，结束前等待它们完成（它们同样通过 write_transaction 写库）
+        pending = []
+        schedule_processing = avatars.schedule_processing
+        avatars.schedule_processing = lambda *args: pending.append(schedule_processing(*args))
+        results, lock = [], threading.Lock()
+        before = write_stats()
+        try:
+            with _bench_database(app, path):
+                workers = _stress_routes(app, users, iterations, results, lock)
+                started = time.perf_counter()
+                for worker in workers:
+                    worker.start()
+                join_deadline = time.monotonic() + join_timeout
+                for worker in workers:
+                    worker.join(max(0.0, join_deadline - time.monotonic()))
+                elapsed = time.perf_counter() - started
+                stuck = sum(worker.is_alive() for worker in workers)
+                background_errors = sum(future.exception(timeout=join_timeout) is not None for future in list(pending))
+        finally:
+            avatars.schedule_processing = schedule_processing
+            app.config.update(original)
+        after = write_stats()
+
+        click.echo()
+        click.echo(f'{threads} threads x {iterations} write requests in {elapsed:.2f}s '
+                   f'({len(results) / elapsed:.0f} req/s)')
+        click.echo(f"{'route':<16}{'requests':>10}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+        for name in dict.fromkeys(name for name, _, _ in results):
+            latencies = sorted(latency for route, latency, _ in results if route == name)
+            errors = sum(1 for route, _, error in results if route == name and error)
+            click.echo(f'{name:<16}{len(latencies):>10}{errors:>8}{_percentile(latencies, 50):>9.1f}'
+                       f'{_percentile(latencies, 95):>9.1f}{latencies[-1]:>9.1f}')
+        errors = sum(1 for _, _, error in results if error)
+        conn = sqlite3.connect(path)
+        drift = _stats_drift(conn)
+        daily = DailyStatsDB.verify(conn)
+        conn.close()
+        click.echo(f"retries {after['retries'] - before['retries']}, gave up {after['conflicts'] - before['conflicts']}, "
+                   f'failed avatar processing {background_errors}, stuck threads {stuck}, '
+                   f'user_stats drift {drift} user(s), daily_user_stats drift {len(daily)} day(s)')
+        failed |= bool(errors or background_errors or stuck or drift or daily)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if failed:
+        click.echo('FAILED: write errors, stuck threads or statistics drift.')
+        sys.exit(1)
+    click.echo('No write errors, no stuck threads, statistics consistent.')
+
+
+# 保存专注记录的用户数，线程轮流使用这些用户
+GROUP_COMMIT_BENCH_USERS = 64
+
+
+def _run_session_saves(path, pragmas, threads, seconds, writer=None):
+    """threads 个线程反复保存专注记录（每次在提交后才算完成），返回每次保存的耗时（毫秒）
+
+    writer 为空时每个线程用自己的连接逐条提交，否则交给组提交写入器。
+    """
+    stop = threading.Event()
+    latencies, lock = [], threading.Lock()
+    connections = [None if writer else connect(path, pragmas) for _ in range(threads)]
+
+    def saver(user_id, conn):
+        local = []
+        work = lambda conn: FocusSessionDB.save_session(user_id, 25, None, conn)
+        while not stop.is_set():
+            started = time.perf_counter()
+            if writer is None:
+                write_transaction(work, conn)
+            else:
+                writer.run(work)
+            local.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=saver, args=(index % GROUP_COMMIT_BENCH_USERS + 1, conn))
+               for index, conn in enumerate(connections)]
+    for worker in workers:
+        worker.start()
+    time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    for conn in connections:
+        if conn is not None:
+            conn.close()
+    return sorted(latencies)
+
+
+@bench_cli.command('group-commit', with_appcontext=False)
+@click.option('--threads', 'levels', default='1,8,32,64', show_default=True,
+              help='Comma separated numbers of concurrent savers.')
+@click.option('--seconds', default=3.0, show_default=True, help='Duration of each run.')
+@click.option('--synchronous', 'modes', default='FULL,NORMAL', show_default=True,
+              help='Comma separated PRAGMA synchronous levels (FULL: every commit is fsynced).')
+@click.option('--window-ms', default=None, type=float, help='Collection window (default: GROUP_COMMIT_WINDOW_MS).')
+@click.option('--max-batch', default=None, type=int, help='Largest batch (default: GROUP_COMMIT_MAX_BATCH).')
+def group_commit_command(levels, seconds, modes, window_ms, max_batch):
+    """Focus session saves per second: one commit per save vs. group commit."""
+    app = _load_app()
+    window = (app.config.get('GROUP_COMMIT_WINDOW_MS', 0) if window_ms is None else window_ms) / 1000
+    max_batch = max_batch or app.config.get('GROUP_COMMIT_MAX_BATCH', 64)
+    workdir = tempfile.mkdtemp(prefix='focusflow-bench-')
+    failed = False
+    try:
+        click.echo(f'window {window * 1000:g} ms, max batch {max_batch}, {seconds}s per run')
+        click.echo(f"{'sync':<8}{'threads':>8}{'mode':>9}{'saves/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                   f"{'batch':>8}{'rows ok':>9}")
+        for synchronous in [mode.strip().upper() for mode in modes.split(',')]:
+            pragmas = dict(app.config.get('SQLITE_PRAGMAS') or {}, synchronous=synchronous)
+            for threads in [int(level) for level in levels.split(',')]:
+                for mode in ('sync', 'grouped'):
+                    path = _create_bench_db(workdir, f'{synchronous}-{threads}-{mode}.db')
+                    conn = sqlite3.connect(path)
+                    conn.executemany('''
+                        INSERT INTO users (id, phone, first_name, last_name, email, education_level, password)
+                        VALUES (?, ?, 'Group', 'Commit', ?, 'Undergraduate', 'x')
+                    ''', [(user_id, f'1370000{user_id:04d}', f'group{user_id}@example.com')
+                          for user_id in range(2, GROUP_COMMIT_BENCH_USERS + 1)])
+                    conn.commit()
+                    writer = group_commit.GroupCommitWriter(path, pragmas, window, max_batch) \
+                        if mode == 'grouped' else None
+                    latencies = _run_session_saves(path, pragmas, threads, seconds, writer)
+                    batch = '-'
+                    if writer is not None:
+                        writer.close()
+                        batch = f"{writer.stats()['average_batch']:.1f}"
+                    # 每次确认的保存都必须已经落库，增量维护的汇总与明细一致
+                    rows = conn.execute('SELECT COUNT(*) FROM focus_sessions').fetchone()[0]
+                    consistent = rows == len(latencies) and not DailyStatsDB.verify(conn)
+                    conn.close()
+                    failed |= not consistent
+                    click.echo(f'{synchronous:<8}{threads:>8}{mode:>9}{len(latencies) / seconds:>10.0f}'
+                               f'{_percentile(latencies, 50):>9.2f}{_percentile(latencies, 95):>9.2f}'
+                               f'{_percentile(latencies, 99):>9.2f}{batch:>8}'
+                               f"{'yes' if consistent else 'NO':>9}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if failed:
+        click.echo('FAILED: acknowledged saves missing or statistics drift.')
+        sys.exit(1)
@@ -4,7 +4,77 @@ from datetime import timedelta
 class Config:
     # 基础配置
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-here'
-    DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'focusflow.db')
+    # FOCUSFLOW_DATABASE 可以指向其它数据库文件（如 flask seed 生成的压测数据）
+    DATABASE = os.environ.get('FOCUSFLOW_DATABASE') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'focusflow.db')
+
+    # 数据库连接池配置（每个工作进程保留的空闲连接数）
+    DB_POOL_SIZE = 5
+
+    # SQLite 调优参数：每个新建连接都会执行一次对应的 PRAGMA
+    # WAL 模式下读写互不阻塞，busy_timeout 避免并发写入时直接抛出 "database is locked"
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,      # 毫秒
+        'cache_size': -8000,       # 负数表示 KiB，约 8MB
+        'temp_store': 'MEMORY',
+        'mmap_size': 0,
+    }
+    # sqlite3 模块为每个连接缓存的预编译语句数量
+    SQLITE_CACHED_STATEMENTS = 256
+    # 写事务（utils.db.write_transaction）：每次 BEGIN IMMEDIATE 先由 busy_timeout 等待写锁，
+    # 仍然失败时回滚并按指数退避（加随机抖动）重试，总时长超过期限后放弃
+    WRITE_RETRY_DEADLINE = 10.0     # 秒
+    WRITE_RETRY_BASE_DELAY = 0.005  # 秒，第一次重试前的最长等待
+    WRITE_RETRY_MAX_DELAY = 0.25    # 秒
+    # /focus/save_session 的组提交（FOCUS_GROUP_COMMIT=1 开启）：同一工作进程中并发保存的专注记录
+    # 合并到一个事务中提交，请求仍在自己的记录提交之后才返回。上一批提交期间到达的记录组成下一批；
+    # GROUP_COMMIT_WINDOW_MS 大于 0 时写线程再多等这么久凑更大的批（fsync 很慢的磁盘上才值得）。
+    # 组提交连接使用 GROUP_COMMIT_SYNCHRONOUS，FULL 表示返回前已 fsync
+    FOCUS_GROUP_COMMIT = os.environ.get('FOCUS_GROUP_COMMIT') == '1'
+    GROUP_COMMIT_WINDOW_MS = 0
+    GROUP_COMMIT_MAX_BATCH = 64
+    GROUP_COMMIT_SYNCHRONOUS = 'FULL'
+
+    # 日志配置：级别、输出格式（text / json），以及生产环境下调试日志的抽样比例
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+    LOG_DEBUG_SAMPLE_RATE = 0.0
+
+    # 请求级 SQL 统计：查询数与耗时写入 Server-Timing 响应头
+    SQL_INSTRUMENTATION = True
+    # 同一语句形状在一个请求中执行的次数达到该值时记录 N+1 告警（0 表示关闭）
+    SQL_N_PLUS_ONE_THRESHOLD = 0
+
+    # 头像缩略图格式：webp 或 avif（Pillow 不支持 AVIF 时自动使用 webp）
+    AVATAR_FORMAT = os.environ.get('AVATAR_FORMAT', 'webp')
+    # 未被引用的头像文件的后台清理：最短间隔与保留时间（秒）
+    AVATAR_GC_INTERVAL = 3600
+    AVATAR_GC_GRACE = 3600
+    # 上传头像的最大边长（像素），只读取图片头判断，超过则拒绝
+    AVATAR_MAX_DIMENSION = 6000
+
+    # 使用 flask assets build 生成的带哈希静态资源（开发环境默认直接使用源文件，改动立即生效）
+    ASSETS_USE_MANIFEST = os.environ.get('ASSETS_USE_MANIFEST') == '1'
+
+    # 响应压缩：按 Accept-Encoding 选择 br / gzip，小于 COMPRESS_MIN_SIZE 字节的响应不压缩
+    # （前端代理已经负责压缩时可以设置 COMPRESS_RESPONSES=0 关闭）
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_RESPONSES', '1') == '1'
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_LEVEL = 6         # gzip 压缩级别（1-9）
+    COMPRESS_BR_QUALITY = 4    # brotli 压缩质量（0-11），动态响应用较低质量换取 CPU
+    COMPRESS_MIMETYPES = {
+        'text/html', 'text/css', 'text/plain', 'text/xml', 'text/csv',
+        'application/json', 'application/javascript', 'text/javascript', 'image/svg+xml',
+    }
+    
+    # 报告页计算结果缓存：memory（进程内 LRU）、sqlite（多个工作进程共享）或 none（关闭）
+    REPORT_CACHE_BACKEND = os.environ.get('REPORT_CACHE_BACKEND', 'memory')
+    REPORT_CACHE_SIZE = 512    # 最多缓存的条目数
+    REPORT_CACHE_TTL = 300     # 条目有效期（秒）
+    REPORT_CACHE_PATH = os.environ.get('REPORT_CACHE_PATH') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'report_cache.db')
     
     # 会话配置
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
@@ -36,9 +106,23 @@ class Config:
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG')
+    SQL_N_PLUS_ONE_THRESHOLD = 5
 
 class ProductionConfig(Config):
     DEBUG = False
+    DB_POOL_SIZE = 10
+    SQLITE_PRAGMAS = dict(
+        Config.SQLITE_PRAGMAS,
+        busy_timeout=10000,
+        cache_size=-32000,
+        mmap_size=256 * 1024 * 1024,
+    )
+    SQLITE_CACHED_STATEMENTS = 512
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0))
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION') == '1'
+    ASSETS_USE_MANIFEST = True
 
 # 根据环境变量选择配置
 config = {
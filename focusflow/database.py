@@ -1,15 +1,17 @@
-import sqlite3
 import os
-from datetime import datetime
-from app import app
+from datetime import datetime, timedelta
+from utils.db import get_db, write_transaction
+from utils.log import get_logger
 
-# 获取数据库连接
+logger = get_logger(__name__)
+
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# 获取数据库连接（与路由共享同一个请求级连接，由连接池统一归还）
 def get_db_connection():
-    conn = sqlite3.connect(app.config['DATABASE'])
-    conn.row_factory = sqlite3.Row
-    return conn
+    return get_db()
 
-# 关闭数据库连接
+# 关闭数据库连接（池化连接的 close 为空操作，保留此函数以兼容旧调用）
 def close_db_connection(conn):
     if conn:
         conn.close()
@@ -20,37 +22,31 @@ class UserDB:
     def get_user_by_id(user_id):
         conn = get_db_connection()
         user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
-        conn.close()
         return user
     
     @staticmethod
     def get_user_by_phone(phone):
         conn = get_db_connection()
         user = conn.execute('SELECT * FROM users WHERE phone = ?', (phone,)).fetchone()
-        conn.close()
         return user
     
     @staticmethod
     def create_user(user_data):
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO users (phone, first_name, last_name, email, gender, birth_date, 
-                            school, education_level, grade, password)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            user_data['phone'], user_data['first_name'], user_data['last_name'], 
-            user_data['email'], user_data.get('gender', ''), user_data.get('birth_date', ''),
-            user_data.get('school', ''), user_data['education_level'], user_data.get('grade', ''),
-            user_data['password']
-        ))
-        conn.commit()
-        user_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
-        conn.close()
-        return user_id
+        def insert(conn):
+            return conn.execute('''
+                INSERT INTO users (phone, first_name, last_name, email, gender, birth_date, 
+                                school, education_level, grade, password)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                user_data['phone'], user_data['first_name'], user_data['last_name'], 
+                user_data['email'], user_data.get('gender', ''), user_data.get('birth_date', ''),
+                user_data.get('school', ''), user_data['education_level'], user_data.get('grade', ''),
+                user_data['password']
+            )).lastrowid
+        return write_transaction(insert, get_db_connection())
     
     @staticmethod
     def update_user(user_id, user_data):
-        conn = get_db_connection()
         # 构建更新语句
         update_fields = []
         update_values = []
@@ -62,9 +58,10 @@ class UserDB:
         
         update_values.append(user_id)
         
-        conn.execute(f"UPDATE users SET {', '.join(update_fields)} WHERE id = ?", tuple(update_values))
-        conn.commit()
-        conn.close()
+        def update(conn):
+            conn.execute(f"UPDATE users SET {', '.join(update_fields)} WHERE id = ?", tuple(update_values))
+            StatsDB.touch(user_id, conn)
+        write_transaction(update, get_db_connection())
 
 # 任务相关操作
 class TaskDB:
@@ -74,36 +71,32 @@ class TaskDB:
         tasks = conn.execute('''
             SELECT * FROM tasks WHERE user_id = ? ORDER BY due_date ASC
         ''', (user_id,)).fetchall()
-        conn.close()
         return tasks
     
     @staticmethod
     def get_task_by_id(task_id):
         conn = get_db_connection()
         task = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
-        conn.close()
         return task
     @staticmethod
     def create_task(task_data):
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO tasks (user_id, title, description, course, priority, status, 
-                             due_date, repeat, estimated_time)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            task_data['user_id'], task_data['title'], task_data.get('description', ''),
-            task_data.get('course', ''), task_data.get('priority', 'medium'),
-            task_data.get('status', 'pending'), task_data.get('due_date', ''),
-            task_data.get('repeat', ''), task_data.get('estimated_time', 60)
-        ))
-        conn.commit()
-        task_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
-        conn.close()
-        return task_id
+        def insert(conn):
+            task_id = conn.execute('''
+                INSERT INTO tasks (user_id, title, description, course, priority, status, 
+                                 due_date, repeat, estimated_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                task_data['user_id'], task_data['title'], task_data.get('description', ''),
+                task_data.get('course', ''), task_data.get('priority', 'medium'),
+                task_data.get('status', 'pending'), task_data.get('due_date', ''),
+                task_data.get('repeat', ''), task_data.get('estimated_time', 60)
+            )).lastrowid
+            StatsDB.record_task_added(task_data['user_id'], task_data.get('status', 'pending'), conn)
+            return task_id
+        return write_transaction(insert, get_db_connection())
     
     @staticmethod
     def update_task(task_id, task_data):
-        conn = get_db_connection()
         # 构建更新语句
         update_fields = []
         update_values = []
@@ -116,124 +109,99 @@ class TaskDB:
         update_values.append(task_id)
         update_fields.append("updated_at = CURRENT_TIMESTAMP")
         
-        conn.execute(f"UPDATE tasks SET {', '.join(update_fields)} WHERE id = ?", tuple(update_values))
-        conn.commit()
-        conn.close()
+        def update(conn):
+            old_task = conn.execute('SELECT user_id, status, updated_at FROM tasks WHERE id = ?', (task_id,)).fetchone()
+            conn.execute(f"UPDATE tasks SET {', '.join(update_fields)} WHERE id = ?", tuple(update_values))
+            if old_task:
+                # 状态未变时也要调用：updated_at 已更新，已完成任务在每日汇总中的日期随之变化
+                new_status = task_data.get('status') if task_data.get('status') is not None else old_task['status']
+                StatsDB.record_task_status_change(old_task['user_id'], old_task['status'], new_status, conn,
+                                                  old_task['updated_at'])
+        write_transaction(update, get_db_connection())
     
     @staticmethod
     def delete_task(task_id):
-        conn = get_db_connection()
-        conn.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-        conn.commit()
-        conn.close()
+        def delete(conn):
+            task = conn.execute('SELECT user_id, status, updated_at FROM tasks WHERE id = ?', (task_id,)).fetchone()
+            conn.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+            if task:
+                StatsDB.record_task_deleted(task['user_id'], task['status'], conn, task['updated_at'])
+        write_transaction(delete, get_db_connection())
 
 # 专注记录相关操作
 class FocusSessionDB:
     @staticmethod
     def get_total_focus_time(user_id):
         """获取用户的总专注时长（分钟）"""
-        conn = get_db_connection()
-        result = conn.execute('''
-            SELECT SUM(duration) as total_duration
-            FROM focus_sessions 
-            WHERE user_id = ?
-        ''', (user_id,)).fetchone()
-        conn.close()
-        return result['total_duration'] or 0
+        return StatsDB.get(user_id)['total_focus_minutes']
     
     @staticmethod
     def get_weekly_focus_time(user_id):
         """获取用户本周的专注时长（分钟）"""
-        conn = get_db_connection()
         # 获取本周开始日期（周一）
         today = datetime.now().date()
         start_of_week = today - timedelta(days=today.weekday())
-        
-        result = conn.execute('''
-            SELECT SUM(duration) as weekly_duration
-            FROM focus_sessions 
-            WHERE user_id = ? AND DATE(start_time) >= ?
-        ''', (user_id, start_of_week)).fetchone()
-        conn.close()
-        return result['weekly_duration'] or 0
+        return DailyStatsDB.totals(user_id, start_of_week)['focus_minutes']
+    
+    @staticmethod
+    def save_session(user_id, duration, task_id=None, conn=None):
+        """写入一条刚结束的专注记录并更新统计，不负责提交；关联的任务不属于该用户时返回 False"""
+        conn = conn or get_db_connection()
+        if task_id:
+            task = conn.execute('SELECT id FROM tasks WHERE id = ? AND user_id = ?', (task_id, user_id)).fetchone()
+            if not task:
+                return False
+        conn.execute('''
+            INSERT INTO focus_sessions (user_id, task_id, duration, start_time, end_time)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        ''', (user_id, task_id, duration))
+        StatsDB.record_focus_session(user_id, duration, conn)
+        return True
 
 # 签到相关操作
 class CheckinDB:
     @staticmethod
     def get_total_checkins(user_id):
         """获取用户的总签到次数"""
-        conn = get_db_connection()
-        result = conn.execute('''
-            SELECT COUNT(*) as total_checkins
-            FROM checkins 
-            WHERE user_id = ?
-        ''', (user_id,)).fetchone()
-        conn.close()
-        return result['total_checkins'] or 0
+        return StatsDB.get(user_id)['total_checkins']
     
     @staticmethod
     def get_monthly_checkins(user_id):
         """获取用户本月的签到次数"""
-        conn = get_db_connection()
         # 获取本月第一天
         today = datetime.now()
         start_of_month = today.replace(day=1).date()
+        return DailyStatsDB.totals(user_id, start_of_month)['checkins']
+    
+    @staticmethod
+    def get_streak(user_id, today=None, conn=None):
+        """获取用户的连续签到状态（读取 user_stats，O(1)）
         
-        result = conn.execute('''
-            SELECT COUNT(*) as monthly_checkins
-            FROM checkins 
-            WHERE user_id = ? AND DATE(date) >= ?
-        ''', (user_id, start_of_month)).fetchone()
-        conn.close()
-        return result['monthly_checkins'] or 0
+        current 为截至今天的连续签到天数：今天还没有签到时为 0。
+        """
+        return CheckinDB.streak_from_stats(StatsDB.get(user_id, conn), today)
+
+    @staticmethod
+    def streak_from_stats(stats, today=None):
+        """从已经读取的 user_stats 行计算连续签到状态（不查询数据库）"""
+        today_str = (today or datetime.now().date()).strftime('%Y-%m-%d')
+        return {
+            'current': stats['current_streak'] if stats['last_checkin_date'] == today_str else 0,
+            'longest': stats['longest_streak'],
+            'last_checkin_date': stats['last_checkin_date']
+        }
     
     @staticmethod
     def get_streak_days(user_id):
         """获取用户的连续签到天数"""
-        conn = get_db_connection()
-        # 获取所有签到日期并按日期排序
-        checkin_dates = conn.execute('''
-            SELECT date FROM checkins 
-            WHERE user_id = ? 
-            ORDER BY date DESC
-        ''', (user_id,)).fetchall()
-        conn.close()
-        
-        if not checkin_dates:
-            return 0
-        
-        # 将日期字符串转换为日期对象
-        dates = [datetime.strptime(row['date'], '%Y-%m-%d').date() for row in checkin_dates]
-        
-        # 计算连续签到天数
-        streak = 0
-        current_date = datetime.now().date()
-        
-        for date in dates:
-            if date == current_date:
-                streak += 1
-                current_date -= timedelta(days=1)
-            elif date == current_date - timedelta(days=1):
-                streak += 1
-                current_date -= timedelta(days=1)
-            else:
-                break
-                
-        return streak
+        return CheckinDB.get_streak(user_id)['current']
 
 # 报告相关操作
 class ReportDB:
     @staticmethod
     def get_completed_tasks_count(user_id):
         """获取用户已完成的任务数量"""
-        conn = get_db_connection()
-        result = conn.execute('''
-            SELECT COUNT(*) as completed_tasks
-            FROM tasks 
-            WHERE user_id = ? AND status = 'completed'
-        ''', (user_id,)).fetchone()
-        conn.close()
-        return result['completed_tasks'] or 0
+        return StatsDB.get(user_id)['completed_tasks']
     
     @staticmethod
     def get_weekly_completed_tasks(user_id):
@@ -248,26 +216,404 @@ class ReportDB:
             FROM tasks 
             WHERE user_id = ? AND status = 'completed' AND due_date >= ?
         ''', (user_id, start_of_week)).fetchone()
-        conn.close()
         return result['weekly_completed'] or 0
     
     @staticmethod
     def get_task_completion_rate(user_id):
         """计算用户的任务完成率"""
-        conn = get_db_connection()
-        result = conn.execute('''
+        stats = StatsDB.get(user_id)
+        
+        if stats['total_tasks'] == 0:
+            return 0
+        
+        return int((stats['completed_tasks'] / stats['total_tasks']) * 100)
+    
+    @staticmethod
+    def get_daily_trend(user_id, days=7, end_date=None, conn=None):
+        """获取截至 end_date（默认今天）的最近 days 天的每日学习趋势
+        
+        返回按日期升序的列表，每项包含签到标记、专注分钟数和当天完成的任务。
+        签到和专注分钟数读取每日汇总（按天数计），任务明细只在汇总显示有完成任务时才查询。
+        """
+        conn = conn or get_db_connection()
+        end_date = end_date or datetime.now().date()
+        start_date = end_date - timedelta(days=days - 1)
+        window = (user_id, start_date.strftime('%Y-%m-%d'), (end_date + timedelta(days=1)).strftime('%Y-%m-%d'))
+        
+        daily = DailyStatsDB.get_days(user_id, start_date, end_date, conn)
+        
+        # 汇总显示窗口内没有完成的任务时不查询任务明细
+        completed_tasks = []
+        if any(row['completed_tasks'] for row in daily.values()):
+            completed_tasks = conn.execute('''
+                SELECT id, title, description, course, updated_at AS completion_time
+                FROM tasks
+                WHERE user_id = ? AND status = 'completed' AND updated_at >= ? AND updated_at < ?
+                ORDER BY updated_at DESC
+            ''', window).fetchall()
+        
+        tasks_by_day = {}
+        for task in completed_tasks:
+            tasks_by_day.setdefault(str(task['completion_time'])[:10], []).append({
+                'id': task['id'],
+                'title': task['title'],
+                'description': task['description'],
+                'course_info': task['course'] if task['course'] else '无课程信息',
+                'completion_time': task['completion_time']
+            })
+        
+        trend = []
+        for offset in range(days):
+            date = start_date + timedelta(days=offset)
+            date_str = date.strftime('%Y-%m-%d')
+            tasks_data = tasks_by_day.get(date_str, [])
+            day_stats = daily.get(date_str)
+            trend.append({
+                'day': WEEKDAY_NAMES[date.weekday()],
+                'date': date_str,
+                'date_display': date.strftime('%m月%d日'),
+                'checked_in': bool(day_stats and day_stats['checked_in']),
+                'focus_minutes': day_stats['focus_minutes'] if day_stats else 0,
+                'tasks': tasks_data,
+                'task_count': len(tasks_data)
+            })
+        return trend
+    
+    @staticmethod
+    def build_weekly_report(user_id, end_date=None, conn=None):
+        """生成报告页的数据：最近 7 天统计、每日趋势、签到详情和最近完成的 20 个任务
+        
+        只依赖传入的连接，不访问请求上下文，可以在命令行或后台线程中预先生成（预热缓存）。
+        返回值只包含可 JSON 序列化的基本类型。
+        """
+        conn = conn or get_db_connection()
+        end_date = end_date or datetime.now().date()
+        week_start = (end_date - timedelta(days=6)).strftime('%Y-%m-%d')
+        
+        # 专注时长与任务统计 - 限制为最近7天（专注记录保存时即已结束，会话数即完成的会话数）
+        focus_stats = DailyStatsDB.totals(user_id, week_start, conn=conn)
+        total_duration = focus_stats['focus_minutes']
+        
+        task_stats = conn.execute('''
             SELECT 
-                COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed,
-                COUNT(*) as total
+                COUNT(*) as total_tasks,
+                COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed_tasks
             FROM tasks 
+            WHERE user_id = ? AND created_at >= ?
+        ''', (user_id, week_start)).fetchone()
+        total_tasks = task_stats['total_tasks'] or 0
+        completed_tasks = task_stats['completed_tasks'] or 0
+        
+        weekly_stats = {
+            'focus_time': {'hours': total_duration // 60, 'minutes': total_duration % 60,
+                           'total_minutes': total_duration},  # 总专注时长（小时和分钟）
+            'completed_sessions': focus_stats['sessions'],  # 完成的专注会话数
+            'total_sessions': focus_stats['sessions'],  # 总专注会话数
+            'completed_tasks': completed_tasks,  # 完成任务数
+            'total_tasks': total_tasks,  # 总任务数
+            'productivity_score': int(completed_tasks / total_tasks * 100) if total_tasks else 0,  # 任务完成率
+            'streak_days': CheckinDB.get_streak(user_id, end_date, conn)['current']  # 连续签到天数
+        }
+        
+        # 最近7天的学习趋势（与仪表盘共用趋势查询）及其中的签到详情
+        weekly_trend = []
+        checked_in_dates = []
+        for day_data in ReportDB.get_daily_trend(user_id, days=7, end_date=end_date, conn=conn):
+            daily_minutes = day_data['focus_minutes']
+            day_data['value'] = daily_minutes  # 保留原始分钟数用于图表计算
+            day_data['focus_time'] = {'hours': daily_minutes // 60, 'minutes': daily_minutes % 60}
+            weekly_trend.append(day_data)
+            if day_data['checked_in']:
+                checked_in_dates.append({
+                    'date': day_data['date'],
+                    'date_display': day_data['date_display'],
+                    'day': day_data['day'],
+                    'focus_hours': day_data['focus_time'],  # 使用小时和分钟的字典
+                    'value': daily_minutes  # 保留原始分钟数
+                })
+        
+        # 最近完成的任务列表
+        completed_tasks_list = []
+        for task in conn.execute('''
+            SELECT t.id, t.title, t.course, t.updated_at as completion_time
+            FROM tasks t 
+            WHERE t.user_id = ? AND t.status = 'completed'
+            ORDER BY t.updated_at DESC
+            LIMIT 20
+        ''', (user_id,)):
+            try:
+                if isinstance(task['completion_time'], str):
+                    completion_time = datetime.strptime(task['completion_time'], '%Y-%m-%d %H:%M:%S')
+                else:
+                    completion_time = datetime.fromisoformat(str(task['completion_time']))
+            except Exception as e:
+                # 解析失败时使用当前时间
+                logger.warning('解析任务完成时间时出错: %s', e)
+                completion_time = datetime.now()
+            completed_tasks_list.append({
+                'id': task['id'],
+                'title': task['title'],
+                'course': task['course'] if task['course'] else None,
+                'completion_date': completion_time.strftime('%m/%d'),
+                'completion_time': completion_time.strftime('%H:%M')
+            })
+        
+        return {
+            'weekly_stats': weekly_stats,
+            'weekly_trend': weekly_trend,
+            'checked_in_dates': checked_in_dates,
+            'completed_tasks_list': completed_tasks_list,
+        }
+
+
+# 用户累计统计（user_stats），在各写操作的同一事务中增量维护
+# 连续签到分段：同一段连续日期的 julianday(date) - 行号 相同
+CHECKIN_STREAKS_CTE = '''
+    WITH runs AS (
+        SELECT user_id, date,
+               julianday(date) - ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY date) AS grp
+        FROM checkins
+    ), islands AS (
+        SELECT user_id, grp, COUNT(*) AS length, MAX(date) AS end_date
+        FROM runs GROUP BY user_id, grp
+    ), streaks AS (
+        SELECT i.user_id, e.last_checkin_date, e.longest_streak, i.length AS current_streak
+        FROM (SELECT user_id, MAX(end_date) AS last_checkin_date, MAX(length) AS longest_streak
+              FROM islands GROUP BY user_id) e
+        JOIN islands i ON i.user_id = e.user_id AND i.end_date = e.last_checkin_date
+    )
+'''
+
+REBUILD_USER_STATS_SQL = CHECKIN_STREAKS_CTE + '''
+    INSERT OR REPLACE INTO user_stats (user_id, total_focus_minutes, focus_sessions, total_tasks,
+                                       completed_tasks, total_checkins, current_streak, longest_streak,
+                                       last_checkin_date, data_version)
+    SELECT u.id,
+           (SELECT COALESCE(SUM(duration), 0) FROM focus_sessions f WHERE f.user_id = u.id AND f.end_time IS NOT NULL),
+           (SELECT COUNT(*) FROM focus_sessions f WHERE f.user_id = u.id AND f.end_time IS NOT NULL),
+           (SELECT COUNT(*) FROM tasks t WHERE t.user_id = u.id),
+           (SELECT COUNT(*) FROM tasks t WHERE t.user_id = u.id AND t.status = 'completed'),
+           (SELECT COUNT(*) FROM checkins c WHERE c.user_id = u.id),
+           COALESCE(s.current_streak, 0),
+           COALESCE(s.longest_streak, 0),
+           s.last_checkin_date,
+           -- REPLACE 会删除旧行，数据版本需要在旧值基础上递增，不能回到默认值
+           COALESCE((SELECT data_version FROM user_stats old WHERE old.user_id = u.id), 0) + 1
+    FROM users u
+    LEFT JOIN streaks s ON s.user_id = u.id
+'''
+
+# 对比 user_stats 中的连续签到状态与签到明细重新计算的结果，返回不一致的用户
+VERIFY_STREAKS_SQL = CHECKIN_STREAKS_CTE + '''
+    SELECT us.user_id,
+           us.current_streak, COALESCE(s.current_streak, 0) AS expected_current_streak,
+           us.longest_streak, COALESCE(s.longest_streak, 0) AS expected_longest_streak,
+           us.last_checkin_date, s.last_checkin_date AS expected_last_checkin_date
+    FROM user_stats us
+    LEFT JOIN streaks s ON s.user_id = us.user_id
+    WHERE us.current_streak != COALESCE(s.current_streak, 0)
+       OR us.longest_streak != COALESCE(s.longest_streak, 0)
+       OR us.last_checkin_date IS NOT s.last_checkin_date
+'''
+
+# 每日汇总（daily_user_stats）的期望值：由专注记录、已完成任务和签到明细按天聚合
+DAILY_USER_STATS_SQL = '''
+    SELECT user_id, day, SUM(focus_minutes) AS focus_minutes, SUM(sessions) AS sessions,
+           SUM(completed_tasks) AS completed_tasks, SUM(checked_in) AS checked_in
+    FROM (
+        SELECT user_id, substr(start_time, 1, 10) AS day, duration AS focus_minutes, 1 AS sessions,
+               0 AS completed_tasks, 0 AS checked_in
+        FROM focus_sessions
+        WHERE end_time IS NOT NULL
+        UNION ALL
+        SELECT user_id, substr(updated_at, 1, 10), 0, 0, 1, 0 FROM tasks WHERE status = 'completed'
+        UNION ALL
+        SELECT user_id, date, 0, 0, 0, 1 FROM checkins
+    )
+    GROUP BY user_id, day
+'''
+
+# 对比每日汇总与明细重新聚合的结果，返回不一致的 (用户, 日期)；全为 0 的汇总行视为不存在
+VERIFY_DAILY_STATS_SQL = '''
+    WITH expected AS (''' + DAILY_USER_STATS_SQL + '''), actual AS (
+        SELECT user_id, day, focus_minutes, sessions, completed_tasks, checked_in
+        FROM daily_user_stats
+        WHERE focus_minutes != 0 OR sessions != 0 OR completed_tasks != 0 OR checked_in != 0
+    ), diff AS (
+        SELECT user_id, day FROM (SELECT * FROM expected EXCEPT SELECT * FROM actual)
+        UNION
+        SELECT user_id, day FROM (SELECT * FROM actual EXCEPT SELECT * FROM expected)
+    )
+    SELECT d.user_id, d.day,
+           COALESCE(a.focus_minutes, 0) AS focus_minutes, COALESCE(e.focus_minutes, 0) AS expected_focus_minutes,
+           COALESCE(a.sessions, 0) AS sessions, COALESCE(e.sessions, 0) AS expected_sessions,
+           COALESCE(a.completed_tasks, 0) AS completed_tasks, COALESCE(e.completed_tasks, 0) AS expected_completed_tasks,
+           COALESCE(a.checked_in, 0) AS checked_in, COALESCE(e.checked_in, 0) AS expected_checked_in
+    FROM diff d
+    LEFT JOIN expected e ON e.user_id = d.user_id AND e.day = d.day
+    LEFT JOIN actual a ON a.user_id = d.user_id AND a.day = d.day
+    ORDER BY d.user_id, d.day
+'''
+
+class StatsDB:
+    @staticmethod
+    def get(user_id, conn=None):
+        """按主键读取用户累计统计；缺失时从明细表重建该用户的统计"""
+        conn = conn or get_db_connection()
+        stats = conn.execute('SELECT * FROM user_stats WHERE user_id = ?', (user_id,)).fetchone()
+        if stats is None:
+            # 已在外层写事务中时由外层提交
+            write_transaction(lambda conn: StatsDB.rebuild(user_id, conn), conn)
+            stats = conn.execute('SELECT * FROM user_stats WHERE user_id = ?', (user_id,)).fetchone()
+        return stats
+    
+    @staticmethod
+    def rebuild(user_id=None, conn=None):
+        """从明细表重新计算统计（user_id 为空时重算全部用户），不负责提交"""
+        conn = conn or get_db_connection()
+        if user_id is None:
+            conn.execute(REBUILD_USER_STATS_SQL)
+        else:
+            conn.execute(REBUILD_USER_STATS_SQL + ' WHERE u.id = ?', (user_id,))
+    
+    @staticmethod
+    def _apply(conn, user_id, **deltas):
+        conn.execute('INSERT OR IGNORE INTO user_stats (user_id) VALUES (?)', (user_id,))
+        assignments = ''.join(f'{column} = {column} + ?, ' for column in deltas)
+        conn.execute(f'''
+            UPDATE user_stats SET {assignments}data_version = data_version + 1, updated_at = CURRENT_TIMESTAMP
             WHERE user_id = ?
-        ''', (user_id,)).fetchone()
-        conn.close()
+        ''', (*deltas.values(), user_id))
+    
+    @staticmethod
+    def touch(user_id, conn=None):
+        """只递增数据版本（编辑任务内容、修改资料等不影响累计值的写入），不负责提交"""
+        conn = conn or get_db_connection()
+        conn.execute('UPDATE user_stats SET data_version = data_version + 1 WHERE user_id = ?', (user_id,))
+    
+    @staticmethod
+    def record_focus_session(user_id, duration, conn=None, day=None):
+        """记录一条专注记录；day 为记录的 start_time 日期，为空时表示刚以 CURRENT_TIMESTAMP 写入"""
+        conn = conn or get_db_connection()
+        StatsDB._apply(conn, user_id, total_focus_minutes=duration, focus_sessions=1)
+        DailyStatsDB.apply(conn, user_id, day, focus_minutes=duration, sessions=1)
+    
+    @staticmethod
+    def record_task_added(user_id, status, conn=None):
+        conn = conn or get_db_connection()
+        StatsDB._apply(conn, user_id, total_tasks=1, completed_tasks=1 if status == 'completed' else 0)
+        if status == 'completed':
+            DailyStatsDB.apply(conn, user_id, None, completed_tasks=1)
+    
+    @staticmethod
+    def record_task_status_change(user_id, old_status, new_status, conn=None, old_updated_at=None):
+        """任务更新后调用（更新语句同时把 updated_at 设为当前时间）
         
-        if result['total'] == 0:
-            return 0
+        old_updated_at 为更新前的 updated_at：已完成任务在每日汇总中从原来的日期移到今天。
+        """
+        conn = conn or get_db_connection()
+        delta = (new_status == 'completed') - (old_status == 'completed')
+        if delta:
+            StatsDB._apply(conn, user_id, completed_tasks=delta)
+        else:
+            StatsDB.touch(user_id, conn)
+        if old_status == 'completed':
+            DailyStatsDB.apply(conn, user_id, str(old_updated_at)[:10], completed_tasks=-1)
+        if new_status == 'completed':
+            DailyStatsDB.apply(conn, user_id, None, completed_tasks=1)
+    
+    @staticmethod
+    def record_task_deleted(user_id, status, conn=None, updated_at=None):
+        conn = conn or get_db_connection()
+        StatsDB._apply(conn, user_id, total_tasks=-1, completed_tasks=-1 if status == 'completed' else 0)
+        if status == 'completed':
+            DailyStatsDB.apply(conn, user_id, str(updated_at)[:10], completed_tasks=-1)
+    
+    @staticmethod
+    def record_checkin(user_id, date_str, conn=None):
+        """记录一次新的签到（日期不早于上次签到）：累计次数加一，延续或重置连续天数并更新最长纪录"""
+        conn = conn or get_db_connection()
+        StatsDB._apply(conn, user_id, total_checkins=1)
+        DailyStatsDB.apply(conn, user_id, date_str, checked_in=1)
+        previous_day = (datetime.strptime(date_str, '%Y-%m-%d').date() - timedelta(days=1)).strftime('%Y-%m-%d')
+        conn.execute('''
+            UPDATE user_stats
+            SET current_streak = CASE
+                    WHEN last_checkin_date = ? THEN current_streak + 1
+                    WHEN last_checkin_date = ? THEN current_streak
+                    ELSE 1
+                END,
+                last_checkin_date = MAX(COALESCE(last_checkin_date, ''), ?)
+            WHERE user_id = ?
+        ''', (previous_day, date_str, date_str, user_id))
+        conn.execute('''
+            UPDATE user_stats SET longest_streak = MAX(longest_streak, current_streak) WHERE user_id = ?
+        ''', (user_id,))
+    
+    @staticmethod
+    def verify_streaks(conn=None):
+        """返回连续签到状态与签到明细不一致的用户列表"""
+        conn = conn or get_db_connection()
+        return conn.execute(VERIFY_STREAKS_SQL).fetchall()
+
+
+# 每日汇总（daily_user_stats），与 user_stats 一起在各写操作的同一事务中增量维护
+class DailyStatsDB:
+    @staticmethod
+    def get_days(user_id, start_date, end_date, conn=None):
+        """返回 [start_date, end_date] 内有汇总行的日期 -> 汇总行"""
+        conn = conn or get_db_connection()
+        rows = conn.execute('''
+            SELECT * FROM daily_user_stats WHERE user_id = ? AND day >= ? AND day <= ?
+        ''', (user_id, str(start_date)[:10], str(end_date)[:10]))
+        return {row['day']: row for row in rows}
+    
+    @staticmethod
+    def totals(user_id, start_date, end_date=None, conn=None):
+        """窗口内的合计：focus_minutes、sessions、completed_tasks 和 checkins（签到天数）
         
-        return int((result['completed'] / result['total']) * 100)
+        end_date 为空时不设上限，与原先 start_time >= ? 的查询口径一致。
+        """
+        conn = conn or get_db_connection()
+        query = '''
+            SELECT COALESCE(SUM(focus_minutes), 0) AS focus_minutes, COALESCE(SUM(sessions), 0) AS sessions,
+                   COALESCE(SUM(completed_tasks), 0) AS completed_tasks, COALESCE(SUM(checked_in), 0) AS checkins
+            FROM daily_user_stats WHERE user_id = ? AND day >= ?
+        '''
+        if end_date is None:
+            return conn.execute(query, (user_id, str(start_date)[:10])).fetchone()
+        return conn.execute(query + ' AND day <= ?', (user_id, str(start_date)[:10], str(end_date)[:10])).fetchone()
+    
+    @staticmethod
+    def apply(conn, user_id, day, **deltas):
+        """把增量累加到某天的汇总行（不存在时创建）；day 为空时取 CURRENT_TIMESTAMP 的日期，不负责提交"""
+        columns = ', '.join(deltas)
+        assignments = ', '.join(f'{column} = {column} + excluded.{column}' for column in deltas)
+        conn.execute(f'''
+            INSERT INTO daily_user_stats (user_id, day, {columns})
+            VALUES (?, COALESCE(?, date('now')){', ?' * len(deltas)})
+            ON CONFLICT (user_id, day) DO UPDATE SET {assignments}
+        ''', (user_id, day, *deltas.values()))
+    
+    @staticmethod
+    def rebuild(user_id=None, conn=None):
+        """从明细表重新计算每日汇总（user_id 为空时重算全部用户），不负责提交
 
-# 导入timedelta用于日期计算
-from datetime import timedelta
\ No newline at end of file
+        页面上的每日数字可能随之变化，同时递增数据版本，使 ETag 和报告缓存失效。
+        """
+        conn = conn or get_db_connection()
+        insert = 'INSERT INTO daily_user_stats (user_id, day, focus_minutes, sessions, completed_tasks, checked_in) '
+        if user_id is None:
+            conn.execute('DELETE FROM daily_user_stats')
+            conn.execute(insert + DAILY_USER_STATS_SQL)
+            conn.execute('UPDATE user_stats SET data_version = data_version + 1')
+        else:
+            conn.execute('DELETE FROM daily_user_stats WHERE user_id = ?', (user_id,))
+            conn.execute(insert + 'SELECT * FROM (' + DAILY_USER_STATS_SQL + ') WHERE user_id = ?', (user_id,))
+            StatsDB.touch(user_id, conn)
+    
+    @staticmethod
+    def verify(conn=None):
+        """返回每日汇总与明细不一致的 (用户, 日期) 列表"""
+        conn = conn or get_db_connection()
+        return conn.execute(VERIFY_DAILY_STATS_SQL).fetchall()
@@ -0,0 +1,22 @@
+-- 统计查询使用的复合索引
+-- 对应的查询都写成 "user_id = ? AND 时间列 >= ? AND 时间列 < ?" 的半开区间形式
+
+-- 专注记录：按用户 + 开始时间（今日/本周时长、趋势图）
+CREATE INDEX IF NOT EXISTS idx_focus_sessions_user_start
+    ON focus_sessions (user_id, start_time);
+
+-- 任务：按用户 + 状态 + 更新时间（每日完成任务、最近完成列表、完成数统计）
+CREATE INDEX IF NOT EXISTS idx_tasks_user_status_updated
+    ON tasks (user_id, status, updated_at);
+
+-- 任务：按用户 + 截止日期（任务列表排序、今日任务）
+CREATE INDEX IF NOT EXISTS idx_tasks_user_due
+    ON tasks (user_id, due_date);
+
+-- 任务：按用户 + 创建时间（报告页本周任务统计）
+CREATE INDEX IF NOT EXISTS idx_tasks_user_created
+    ON tasks (user_id, created_at);
+
+-- 成绩：按用户 + 日期
+CREATE INDEX IF NOT EXISTS idx_grades_user_date
+    ON grades (user_id, date);
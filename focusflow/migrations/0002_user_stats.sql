@@ -0,0 +1,42 @@
+-- 每个用户的累计统计（随写操作在同一事务中增量维护）
+-- 页头总学习时长、仪表盘任务计数等改为按主键读取这一行
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY,
+    total_focus_minutes INTEGER NOT NULL DEFAULT 0, -- 已完成专注记录的总时长（分钟）
+    focus_sessions INTEGER NOT NULL DEFAULT 0,      -- 已完成专注记录数
+    total_tasks INTEGER NOT NULL DEFAULT 0,
+    completed_tasks INTEGER NOT NULL DEFAULT 0,
+    total_checkins INTEGER NOT NULL DEFAULT 0,
+    current_streak INTEGER NOT NULL DEFAULT 0,      -- 截至 last_checkin_date 的连续签到天数
+    last_checkin_date TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+);
+
+-- 为已有用户回填统计数据（之后可用 flask rebuild-stats 重新计算）
+WITH runs AS (
+    SELECT user_id, date,
+           julianday(date) - ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY date) AS grp
+    FROM checkins
+), latest AS (
+    SELECT user_id, MAX(date) AS last_checkin_date FROM checkins GROUP BY user_id
+), streaks AS (
+    SELECT r.user_id, COUNT(*) AS current_streak
+    FROM runs r
+    JOIN runs last ON last.user_id = r.user_id AND last.grp = r.grp
+    JOIN latest l ON l.user_id = last.user_id AND l.last_checkin_date = last.date
+    GROUP BY r.user_id
+)
+INSERT OR REPLACE INTO user_stats (user_id, total_focus_minutes, focus_sessions, total_tasks,
+                                   completed_tasks, total_checkins, current_streak, last_checkin_date)
+SELECT u.id,
+       (SELECT COALESCE(SUM(duration), 0) FROM focus_sessions f WHERE f.user_id = u.id AND f.end_time IS NOT NULL),
+       (SELECT COUNT(*) FROM focus_sessions f WHERE f.user_id = u.id AND f.end_time IS NOT NULL),
+       (SELECT COUNT(*) FROM tasks t WHERE t.user_id = u.id),
+       (SELECT COUNT(*) FROM tasks t WHERE t.user_id = u.id AND t.status = 'completed'),
+       (SELECT COUNT(*) FROM checkins c WHERE c.user_id = u.id),
+       COALESCE(s.current_streak, 0),
+       l.last_checkin_date
+FROM users u
+LEFT JOIN streaks s ON s.user_id = u.id
+LEFT JOIN latest l ON l.user_id = u.id;
@@ -0,0 +1,13 @@
+-- 连续签到状态：在 user_stats 中增加历史最长连续天数
+ALTER TABLE user_stats ADD COLUMN longest_streak INTEGER NOT NULL DEFAULT 0;
+
+-- 从签到明细回填（连续日期分组：julianday(date) - 行号 相同的日期属于同一段连续签到）
+WITH runs AS (
+    SELECT user_id, date,
+           julianday(date) - ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY date) AS grp
+    FROM checkins
+), islands AS (
+    SELECT user_id, grp, COUNT(*) AS length FROM runs GROUP BY user_id, grp
+)
+UPDATE user_stats
+SET longest_streak = COALESCE((SELECT MAX(length) FROM islands i WHERE i.user_id = user_stats.user_id), 0);
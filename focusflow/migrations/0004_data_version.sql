@@ -0,0 +1,3 @@
+-- 用户数据版本：专注记录、任务、签到或个人资料发生任何写入时递增
+-- 页面和统计接口的 ETag 由它生成，版本未变时直接返回 304
+ALTER TABLE user_stats ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0;
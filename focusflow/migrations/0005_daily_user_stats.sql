@@ -0,0 +1,29 @@
+-- 每个用户每天的汇总（随写操作在同一事务中增量维护）
+-- 仪表盘、报告、专注和个人资料页的按周/月/年窗口统计读取这张表，代价与天数成正比，而不是与专注记录数成正比
+-- 日期口径与原查询一致：专注记录按 start_time 的日期，完成任务按 updated_at 的日期，签到按 date
+-- 与 user_stats 一致，只统计已结束（end_time 不为空）的专注记录
+CREATE TABLE IF NOT EXISTS daily_user_stats (
+    user_id INTEGER NOT NULL,
+    day TEXT NOT NULL,                             -- YYYY-MM-DD
+    focus_minutes INTEGER NOT NULL DEFAULT 0,
+    sessions INTEGER NOT NULL DEFAULT 0,           -- 专注记录数
+    completed_tasks INTEGER NOT NULL DEFAULT 0,    -- 当天完成（最后更新）的已完成任务数
+    checked_in INTEGER NOT NULL DEFAULT 0,         -- 当天是否签到（0/1）
+    PRIMARY KEY (user_id, day),
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- 为已有数据回填汇总（之后可用 flask rebuild-daily-stats 重新计算）
+INSERT OR REPLACE INTO daily_user_stats (user_id, day, focus_minutes, sessions, completed_tasks, checked_in)
+SELECT user_id, day, SUM(focus_minutes), SUM(sessions), SUM(completed_tasks), SUM(checked_in)
+FROM (
+    SELECT user_id, substr(start_time, 1, 10) AS day, duration AS focus_minutes, 1 AS sessions,
+           0 AS completed_tasks, 0 AS checked_in
+    FROM focus_sessions
+    WHERE end_time IS NOT NULL
+    UNION ALL
+    SELECT user_id, substr(updated_at, 1, 10), 0, 0, 1, 0 FROM tasks WHERE status = 'completed'
+    UNION ALL
+    SELECT user_id, date, 0, 0, 0, 1 FROM checkins
+)
+GROUP BY user_id, day;
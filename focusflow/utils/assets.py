@@ -0,0 +1,527 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+import click
+from flask import current_app, request
+from flask.cli import AppGroup
+
+from utils.log import get_logger
+
+try:
+    import brotli
+except ImportError:  # brotli 是可选依赖：未安装时只生成 .gz
+    brotli = None
+
+try:
+    from fontTools import subset as font_subset
+except ImportError:  # fontTools 只在生成图标字体时需要
+    font_subset = None
+
+logger = get_logger(__name__)
+
+# 参与构建的静态资源目录（相对于 static/）及其中的文件扩展名；
+# 字体排在 CSS 之前，CSS 中的 url(../fonts/...) 才能改写为带哈希的文件名
+ASSET_DIRECTORIES = {'fonts': '.woff2', 'css': '.css', 'js': '.js'}
+
+# 构建产物目录与清单（相对于 static/）
+DIST_DIRECTORY = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# 带内容哈希的文件名不会复用，可以永久缓存
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+assets_cli = AppGroup('assets', help='Build fingerprinted static assets.')
+
+
+# ---------------------------------------------------------------------------
+# 压缩：只去掉注释和多余空白，字符串、模板字符串和正则字面量原样保留
+# ---------------------------------------------------------------------------
+
+def _skip_string(source, start, quote):
+    """返回从 start 开始的字符串字面量结束后的位置（支持模板字符串中的 ${...}）"""
+    i = start + 1
+    n = len(source)
+    while i < n:
+        ch = source[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if ch == quote:
+            return i + 1
+        if quote == '`' and source.startswith('${', i):
+            depth = 1
+            i += 2
+            while i < n and depth:
+                ch = source[i]
+                if ch in '"\'`':
+                    i = _skip_string(source, i, ch)
+                    continue
+                if ch == '{':
+                    depth += 1
+                elif ch == '}':
+                    depth -= 1
+                i += 1
+            continue
+        i += 1
+    return n
+
+
+def _skip_regex(source, start):
+    """返回正则字面量结束后的位置；遇到换行说明不是正则，返回 None"""
+    i = start + 1
+    in_class = False
+    while i < len(source):
+        ch = source[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if ch == '\n':
+            return None
+        if ch == '[':
+            in_class = True
+        elif ch == ']':
+            in_class = False
+        elif ch == '/' and not in_class:
+            i += 1
+            while i < len(source) and source[i].isalpha():
+                i += 1
+            return i
+        i += 1
+    return None
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch in '_$'
+
+
+# 这些字符或关键字之后出现的 / 是正则字面量而不是除号
+_REGEX_AFTER_CHARS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_AFTER_WORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void',
+                      'throw', 'instanceof', 'yield', 'await'}
+
+
+def _regex_allowed(out):
+    text = ''.join(out[-32:]).rstrip()
+    if not text:
+        return True
+    if text[-1] in _REGEX_AFTER_CHARS:
+        return True
+    if _is_word_char(text[-1]):
+        i = len(text)
+        while i > 0 and _is_word_char(text[i - 1]):
+            i -= 1
+        return text[i:] in _REGEX_AFTER_WORDS
+    return False
+
+
+def minify_js(source):
+    """保守的 JS 压缩：删除注释、缩进和空行，保留换行以免改变自动分号插入的结果"""
+    out = []
+    i = 0
+    n = len(source)
+    pending_space = pending_newline = False
+    while i < n:
+        ch = source[i]
+        if ch in ' \t\r\f\v':
+            pending_space = True
+            i += 1
+            continue
+        if ch == '\n':
+            pending_newline = True
+            i += 1
+            continue
+        if source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end < 0 else end
+            continue
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+            pending_space = True
+            continue
+
+        if out:
+            if pending_newline:
+                out.append('\n')
+            elif pending_space:
+                last = out[-1][-1]
+                if (_is_word_char(last) and _is_word_char(ch)) or (last in '+-' and ch in '+-'):
+                    out.append(' ')
+        pending_space = pending_newline = False
+
+        if ch in '"\'`':
+            end = _skip_string(source, i, ch)
+            out.append(source[i:end])
+            i = end
+            continue
+        if ch == '/' and _regex_allowed(out):
+            end = _skip_regex(source, i)
+            if end is not None:
+                out.append(source[i:end])
+                i = end
+                continue
+        out.append(ch)
+        i += 1
+    return ''.join(out).strip() + '\n'
+
+
+def minify_css(source):
+    """删除 CSS 注释和多余空白，字符串（含 data: URL）原样保留；/*! ... */ 许可声明保留"""
+    out = []
+    i = 0
+    n = len(source)
+    pending_space = False
+    while i < n:
+        ch = source[i]
+        if ch.isspace():
+            pending_space = True
+            i += 1
+            continue
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = n if end < 0 else end + 2
+            if source.startswith('/*!', i):
+                out.append(source[i:end] + '\n')
+            i = end
+            pending_space = True
+            continue
+        if out:
+            last = out[-1][-1]
+            if ch == '}' and last == ';':
+                out.pop()
+                last = out[-1][-1] if out else ''
+            if pending_space and last not in '{};,>:\n' and ch not in '{};,>':
+                out.append(' ')
+        pending_space = False
+        if ch in '"\'':
+            end = _skip_string(source, i, ch)
+            out.append(source[i:end])
+            i = end
+            continue
+        out.append(ch)
+        i += 1
+    return ''.join(out).strip() + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+# 本身已经压缩的格式：原样复制，不再生成 .gz / .br
+PRECOMPRESSED_EXTENSIONS = {'.woff2'}
+
+_CSS_URL = re.compile(r'''url\((['"]?)\.\./([^'")]+)\1\)''')
+
+
+def _rewrite_css_urls(source, manifest):
+    """把 CSS 中引用的已构建文件（如 ../fonts/x.woff2）改写为 dist 下带哈希的文件名"""
+    def replace(match):
+        hashed = manifest.get(match.group(2))
+        if not hashed:
+            return match.group(0)
+        quote = match.group(1)
+        return f'url({quote}../{hashed[len(DIST_DIRECTORY) + 1:]}{quote})'
+    return _CSS_URL.sub(replace, source)
+
+
+# ---------------------------------------------------------------------------
+# 构建：压缩、按内容哈希命名、生成清单和预压缩文件
+# ---------------------------------------------------------------------------
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def build(static_folder):
+    """构建 static/dist，返回清单 {原路径: 带哈希的路径}"""
+    dist = os.path.join(static_folder, DIST_DIRECTORY)
+    if os.path.isdir(dist):
+        shutil.rmtree(dist)
+    manifest = {}
+    for directory, extension in ASSET_DIRECTORIES.items():
+        source_dir = os.path.join(static_folder, directory)
+        if not os.path.isdir(source_dir):
+            continue
+        for name in sorted(os.listdir(source_dir)):
+            if not name.endswith(extension):
+                continue
+            if extension in MINIFIERS:
+                with open(os.path.join(source_dir, name), 'r', encoding='utf-8') as f:
+                    source = f.read()
+                if extension == '.css':
+                    source = _rewrite_css_urls(source, manifest)
+                data = MINIFIERS[extension](source).encode('utf-8')
+            else:
+                with open(os.path.join(source_dir, name), 'rb') as f:
+                    data = f.read()
+            digest = hashlib.sha256(data).hexdigest()[:10]
+            stem = os.path.splitext(name)[0]
+            hashed = f'{DIST_DIRECTORY}/{directory}/{stem}.{digest}{extension}'
+            path = os.path.join(static_folder, hashed)
+            _write(path, data)
+            if extension not in PRECOMPRESSED_EXTENSIONS:
+                _write(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    _write(path + '.br', brotli.compress(data, quality=11))
+            manifest[f'{directory}/{name}'] = hashed
+    _write(os.path.join(dist, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, DIST_DIRECTORY, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@assets_cli.command('build')
+def build_command():
+    """Minify static/css and static/js (and copy static/fonts) into static/dist with hashed names."""
+    static_folder = current_app.static_folder
+    manifest = build(static_folder)
+    for source, hashed in manifest.items():
+        original = os.path.getsize(os.path.join(static_folder, source))
+        built = os.path.join(static_folder, hashed)
+        sizes = [f'{os.path.getsize(built)} min']
+        if os.path.exists(built + '.gz'):
+            sizes.append(f'{os.path.getsize(built + ".gz")} gz')
+        if os.path.exists(built + '.br'):
+            sizes.append(f'{os.path.getsize(built + ".br")} br')
+        click.echo(f'{source} -> {hashed} ({original} bytes -> {", ".join(sizes)})')
+    if brotli is None:
+        click.echo('brotli is not installed; skipped .br files.')
+
+
+# ---------------------------------------------------------------------------
+# 图标：只保留模板和脚本中用到的 Font Awesome 图标，生成本地子集字体和样式
+# ---------------------------------------------------------------------------
+
+# 扫描这些位置（相对于应用根目录）中出现的 fa-* 类名
+ICON_SOURCES = (('templates', '.html'), ('static/js', '.js'))
+
+# 生成的文件（相对于 static/），需要提交到仓库，应用离线也能显示图标
+ICON_STYLESHEET = 'css/icons.css'
+ICON_FONTS = {900: 'fa-solid-900', 400: 'fa-regular-400'}
+
+# 找不到本地图标样式时退回的 CDN 地址
+ICON_CDN_URL = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css'
+
+# 始终保留的基础类（字体族、字重和 inline-block 等）；品牌图标不在使用范围内
+_ICON_BASE_CLASSES = {'fa', 'fas', 'far', 'fa-solid', 'fa-regular', 'fa-classic'}
+
+_ICON_CLASS = re.compile(r'(?<![\w-])fa-[a-z0-9-]+')
+_CSS_CLASS = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+_CSS_ICON_RULE = re.compile(r'^\.(fa-[a-z0-9-]+)::before$')
+_CSS_CONTENT = re.compile(r'content:\s*"\\([0-9a-fA-F]+)"')
+_CSS_ANIMATION = re.compile(r'animation-name:\s*([\w-]+)')
+
+
+def scan_icon_classes(root):
+    """收集模板和脚本中出现的 fa-* 类名"""
+    found = set()
+    for directory, extension in ICON_SOURCES:
+        path = os.path.join(root, directory)
+        if not os.path.isdir(path):
+            continue
+        for name in sorted(os.listdir(path)):
+            if name.endswith(extension):
+                with open(os.path.join(path, name), 'r', encoding='utf-8') as f:
+                    found.update(_ICON_CLASS.findall(f.read()))
+    return found
+
+
+def _css_blocks(source):
+    """把样式表切分为顶层的 (前导部分, 块内容)，注释单独作为 (注释, None)"""
+    blocks = []
+    i = 0
+    n = len(source)
+    while i < n:
+        if source[i].isspace():
+            i += 1
+            continue
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = n if end < 0 else end + 2
+            blocks.append((source[i:end], None))
+            i = end
+            continue
+        start = source.find('{', i)
+        if start < 0:
+            break
+        depth = 0
+        j = start
+        while j < n:
+            if source[j] == '{':
+                depth += 1
+            elif source[j] == '}':
+                depth -= 1
+                if depth == 0:
+                    break
+            j += 1
+        blocks.append((source[i:start].strip(), source[start + 1:j]))
+        i = j + 1
+    return blocks
+
+
+def _select_rules(blocks, used):
+    """保留选择器只涉及已用类名的规则，返回 (样式片段列表, 引用到的动画名)"""
+    rules = []
+    animations = set()
+    for prelude, body in blocks:
+        if body is None or prelude.startswith(('@font-face', ':root', '@-webkit-keyframes', '@keyframes')):
+            continue
+        if prelude.startswith('@media'):
+            inner, inner_animations = _select_rules(_css_blocks(body), used)
+            if inner:
+                rules.append(f'{prelude} {{\n' + '\n'.join(inner) + '}\n')
+                animations |= inner_animations
+            continue
+        selectors = [s.strip() for s in prelude.split(',')]
+        kept = [s for s in selectors
+                if not _CSS_ICON_RULE.match(s) and set(_CSS_CLASS.findall(s)) <= used and _CSS_CLASS.search(s)]
+        if kept:
+            rules.append(',\n'.join(kept) + ' {' + body + '}\n')
+            animations.update(_CSS_ANIMATION.findall(body))
+    return rules, animations
+
+
+def icon_codepoints(blocks):
+    """样式表中每个图标类名（含别名）对应的字符码位"""
+    codepoints = {}
+    for prelude, body in blocks:
+        if body is None:
+            continue
+        match = _CSS_CONTENT.search(body)
+        if not match:
+            continue
+        for selector in prelude.split(','):
+            rule = _CSS_ICON_RULE.match(selector.strip())
+            if rule:
+                codepoints[rule.group(1)] = int(match.group(1), 16)
+    return codepoints
+
+
+def _subset_font(source_path, target_path, codepoints):
+    options = font_subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = []
+    options.notdef_outline = True
+    font = font_subset.load_font(source_path, options)
+    try:
+        subsetter = font_subset.Subsetter(options)
+        subsetter.populate(unicodes=codepoints)
+        subsetter.subset(font)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        font_subset.save_font(font, target_path, options)
+    finally:
+        font.close()
+
+
+def default_icon_source():
+    """已安装 fontawesomefree 包时使用其中的样式和字体目录"""
+    try:
+        import fontawesomefree
+    except ImportError:
+        return None
+    return os.path.join(os.path.dirname(fontawesomefree.__file__), 'static', 'fontawesomefree')
+
+
+def build_icons(root, static_folder, source):
+    """根据用到的图标生成子集字体和 css/icons.css，返回 (图标码位, 未知类名)
+
+    source 为 Font Awesome Free 发行目录，包含 css/all.css 和 webfonts/*.ttf（从 TrueType 原文件取子集，
+    比解码 woff2 更可靠）。
+    """
+    with open(os.path.join(source, 'css', 'all.css'), 'r', encoding='utf-8') as f:
+        stylesheet = f.read()
+    blocks = _css_blocks(stylesheet)
+    available = icon_codepoints(blocks)
+    used = scan_icon_classes(root) | _ICON_BASE_CLASSES
+    rules, animations = _select_rules(blocks, used)
+    icons = {name: available[name] for name in sorted(used) if name in available}
+    known = {cls for prelude, body in blocks if body is not None for cls in _CSS_CLASS.findall(prelude)}
+    unknown = sorted(name for name in used - set(icons) - _ICON_BASE_CLASSES if name not in known)
+
+    # 常规体字体只有部分图标，两个字体都按全部码位取子集，缺少的字形会被自动忽略
+    fonts = []
+    for weight, stem in ICON_FONTS.items():
+        _subset_font(os.path.join(source, 'webfonts', stem + '.ttf'),
+                     os.path.join(static_folder, 'fonts', stem + '.woff2'), set(icons.values()))
+        fonts.append("@font-face {\n  font-family: 'Font Awesome 6 Free';\n  font-style: normal;\n"
+                     f"  font-weight: {weight};\n  font-display: block;\n"
+                     f'  src: url("../fonts/{stem}.woff2") format("woff2"); }}\n')
+
+    keyframes = [f'{prelude} {{{body}}}\n' for prelude, body in blocks
+                 if body is not None and prelude.split(' ')[0] in ('@-webkit-keyframes', '@keyframes')
+                 and prelude.split(' ')[-1] in animations]
+    icon_rules = [f'.{name}::before {{\n  content: "\\{codepoint:x}"; }}\n' for name, codepoint in icons.items()]
+    license_comment = blocks[0][0] if blocks and blocks[0][1] is None else ''
+    header = (license_comment + '\n/* 由 flask assets icons 生成，只包含模板和脚本中用到的图标，请勿手动修改 */\n')
+    _write(os.path.join(static_folder, ICON_STYLESHEET),
+           '\n'.join([header] + fonts + rules + keyframes + icon_rules).encode('utf-8'))
+    return icons, unknown
+
+
+@assets_cli.command('icons')
+@click.option('--source', type=click.Path(exists=True, file_okay=False),
+              help='Font Awesome Free directory containing css/all.css and webfonts/ '
+                   '(defaults to the installed fontawesomefree package).')
+def icons_command(source):
+    """Subset the Font Awesome fonts to the icons used in templates and scripts."""
+    if font_subset is None:
+        raise click.ClickException('fontTools is not installed (pip install fonttools brotli).')
+    source = source or default_icon_source()
+    if source is None:
+        raise click.ClickException('Pass --source or pip install fontawesomefree==6.4.0.')
+    static_folder = current_app.static_folder
+    icons, unknown = build_icons(current_app.root_path, static_folder, source)
+    click.echo(f'{len(icons)} icons -> {ICON_STYLESHEET} '
+               f'({os.path.getsize(os.path.join(static_folder, ICON_STYLESHEET))} bytes)')
+    for stem in ICON_FONTS.values():
+        path = os.path.join(static_folder, 'fonts', stem + '.woff2')
+        original = os.path.getsize(os.path.join(source, 'webfonts', stem + '.woff2'))
+        click.echo(f'fonts/{stem}.woff2 ({original} bytes -> {os.path.getsize(path)} bytes)')
+    for name in unknown:
+        click.echo(f'warning: {name} is not a Font Awesome class')
+
+
+# ---------------------------------------------------------------------------
+# 运行时：url_for('static', ...) 改写为带哈希的文件名，并设置长期缓存
+# ---------------------------------------------------------------------------
+
+def _hashed_static_url(manifest):
+    def inject(endpoint, values):
+        if endpoint == 'static':
+            hashed = manifest.get(values.get('filename'))
+            if hashed:
+                values['filename'] = hashed
+    return inject
+
+
+def _immutable_cache_headers(response):
+    if request.endpoint == 'static' and request.view_args.get('filename', '').startswith(DIST_DIRECTORY + '/'):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    """启用构建清单（ASSETS_USE_MANIFEST 为真且已执行 flask assets build 时生效）"""
+    manifest = load_manifest(app.static_folder) if app.config.get('ASSETS_USE_MANIFEST') else {}
+    app.extensions['assets'] = manifest
+    # 已生成本地图标样式时使用它，否则退回 CDN 上的完整 Font Awesome
+    local_icons = os.path.exists(os.path.join(app.static_folder, ICON_STYLESHEET))
+    app.jinja_env.globals['icon_stylesheet'] = ICON_STYLESHEET if local_icons else None
+    app.jinja_env.globals['icon_cdn_url'] = ICON_CDN_URL
+    if manifest:
+        app.url_defaults(_hashed_static_url(manifest))
+        logger.info('使用静态资源清单，共 %s 个文件', len(manifest))
+    app.after_request(_immutable_cache_headers)
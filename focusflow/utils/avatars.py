@@ -0,0 +1,330 @@
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from database import StatsDB
+from utils.db import get_db, write_transaction
+from utils.log import get_logger
+
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError, features
+except ImportError:  # Pillow 是可选依赖：未安装时直接使用上传的原图，也不检查图片尺寸
+    Image = None
+
+logger = get_logger(__name__)
+
+# 缩略图边长（像素），模板按显示尺寸选用不小于它的最小一档
+AVATAR_SIZES = (64, 128, 256)
+
+_PIL_FORMATS = {'webp': 'WEBP', 'avif': 'AVIF'}
+
+# 处理后的头像按内容寻址：<最大一档内容的哈希>_<边长>.<格式>，数据库中保存最大一档的文件名。
+# 相同图片在不同用户之间只存一份；文件一经写入不再修改，可以长期缓存。
+_VARIANT_NAME = re.compile(r'^(?P<base>.+)_(?P<size>\d+)\.(?P<ext>webp|avif)$')
+# 上传路由保存的原图：avatar_<用户 ID>_<随机十六进制>.<扩展名>（旧版本按客户端文件名保存，可能是 .jpeg）
+_ORIGINAL_NAME = re.compile(r'^avatar_\d+_[0-9a-f]+\.(?:png|jpg|jpeg|gif|webp)$')
+
+
+def variant_name(base, size, fmt):
+    return f'{base}_{size}.{fmt}'
+
+
+def avatar_variant(name, size):
+    """返回不小于 size 像素的最小一档缩略图文件名；未处理的原图原样返回"""
+    match = _VARIANT_NAME.match(name or '')
+    if not match:
+        return name
+    candidate = next((s for s in AVATAR_SIZES if s >= size), AVATAR_SIZES[-1])
+    return variant_name(match.group('base'), min(candidate, int(match.group('size'))), match.group('ext'))
+
+
+def is_processed(name):
+    return bool(_VARIANT_NAME.match(name or ''))
+
+
+def avatar_files(name):
+    """某个头像在磁盘上对应的所有文件名（原图或全部缩略图）"""
+    match = _VARIANT_NAME.match(name or '')
+    if not match:
+        return [name] if name else []
+    return [variant_name(match.group('base'), size, match.group('ext')) for size in AVATAR_SIZES]
+
+
+def avatar_etag(name):
+    """处理后头像的 ETag：文件名本身就由内容决定"""
+    return os.path.splitext(name)[0]
+
+
+# ---------------------------------------------------------------------------
+# 上传：按块读取请求体，不经过 request.files
+# ---------------------------------------------------------------------------
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# 识别图片类型所需的文件头长度（WebP 需要前 12 个字节）
+_MAGIC_LENGTH = 12
+
+
+class UploadRejected(Exception):
+    """头像上传被拒绝，reason 为 no_file / invalid_type / too_large"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def sniff_image_type(head):
+    """根据文件头魔数判断图片类型，返回扩展名；不是支持的图片时返回 None"""
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def check_dimensions(path, max_dimension):
+    """只解析图片头获取宽高（不解码像素），超过 max_dimension 时拒绝"""
+    if Image is None or not max_dimension:
+        return
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        raise UploadRejected('too_large')
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise UploadRejected('invalid_type')
+    if max(width, height) > max_dimension:
+        raise UploadRejected('too_large')
+
+
+def receive_upload(stream, content_type, directory, field='avatar', max_size=5 * 1024 * 1024,
+                   max_dimension=None, chunk_size=UPLOAD_CHUNK_SIZE):
+    """流式接收 multipart 请求中的头像文件，返回 (临时文件路径, 扩展名)
+
+    请求体按 chunk_size 分块读取并直接写入 directory 下的临时文件，内存占用与文件大小无关；
+    第一个数据块到达时就检查文件头魔数，不是图片立即拒绝，不再读取剩余数据。
+    """
+    mimetype, options = parse_options_header(content_type or '')
+    boundary = options.get('boundary')
+    if mimetype != 'multipart/form-data' or not boundary:
+        raise UploadRejected('no_file')
+
+    decoder = MultipartDecoder(boundary.encode('latin-1'))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.upload')
+    target = os.fdopen(fd, 'wb')
+    receiving = finished = False
+    head = b''
+    ext = None
+    size = 0
+    try:
+        while not finished:
+            chunk = stream.read(chunk_size)
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, (Epilogue, NeedData)):
+                if isinstance(event, File):
+                    receiving = event.name == field and event.filename != '' and not finished
+                elif isinstance(event, Field):
+                    receiving = False
+                elif isinstance(event, Data) and receiving:
+                    size += len(event.data)
+                    if size > max_size:
+                        raise UploadRejected('too_large')
+                    if ext is None:
+                        head += event.data
+                        if len(head) < _MAGIC_LENGTH and event.more_data:
+                            event = decoder.next_event()
+                            continue
+                        ext = sniff_image_type(head)
+                        if ext is None:
+                            raise UploadRejected('invalid_type')
+                        target.write(head)
+                    else:
+                        target.write(event.data)
+                    if not event.more_data:
+                        receiving = False
+                        finished = True
+                event = decoder.next_event()
+            if isinstance(event, Epilogue) or not chunk:
+                break
+        target.close()
+        if not finished:
+            raise UploadRejected('no_file')
+        check_dimensions(tmp_path, max_dimension)
+        return tmp_path, ext
+    except ValueError:
+        # 请求体不是合法的 multipart 数据
+        target.close()
+        os.remove(tmp_path)
+        raise UploadRejected('no_file')
+    except BaseException:
+        target.close()
+        os.remove(tmp_path)
+        raise
+
+
+def output_format(preferred):
+    """实际使用的输出格式：AVIF 需要 Pillow 带 AVIF 支持，否则退回 WebP"""
+    if preferred == 'avif' and features.check('avif'):
+        return 'avif'
+    return 'webp'
+
+
+def store_variants(source_path, directory, fmt='webp', quality=80):
+    """解码一次原图，裁成正方形并生成各档缩略图存入内容寻址目录，返回最大一档的文件名
+
+    先按 EXIF 方向旋转，再丢弃 EXIF 等元数据；写入临时文件后再改名，
+    保证页面不会读到写了一半的图片。已存在的同名文件直接复用。
+    """
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    image.info = {}
+
+    largest = max(AVATAR_SIZES)
+    image = ImageOps.fit(image, (largest, largest), Image.LANCZOS)
+    encoded = []
+    for size in sorted(AVATAR_SIZES, reverse=True):
+        if size != image.width:
+            image = image.resize((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, _PIL_FORMATS[fmt], quality=quality)
+        encoded.append((size, buffer.getvalue()))
+
+    digest = hashlib.sha256(encoded[0][1]).hexdigest()[:20]
+    for size, data in encoded:
+        path = os.path.join(directory, variant_name(digest, size, fmt))
+        if os.path.exists(path):
+            # 复用已有文件时刷新修改时间，避免它在切换引用前被垃圾回收
+            os.utime(path)
+            continue
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return variant_name(digest, largest, fmt)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='avatar')
+    return _executor
+
+
+def process_upload(app, user_id, filename):
+    """生成缩略图并把用户头像切换到处理后的文件（在后台线程中执行）
+
+    不再被引用的原图和缩略图不在这里删除，由 collect_garbage 统一清理。
+    """
+    directory = app.config['UPLOAD_FOLDER']
+    try:
+        processed = store_variants(os.path.join(directory, filename), directory,
+                                   output_format(app.config.get('AVATAR_FORMAT', 'webp')))
+    except Exception as e:
+        logger.exception('生成头像缩略图失败，继续使用原图: %s', e)
+        return None
+
+    def switch_avatar(conn):
+        # 处理期间用户可能又上传了新头像，此时保留新头像
+        updated = conn.execute('UPDATE users SET profile_picture = ? WHERE id = ? AND profile_picture = ?',
+                               (processed, user_id, filename)).rowcount
+        if updated:
+            StatsDB.touch(user_id, conn)
+        return updated
+
+    try:
+        with app.app_context():
+            updated = write_transaction(switch_avatar)
+    except Exception as e:
+        # 后台任务的返回值没有人读取，这里不记录的话失败就无迹可寻
+        logger.exception('切换用户 %s 的头像失败，继续使用原图: %s', user_id, e)
+        return None
+    maybe_collect_garbage(app)
+    if updated:
+        logger.debug('用户 %s 的头像已处理为: %s', user_id, processed)
+        return processed
+    return None
+
+
+def _is_generated(name):
+    """是否为本模块生成的文件：上传的原图、缩略图，或上传、处理中断后残留的临时文件"""
+    return bool(_ORIGINAL_NAME.match(name) or _VARIANT_NAME.match(name)) or name.endswith(('.upload', '.tmp'))
+
+
+def collect_garbage(app, grace=None):
+    """删除头像目录中没有任何用户引用的文件，返回删除的文件数
+
+    只删除修改时间早于 grace 秒之前的文件，避免误删正在上传或处理、尚未写入数据库的文件；
+    不是由上传和缩略图处理生成的文件（命名不符合）一律保留。
+    """
+    directory = app.config['UPLOAD_FOLDER']
+    if not os.path.isdir(directory):
+        return 0
+    grace = app.config.get('AVATAR_GC_GRACE', 3600) if grace is None else grace
+    with app.app_context():
+        rows = get_db().execute(
+            "SELECT DISTINCT profile_picture FROM users WHERE profile_picture IS NOT NULL AND profile_picture != ''"
+        ).fetchall()
+    referenced = set()
+    for row in rows:
+        referenced.update(avatar_files(row['profile_picture']))
+
+    cutoff = time.time() - grace
+    removed = 0
+    for entry in os.scandir(directory):
+        if entry.name in referenced or not _is_generated(entry.name) or not entry.is_file():
+            continue
+        if entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    if removed:
+        logger.info('头像垃圾回收：删除了 %s 个未引用的文件', removed)
+    return removed
+
+
+# 从进程启动时开始计时：第一次上传不会立即触发清理
+_last_collection = time.time()
+
+
+def maybe_collect_garbage(app):
+    """距上次清理超过 AVATAR_GC_INTERVAL 秒时执行一次垃圾回收"""
+    global _last_collection
+    now = time.time()
+    if now - _last_collection < app.config.get('AVATAR_GC_INTERVAL', 3600):
+        return 0
+    _last_collection = now
+    try:
+        return collect_garbage(app)
+    except Exception as e:
+        logger.exception('头像垃圾回收失败: %s', e)
+        return 0
+
+
+def schedule_processing(app, user_id, filename):
+    """把头像处理交给后台线程，上传请求无需等待解码和编码；未安装 Pillow 时不处理"""
+    if Image is None:
+        return None
+    return _get_executor().submit(process_upload, app, user_id, filename)
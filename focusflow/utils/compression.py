@@ -0,0 +1,132 @@
+import gzip
+import os
+import zlib
+
+from flask import current_app, request
+from werkzeug.wsgi import wrap_file
+
+from utils.log import get_logger
+
+try:
+    import brotli
+except ImportError:  # brotli 是可选依赖：未安装时只使用 gzip
+    brotli = None
+
+logger = get_logger(__name__)
+
+# 预压缩文件的后缀（flask assets build 在 static/dist 下生成）
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def choose_encoding(accept_encodings):
+    """按客户端的 Accept-Encoding 选择压缩算法：优先 br，其次 gzip，都不接受时返回 None"""
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best = max(candidates, key=lambda name: accept_encodings[name])
+    return best if accept_encodings[best] > 0 else None
+
+
+def compress(data, encoding, level=6, br_quality=4):
+    if encoding == 'br':
+        return brotli.compress(data, quality=br_quality)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _gzip_stream(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        # 每个块都刷新输出，流式响应的内容能及时到达浏览器
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _brotli_stream(chunks, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in chunks:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def compress_stream(chunks, encoding, level=6, br_quality=4):
+    """逐块压缩流式响应"""
+    if encoding == 'br':
+        return _brotli_stream(chunks, br_quality)
+    return _gzip_stream(chunks, level)
+
+
+def _add_vary(response):
+    response.vary.add('Accept-Encoding')
+
+
+def _mark_encoded(response, encoding):
+    response.headers['Content-Encoding'] = encoding
+    _add_vary(response)
+    # 压缩后的字节与原文不同，强 ETag 改为弱 ETag；弱比较下条件请求仍能返回 304
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def _serve_precompressed(response, encoding):
+    """static/dist 下的文件直接换成构建时生成的 .br / .gz，不在请求中压缩"""
+    filename = (request.view_args or {}).get('filename', '')
+    if not filename.startswith('dist/'):
+        return False
+    path = os.path.join(current_app.static_folder, filename + PRECOMPRESSED_SUFFIXES[encoding])
+    if not os.path.isfile(path):
+        return False
+    response.close()
+    response.response = wrap_file(request.environ, open(path, 'rb'))
+    response.content_length = os.path.getsize(path)
+    _mark_encoded(response, encoding)
+    return True
+
+
+def _compress_response(response):
+    config = current_app.config
+    if not config.get('COMPRESS_ENABLED'):
+        return response
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESS_MIMETYPES']
+            or response.cache_control.no_transform):
+        return response
+
+    encoding = choose_encoding(request.accept_encodings)
+    if request.endpoint == 'static':
+        # 静态文件不在请求中压缩：构建产物有预压缩版本，开发环境的源文件原样返回
+        if encoding is not None and _serve_precompressed(response, encoding):
+            return response
+        _add_vary(response)
+        return response
+    if encoding is None:
+        _add_vary(response)
+        return response
+
+    level = config.get('COMPRESS_LEVEL', 6)
+    br_quality = config.get('COMPRESS_BR_QUALITY', 4)
+    if response.is_streamed:
+        response.response = compress_stream(response.iter_encoded(), encoding, level, br_quality)
+        response.headers.pop('Content-Length', None)
+        _mark_encoded(response, encoding)
+        return response
+
+    if response.direct_passthrough:
+        return response
+    data = response.get_data()
+    if len(data) < config.get('COMPRESS_MIN_SIZE', 500):
+        _add_vary(response)
+        return response
+    response.set_data(compress(data, encoding, level, br_quality))
+    _mark_encoded(response, encoding)
+    return response
+
+
+def init_app(app):
+    """注册响应压缩（需在其它 after_request 之前注册，才能最后执行、压缩最终的响应体）"""
+    app.after_request(_compress_response)
+    if app.config.get('COMPRESS_ENABLED') and brotli is None:
+        logger.info('未安装 brotli，响应只使用 gzip 压缩')
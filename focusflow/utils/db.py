@@ -0,0 +1,266 @@
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g, has_app_context
+
+from utils.log import get_logger
+from utils.migrations import migrate
+from utils.profiling import ProfiledCursor
+
+logger = get_logger(__name__)
+
+
+class PooledConnection(sqlite3.Connection):
+    """连接池中的 sqlite3 连接
+
+    路由里仍然保留了 ``conn.close()`` 的写法；对池化连接来说 close() 不做任何事，
+    连接会在应用上下文结束时（teardown_appcontext）统一归还给连接池。
+
+    请求开启 SQL 统计时 ``profile`` 指向当前请求的 RequestProfile，
+    execute 等调用改用 ProfiledCursor 以记录每条语句的耗时。
+    """
+
+    profile = None
+
+    def execute(self, sql, parameters=()):
+        if self.profile is None:
+            return super().execute(sql, parameters)
+        return self.cursor(ProfiledCursor).execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if self.profile is None:
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor(ProfiledCursor).executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        if self.profile is None:
+            return super().executescript(sql_script)
+        return self.cursor(ProfiledCursor).executescript(sql_script)
+
+    def commit(self):
+        profile = self.profile
+        if profile is None:
+            return super().commit()
+        started = time.perf_counter()
+        super().commit()
+        # trace 回调会登记 COMMIT 语句，耗时记在它上面
+        if profile.current is not None:
+            profile.current[1] += time.perf_counter() - started
+
+    def close(self):
+        pass
+
+    def discard(self):
+        """真正关闭底层连接"""
+        super().close()
+
+
+class ConnectionPool:
+    """按进程维护的 SQLite 连接池
+
+    最多保留 ``size`` 个空闲的“热”连接；高并发时超出部分临时创建，归还时直接关闭，
+    因此不会因为池被占满而阻塞请求。``pragmas`` 只在建立物理连接时执行一次。
+    """
+
+    def __init__(self, database, size=5, pragmas=None, cached_statements=128):
+        self.database = database
+        self.size = size
+        self.pragmas = dict(pragmas or {})
+        self.cached_statements = cached_statements
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=self.size)
+
+    def _connect(self):
+        conn = connect(self.database, self.pragmas, self.cached_statements, factory=PooledConnection)
+        conn.row_factory = sqlite3.Row
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        # gunicorn 等预加载后 fork 的场景：子进程不能复用父进程的连接
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        if self._pid != os.getpid():
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.discard()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().discard()
+            except queue.Empty:
+                break
+
+
+def apply_pragmas(conn, pragmas):
+    """在连接上执行调优 PRAGMA；busy_timeout 放在最前面，保证切换 WAL 时也能等待锁"""
+    items = sorted((pragmas or {}).items(), key=lambda item: item[0] != 'busy_timeout')
+    for name, value in items:
+        conn.execute(f'PRAGMA {name} = {value}')
+
+
+def connect(database, pragmas=None, cached_statements=128, factory=sqlite3.Connection):
+    """按调优参数建立一个新的 SQLite 连接"""
+    conn = sqlite3.connect(database, factory=factory, check_same_thread=False,
+                           cached_statements=cached_statements)
+    apply_pragmas(conn, pragmas)
+    return conn
+
+
+_pool_lock = threading.Lock()
+
+
+def get_pool(app=None):
+    """获取（必要时创建）当前应用的连接池"""
+    app = app or current_app._get_current_object()
+    pool = app.extensions.get('sqlite_pool')
+    if pool is None or pool.database != app.config['DATABASE']:
+        with _pool_lock:
+            pool = app.extensions.get('sqlite_pool')
+            if pool is None or pool.database != app.config['DATABASE']:
+                if pool is not None:
+                    pool.close_all()
+                pool = ConnectionPool(app.config['DATABASE'],
+                                      size=app.config.get('DB_POOL_SIZE', 5),
+                                      pragmas=app.config.get('SQLITE_PRAGMAS'),
+                                      cached_statements=app.config.get('SQLITE_CACHED_STATEMENTS', 128))
+                # 新进程第一次使用数据库时补齐尚未应用的迁移（如统计索引）
+                conn = pool.acquire()
+                try:
+                    migrate(conn)
+                finally:
+                    pool.release(conn)
+                app.extensions['sqlite_pool'] = pool
+    return pool
+
+
+def get_db():
+    """返回当前应用上下文共享的数据库连接，同一请求内多次调用得到同一个连接"""
+    if 'db' not in g:
+        conn = get_pool().acquire()
+        profile = g.get('sql_profile')
+        if profile is not None:
+            profile.attach(conn)
+        g.db = conn
+    return g.db
+
+
+def close_db(exception=None):
+    """应用上下文结束时把连接归还给连接池"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        if conn.profile is not None:
+            conn.profile.detach(conn)
+        conn.pool.release(conn)
+
+
+class WriteConflict(sqlite3.OperationalError):
+    """写事务在期限内一直拿不到写锁（仍然是 "database is locked" 一类的 OperationalError）"""
+
+
+# 写事务重试参数的默认值（应用上下文之外使用；应用中取 WRITE_RETRY_* 配置）
+WRITE_RETRY_DEFAULTS = {'WRITE_RETRY_DEADLINE': 10.0, 'WRITE_RETRY_BASE_DELAY': 0.005, 'WRITE_RETRY_MAX_DELAY': 0.25}
+
+_write_stats_lock = threading.Lock()
+_write_stats = {'transactions': 0, 'retries': 0, 'conflicts': 0}
+
+
+def _count_write(name):
+    with _write_stats_lock:
+        _write_stats[name] += 1
+
+
+def write_stats():
+    """当前进程中写事务的提交数、重试次数和放弃次数"""
+    with _write_stats_lock:
+        return dict(_write_stats)
+
+
+def is_busy_error(error):
+    """SQLITE_BUSY / SQLITE_LOCKED（含扩展错误码，如 WAL 下的 SQLITE_BUSY_SNAPSHOT）"""
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    message = str(error)
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+def _retry_setting(name):
+    if has_app_context():
+        return current_app.config.get(name, WRITE_RETRY_DEFAULTS[name])
+    return WRITE_RETRY_DEFAULTS[name]
+
+
+def write_transaction(work, conn=None, deadline=None):
+    """以 BEGIN IMMEDIATE 执行一个写事务单元 work(conn)，提交后返回它的返回值
+
+    事务一开始就取得写锁：不会出现先读后写的延迟事务在升级为写锁时
+    直接失败（WAL 下的 SQLITE_BUSY_SNAPSHOT，busy_timeout 对它无效）的情况。
+    拿不到锁（SQLITE_BUSY）时回滚，按指数退避加随机抖动等待后重新执行整个 work，
+    超过 deadline 秒（默认 WRITE_RETRY_DEADLINE）后抛出 WriteConflict。
+    work 可能被执行多次，应只包含数据库操作，flash、响应等放在提交之后。
+
+    连接已经处于事务中时（外层的 write_transaction）直接在该事务中执行，由外层负责提交和重试。
+    """
+    conn = conn or get_db()
+    if conn.in_transaction:
+        return work(conn)
+    deadline = _retry_setting('WRITE_RETRY_DEADLINE') if deadline is None else deadline
+    delay = _retry_setting('WRITE_RETRY_BASE_DELAY')
+    max_delay = _retry_setting('WRITE_RETRY_MAX_DELAY')
+    give_up_at = time.monotonic() + deadline
+    attempt = 1
+    while True:
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            result = work(conn)
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not is_busy_error(e):
+                raise
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                _count_write('conflicts')
+                logger.warning('写事务在 %.1f 秒内重试 %s 次仍未拿到写锁', deadline, attempt)
+                raise WriteConflict(f'database is locked: gave up after {attempt} attempt(s)') from e
+            # 完全随机抖动：多个等待者不会在同一时刻再次争抢
+            pause = min(random.uniform(0, delay), remaining)
+            logger.debug('写事务第 %s 次遇到锁冲突 (%s)，%.1f 毫秒后重试', attempt, e, pause * 1000)
+            _count_write('retries')
+            time.sleep(pause)
+            delay = min(delay * 2, max_delay)
+            attempt += 1
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        else:
+            _count_write('transactions')
+            return result
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
@@ -0,0 +1,195 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import current_app
+
+from utils.db import connect, is_busy_error, write_transaction
+from utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# 放入队列后写线程处理完之前的单元就退出
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """组提交写入器：把并发提交的写事务单元合并到同一个事务中，一次 COMMIT（一次 fsync）确认一批
+
+    每个进程一个后台线程和一个专用连接。run(work) 把 work(conn) 放入队列并阻塞等待：
+    写线程取出队列中已有的单元（上一批提交期间到达的），window 大于 0 时再最多等待 window 秒，
+    每批最多 max_batch 个，在一个 BEGIN IMMEDIATE 事务中依次执行，提交成功后才唤醒各个请求并返回各自的结果。
+    连接使用 synchronous=FULL 时，run() 返回就表示这条记录已经持久化。
+
+    每个单元在自己的 SAVEPOINT 中执行：某个单元抛出异常只回滚它自己，异常在对应的请求中重新抛出，
+    同一批中的其他单元照常提交；提交本身失败时整批都收到该异常。
+    """
+
+    def __init__(self, database, pragmas=None, window=0.0, max_batch=64, deadline=10.0):
+        self.database = database
+        self.pragmas = dict(pragmas or {})
+        self.window = window
+        self.max_batch = max_batch
+        self.deadline = deadline
+        self.metrics = {'batches': 0, 'units': 0, 'largest_batch': 0}
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def _ensure_thread(self):
+        # 预加载后 fork 的工作进程继承了父进程的对象，但没有继承写线程
+        if self._thread is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name='group-commit', daemon=True)
+                    self._thread.start()
+
+    def run(self, work, timeout=None):
+        """在下一批事务中执行 work(conn)，该批提交后返回 work 的返回值
+
+        timeout 秒内没有结果时抛出 concurrent.futures.TimeoutError（该单元仍可能在之后提交）。
+        """
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((work, future))
+        # 入队前写线程可能刚好异常退出：此时重新启动，由新线程处理刚放入的单元
+        self._ensure_thread()
+        return future.result(timeout=timeout)
+
+    def close(self):
+        """已排队的单元写完后停止写线程"""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                self._queue.put(_STOP)
+                self._thread.join()
+            self._thread = None
+
+    def _collect(self):
+        """取出下一批单元；第二个返回值表示收到了停止信号"""
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        # 上一批提交期间到达的单元直接带走；window 大于 0 时再多等一会儿凑更大的批
+        give_up_at = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = give_up_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _loop(self):
+        batch = []
+        try:
+            conn = connect(self.database, self.pragmas)
+            conn.row_factory = sqlite3.Row
+            stopping = False
+            while not stopping:
+                batch, stopping = self._collect()
+                if not batch:
+                    continue
+                try:
+                    outcomes = write_transaction(lambda conn: [self._apply(conn, work) for work, _ in batch],
+                                                 conn, deadline=self.deadline)
+                except Exception as e:
+                    logger.exception('组提交失败（%s 个单元）: %s', len(batch), e)
+                    for _, future in batch:
+                        future.set_exception(e)
+                    batch = []
+                    continue
+                with self._lock:
+                    self.metrics['batches'] += 1
+                    self.metrics['units'] += len(batch)
+                    self.metrics['largest_batch'] = max(self.metrics['largest_batch'], len(batch))
+                for (_, future), (ok, value) in zip(batch, outcomes):
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+                batch = []
+            conn.close()
+        except BaseException as e:
+            # 写线程意外退出（例如无法打开连接）：让等待中的请求立即失败，下一次 run() 重新启动写线程
+            logger.exception('组提交写线程异常退出: %s', e)
+            self._abandon(batch, e)
+
+    def _abandon(self, batch, error):
+        with self._lock:
+            self._thread = None
+            pending = list(batch)
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    pending.append(item)
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(error)
+
+    @staticmethod
+    def _apply(conn, work):
+        # 锁冲突不在这里处理：交给 write_transaction 回滚并重试整批
+        conn.execute('SAVEPOINT group_unit')
+        try:
+            value = work(conn)
+        except Exception as e:
+            if isinstance(e, sqlite3.OperationalError) and is_busy_error(e):
+                raise
+            conn.execute('ROLLBACK TO group_unit')
+            conn.execute('RELEASE group_unit')
+            return False, e
+        conn.execute('RELEASE group_unit')
+        return True, value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.metrics)
+        stats['average_batch'] = stats['units'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+
+_writer_lock = threading.Lock()
+
+
+def get_writer(app=None):
+    """返回当前应用的组提交写入器；FOCUS_GROUP_COMMIT 关闭时返回 None"""
+    app = app or current_app._get_current_object()
+    if not app.config.get('FOCUS_GROUP_COMMIT'):
+        return None
+    writer = app.extensions.get('group_commit')
+    if writer is None or writer.database != app.config['DATABASE']:
+        with _writer_lock:
+            writer = app.extensions.get('group_commit')
+            if writer is None or writer.database != app.config['DATABASE']:
+                if writer is not None:
+                    writer.close()
+                pragmas = dict(app.config.get('SQLITE_PRAGMAS') or {},
+                               synchronous=app.config.get('GROUP_COMMIT_SYNCHRONOUS', 'FULL'))
+                writer = GroupCommitWriter(app.config['DATABASE'], pragmas,
+                                           window=app.config.get('GROUP_COMMIT_WINDOW_MS', 0) / 1000,
+                                           max_batch=app.config.get('GROUP_COMMIT_MAX_BATCH', 64),
+                                           deadline=app.config.get('WRITE_RETRY_DEADLINE', 10.0))
+                app.extensions['group_commit'] = writer
+                logger.info('专注记录组提交已启用：窗口 %s 毫秒，每批最多 %s 条', writer.window * 1000, writer.max_batch)
+    return writer
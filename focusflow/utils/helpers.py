@@ -2,6 +2,10 @@ from datetime import datetime, timedelta
 import random
 import string
 
+from utils.log import get_logger
+
+logger = get_logger(__name__)
+
 # 生成随机字符串
 def generate_random_string(length=10):
     letters = string.ascii_letters + string.digits
@@ -68,7 +72,7 @@ def generate_avatar_data(user):
     """
     # 确保user不为None
     if not user:
-        print("[调试] generate_avatar_data: user为None，返回默认值UU")
+        logger.debug('generate_avatar_data: user为None，返回默认值UU')
         return 'UU', generate_random_color()
     
     try:
@@ -81,15 +85,15 @@ def generate_avatar_data(user):
             # 直接访问字段，如果不存在会抛出KeyError
             first_name = str(user['first_name']).strip()
             last_name = str(user['last_name']).strip()
-            print(f"[调试] generate_avatar_data: 字典式访问成功 - 名字: '{first_name}', 姓氏: '{last_name}'")
+            logger.debug("generate_avatar_data: 字典式访问成功 - 名字: '%s', 姓氏: '%s'", first_name, last_name)
         except (KeyError, TypeError) as e:
-            print(f"[调试] generate_avatar_data: 字典式访问失败: {str(e)}，尝试属性式访问")
+            logger.debug('generate_avatar_data: 字典式访问失败: %s，尝试属性式访问', e)
             # 方法2：属性式访问（适用于对象）
             if hasattr(user, 'first_name'):
                 first_name = str(getattr(user, 'first_name', '')).strip()
             if hasattr(user, 'last_name'):
                 last_name = str(getattr(user, 'last_name', '')).strip()
-            print(f"[调试] generate_avatar_data: 属性式访问结果 - 名字: '{first_name}', 姓氏: '{last_name}'")
+            logger.debug("generate_avatar_data: 属性式访问结果 - 名字: '%s', 姓氏: '%s'", first_name, last_name)
         
         # 提取首字母 - 支持中英文
         # 对于中文，直接获取第一个字符；对于英文，获取第一个字母并转为大写
@@ -106,11 +110,11 @@ def generate_avatar_data(user):
         else:
             initials = 'UU'  # 都没有，使用默认值
         
-        print(f"[调试] generate_avatar_data: 最终组合的首字母: '{initials}'")
+        logger.debug("generate_avatar_data: 最终组合的首字母: '%s'", initials)
         
     except Exception as e:
         # 发生任何错误时使用默认值
-        print(f"[调试] generate_avatar_data: 发生错误: {str(e)}，返回默认值UU")
+        logger.warning('generate_avatar_data: 发生错误: %s，返回默认值UU', e)
         initials = 'UU'
     
     # 生成随机背景颜色
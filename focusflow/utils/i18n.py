@@ -0,0 +1,207 @@
+import ast
+import array
+import gettext
+import hashlib
+import json
+import os
+import struct
+import threading
+
+# 界面文案目录：translations/<locale>/LC_MESSAGES/messages.po（编译后生成 messages.mo）
+TRANSLATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'translations')
+
+
+class FrozenCatalog(dict):
+    """只读的翻译表
+
+    继承 dict 以便 Jinja 的 tojson 可以直接序列化，所有修改操作都会抛出 TypeError，
+    避免某个请求意外改动进程内共享的缓存。
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('translation catalogs are read-only')
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def copy(self):
+        return dict(self)
+
+
+class TranslationCatalogs:
+    """按语言缓存合并好回退文案的翻译表
+
+    ``loader`` 返回 {语言: {键: 文案}} 的原始表，只在第一次使用时调用一次；
+    每种语言在第一次请求时与回退语言合并并冻结，之后直接返回同一个对象。
+    """
+
+    def __init__(self, loader, fallback='en-US'):
+        self._loader = loader
+        self.fallback = fallback
+        self._tables = None
+        self._catalogs = {}
+        self._versions = {}
+        self._scripts = {}
+        self._lock = threading.Lock()
+
+    def _load_tables(self):
+        if self._tables is None:
+            self._tables = self._loader()
+        return self._tables
+
+    def get(self, lang):
+        catalog = self._catalogs.get(lang)
+        if catalog is None:
+            with self._lock:
+                catalog = self._catalogs.get(lang)
+                if catalog is None:
+                    tables = self._load_tables()
+                    merged = dict(tables[self.fallback])
+                    if lang in tables and lang != self.fallback:
+                        merged.update(tables[lang])
+                    catalog = FrozenCatalog(merged)
+                    self._catalogs[lang] = catalog
+        return catalog
+
+    def version(self, lang):
+        """翻译表内容的短哈希，文案变化时随之变化"""
+        version = self._versions.get(lang)
+        if version is None:
+            payload = json.dumps(self.get(lang), sort_keys=True, ensure_ascii=False)
+            version = hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+            self._versions[lang] = version
+        return version
+
+    def script(self, lang):
+        """前端使用的翻译脚本（设置 window.TRANSLATIONS），每种语言只生成一次"""
+        script = self._scripts.get(lang)
+        if script is None:
+            payload = json.dumps(self.get(lang), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+            script = f'window.TRANSLATIONS={payload};\n'.encode('utf-8')
+            self._scripts[lang] = script
+        return script
+
+    def warm(self, languages):
+        for lang in languages:
+            self.get(lang)
+
+
+# ---------------------------------------------------------------------------
+# gettext 目录：.po 解析与 .mo 编译（与 msgfmt 输出格式一致，不依赖 Babel）
+# ---------------------------------------------------------------------------
+
+def parse_po(path):
+    """解析 .po 文件，返回 {msgid: msgstr}（跳过空译文和文件头）"""
+    messages = {}
+    msgid = msgstr = None
+    section = None
+
+    def flush():
+        if msgid and msgstr:
+            messages[msgid] = msgstr
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for raw_line in f:
+            line = raw_line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('msgctxt'):
+                continue
+            if line.startswith('msgid '):
+                flush()
+                msgid, msgstr, section = ast.literal_eval(line[6:].strip()), '', 'msgid'
+            elif line.startswith('msgstr '):
+                msgstr, section = ast.literal_eval(line[7:].strip()), 'msgstr'
+            elif line.startswith('"'):
+                if section == 'msgid':
+                    msgid += ast.literal_eval(line)
+                elif section == 'msgstr':
+                    msgstr += ast.literal_eval(line)
+    flush()
+    return messages
+
+
+def compile_po(po_path, mo_path=None):
+    """把 .po 编译成 GNU .mo 文件，返回 .mo 路径"""
+    mo_path = mo_path or os.path.splitext(po_path)[0] + '.mo'
+    messages = parse_po(po_path)
+    messages.setdefault('', 'Content-Type: text/plain; charset=UTF-8\n')
+    keys = sorted(messages)
+    ids = strs = b''
+    offsets = []
+    for key in keys:
+        key_bytes, value_bytes = key.encode('utf-8'), messages[key].encode('utf-8')
+        offsets.append((len(ids), len(key_bytes), len(strs), len(value_bytes)))
+        ids += key_bytes + b'\0'
+        strs += value_bytes + b'\0'
+    key_start = 7 * 4 + 16 * len(keys)
+    value_start = key_start + len(ids)
+    key_offsets, value_offsets = [], []
+    for id_offset, id_length, str_offset, str_length in offsets:
+        key_offsets += [id_length, id_offset + key_start]
+        value_offsets += [str_length, str_offset + value_start]
+    header = struct.pack('Iiiiiii', 0x950412de, 0, len(keys), 7 * 4, 7 * 4 + len(keys) * 8, 0, 0)
+    with open(mo_path, 'wb') as f:
+        f.write(header)
+        f.write(array.array('i', key_offsets + value_offsets).tobytes())
+        f.write(ids)
+        f.write(strs)
+    return mo_path
+
+
+def compile_all(directory=TRANSLATIONS_DIR):
+    """编译目录下所有 messages.po，返回生成的 .mo 路径列表"""
+    compiled = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith('.po'):
+                compiled.append(compile_po(os.path.join(root, name)))
+    return sorted(compiled)
+
+
+def _locale_candidates(lang):
+    """zh-TW -> ['zh_TW', 'zh']"""
+    locale = lang.replace('-', '_')
+    return [locale, locale.split('_')[0]]
+
+
+_gettext_cache = {}
+_gettext_lock = threading.Lock()
+
+
+def get_gettext(lang, directory=TRANSLATIONS_DIR):
+    """返回该语言的 gettext 翻译对象（每个进程每种语言只加载一次）
+
+    优先读取编译好的 messages.mo；如果 .mo 不存在或比 .po 旧，则直接从 .po 构建。
+    """
+    translation = _gettext_cache.get(lang)
+    if translation is not None:
+        return translation
+    with _gettext_lock:
+        translation = _gettext_cache.get(lang)
+        if translation is None:
+            translation = gettext.NullTranslations()
+            for locale in _locale_candidates(lang):
+                po_path = os.path.join(directory, locale, 'LC_MESSAGES', 'messages.po')
+                mo_path = os.path.join(directory, locale, 'LC_MESSAGES', 'messages.mo')
+                if os.path.exists(mo_path) and (not os.path.exists(po_path)
+                                                or os.path.getmtime(mo_path) >= os.path.getmtime(po_path)):
+                    with open(mo_path, 'rb') as f:
+                        translation = gettext.GNUTranslations(f)
+                    break
+                if os.path.exists(po_path):
+                    translation = _PoTranslations(parse_po(po_path))
+                    break
+            _gettext_cache[lang] = translation
+    return translation
+
+
+class _PoTranslations(gettext.NullTranslations):
+    """尚未编译 .mo 时直接使用 .po 内容"""
+
+    def __init__(self, messages):
+        super().__init__()
+        self._messages = messages
+
+    def gettext(self, message):
+        return self._messages.get(message, message)
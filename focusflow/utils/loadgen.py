@@ -0,0 +1,199 @@
+import http.cookiejar
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# 闭环压测：每个虚拟用户保持自己的会话 cookie，收到响应后（可选思考时间）立即发送下一个请求
+
+CAPTCHA_PATTERN = re.compile(r'(\d+)\s*\+\s*(\d+)\s*=\s*\?')
+TASK_ID_PATTERN = re.compile(r'data-task-id="(\d+)"')
+# 写冲突的表现：接口把异常信息放进响应体，或页面以提示消息显示
+LOCK_MARKER = b'database is locked'
+# 延迟直方图的桶上界（毫秒），最后一个桶收集更慢的请求
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+DEFAULT_MIX = 'dashboard=5,timer=2,task_edit=2,report=1'
+
+
+class LoadError(Exception):
+    """虚拟用户无法开始压测（登录失败等）"""
+
+
+def parse_mix(text):
+    """解析场景权重，如 'dashboard=5,timer=2'；未知场景名抛出 ValueError"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.strip().partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f"unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class VirtualUser:
+    """一个登录后的模拟用户，使用自己的 cookie"""
+
+    def __init__(self, base_url, phone, password, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.phone = phone
+        self.password = password
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.task_ids = []
+
+    def request(self, method, path, form=None, json_body=None):
+        """发送请求（跟随重定向），返回 (状态码, 响应体, 最终 URL)；4xx/5xx 也作为结果返回"""
+        headers = {}
+        data = None
+        if form is not None:
+            data = urllib.parse.urlencode(form).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            data = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                return response.status, response.read(), response.geturl()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), e.geturl()
+
+    def login(self):
+        """打开登录页，从页面解析算术验证码并提交；之后读取任务 ID 供编辑场景使用"""
+        status, body, _ = self.request('GET', '/login')
+        match = CAPTCHA_PATTERN.search(body.decode('utf-8', 'replace'))
+        if status != 200 or not match:
+            raise LoadError(f'{self.phone}: login page returned {status} without a captcha')
+        answer = int(match.group(1)) + int(match.group(2))
+        status, _, url = self.request('POST', '/login', form={
+            'phone': self.phone, 'password': self.password, 'captcha': str(answer)})
+        if urllib.parse.urlsplit(url).path != '/dashboard':
+            raise LoadError(f'{self.phone}: login failed (status {status}, ended at {url})')
+        status, body, _ = self.request('GET', '/tasks')
+        self.task_ids = sorted({int(value) for value in TASK_ID_PATTERN.findall(body.decode('utf-8', 'replace'))})
+
+
+def _dashboard(user, rng, options):
+    return user.request('GET', '/dashboard')
+
+
+def _report(user, rng, options):
+    return user.request('GET', '/reports')
+
+
+def _timer(user, rng, options):
+    # 一个番茄钟结束：保存 timer_minutes 分钟的专注记录，有任务时随机关联一个
+    task_id = rng.choice(user.task_ids) if user.task_ids and rng.random() < 0.7 else None
+    return user.request('POST', '/focus/save_session',
+                        json_body={'duration': options['timer_minutes'], 'task_id': task_id})
+
+
+def _task_edit(user, rng, options):
+    if not user.task_ids:
+        return _dashboard(user, rng, options)
+    return user.request('POST', f'/tasks/update_status/{rng.choice(user.task_ids)}',
+                        json_body={'status': rng.choice(['completed', 'in_progress', 'pending'])})
+
+
+SCENARIOS = {
+    'dashboard': _dashboard,
+    'timer': _timer,
+    'task_edit': _task_edit,
+    'report': _report,
+}
+
+
+def _run_user(user, mix, options, seed, start, deadline, samples, lock):
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    local = []
+    time.sleep(max(0.0, start - time.time()))
+    while time.time() < deadline:
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            status, body, _ = SCENARIOS[name](user, rng, options)
+            error = status >= 400
+            locked = LOCK_MARKER in body
+        except OSError:
+            # 连接被拒绝、超时等网络错误
+            status, error, locked = 0, True, False
+        local.append((name, (time.perf_counter() - started) * 1000, status, error, locked))
+        if options['think_ms']:
+            time.sleep(rng.uniform(0.5, 1.5) * options['think_ms'] / 1000)
+    with lock:
+        samples.extend(local)
+
+
+def run_client_process(base_url, phones, password, mix, options, seed, start_at, go, results):
+    """客户端进程：登录分配到的用户，等待统一开始信号，在各自线程中闭环发送请求
+
+    结果通过 results 队列返回：('ready', 登录失败信息) 和 ('samples', 样本列表)。
+    所有进程都登录完成后，主进程写入开始时间 start_at 并设置 go。
+    """
+    users, failures = [], []
+    for phone in phones:
+        user = VirtualUser(base_url, phone, password)
+        try:
+            user.login()
+            users.append(user)
+        except (LoadError, OSError) as e:
+            failures.append(str(e))
+    results.put(('ready', failures))
+    go.wait()
+    start, deadline = start_at.value, start_at.value + options['duration']
+    samples, lock = [], threading.Lock()
+    threads = [threading.Thread(target=_run_user, args=(user, mix, options, seed * 1000 + index, start, deadline,
+                                                        samples, lock))
+               for index, user in enumerate(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(('samples', samples))
+
+
+def _percentile(values, percent):
+    """最近秩法百分位数（values 已排序）"""
+    return values[max(0, math.ceil(len(values) * percent / 100) - 1)] if values else 0.0
+
+
+def summarize(samples, duration):
+    """汇总一轮压测：吞吐、延迟百分位、错误率、锁冲突率、延迟直方图和各场景统计"""
+    latencies = sorted(sample[1] for sample in samples)
+    histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    for latency in latencies:
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if latency < bound), len(LATENCY_BUCKETS_MS))
+        histogram[index] += 1
+    scenarios = {}
+    for name in sorted({sample[0] for sample in samples}):
+        values = sorted(sample[1] for sample in samples if sample[0] == name)
+        scenarios[name] = {'requests': len(values), 'p50_ms': _percentile(values, 50),
+                           'p95_ms': _percentile(values, 95)}
+    total = len(samples)
+    return {
+        'requests': total,
+        'throughput': total / duration if duration else 0.0,
+        'p50_ms': _percentile(latencies, 50),
+        'p95_ms': _percentile(latencies, 95),
+        'p99_ms': _percentile(latencies, 99),
+        'error_rate': sum(1 for sample in samples if sample[3]) / total if total else 0.0,
+        'lock_rate': sum(1 for sample in samples if sample[4]) / total if total else 0.0,
+        'histogram': histogram,
+        'scenarios': scenarios,
+    }
+
+
+def format_histogram(histogram, width=40):
+    """把直方图画成文本条形图"""
+    labels = [f'< {bound} ms' for bound in LATENCY_BUCKETS_MS] + [f'>= {LATENCY_BUCKETS_MS[-1]} ms']
+    peak = max(histogram) or 1
+    total = sum(histogram) or 1
+    return [f'{label:>12} {count:>8} {count / total:>6.1%} {"#" * round(count / peak * width)}'
+            for label, count in zip(labels, histogram)]
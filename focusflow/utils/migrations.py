@@ -0,0 +1,68 @@
+import os
+import re
+import sqlite3
+
+# 迁移脚本目录：文件名形如 0001_xxx.sql，编号写入 PRAGMA user_version
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+_MIGRATION_FILE = re.compile(r'^(\d+)_.*\.sql$')
+
+
+def list_migrations():
+    """按编号返回 [(编号, 路径)]"""
+    migrations = []
+    for name in os.listdir(MIGRATIONS_DIR):
+        match = _MIGRATION_FILE.match(name)
+        if match:
+            migrations.append((int(match.group(1)), os.path.join(MIGRATIONS_DIR, name)))
+    return sorted(migrations)
+
+
+def _split_statements(script):
+    """把 SQL 脚本拆成单条语句（支持触发器等包含分号的语句）"""
+    statements, buffer = [], ''
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            if buffer.strip():
+                statements.append(buffer.strip())
+            buffer = ''
+    if buffer.strip() and not buffer.strip().startswith('--'):
+        statements.append(buffer.strip())
+    return statements
+
+
+def _schema_ready(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'"
+    ).fetchone() is not None
+
+
+def migrate(conn):
+    """执行尚未应用的迁移，返回本次应用的迁移数量
+
+    每个迁移在单独的 BEGIN IMMEDIATE 事务中执行，并在事务内重新读取版本号，
+    多个工作进程同时启动时只会有一个真正执行。尚未执行 schema.sql 的空库直接跳过。
+    """
+    if not _schema_ready(conn):
+        return 0
+    applied = 0
+    for number, path in list_migrations():
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= number:
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            statements = _split_statements(f.read())
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= number:
+                conn.rollback()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied += 1
+    return applied
@@ -0,0 +1,177 @@
+import re
+import sqlite3
+import time
+from collections import Counter
+
+from flask import before_render_template, current_app, g, request, template_rendered
+
+from utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# 归一化 SQL 形状：字面量替换成 ?，合并空白
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def statement_shape(sql):
+    """去掉参数值后的语句形状，用于识别同一条语句被反复执行（N+1）"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class RequestProfile:
+    """单个请求内的 SQL 与模板耗时统计
+
+    语句列表来自 sqlite3 的 trace 回调（已代入参数的完整 SQL），
+    每条语句的耗时由 ProfiledCursor 在执行和取结果时累加。
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = []  # [sql, 秒]
+        self.template_time = 0.0
+        self._template_started = None
+        self.marks = []  # [(名称, 说明)]，附加到 Server-Timing（如缓存是否命中）
+
+    def trace(self, sql):
+        self.statements.append([sql, 0.0])
+
+    @property
+    def current(self):
+        return self.statements[-1] if self.statements else None
+
+    @property
+    def query_count(self):
+        return len(self.statements)
+
+    @property
+    def db_time(self):
+        return sum(seconds for _, seconds in self.statements)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def attach(self, conn):
+        conn.profile = self
+        conn.set_trace_callback(self.trace)
+
+    def detach(self, conn):
+        conn.set_trace_callback(None)
+        conn.profile = None
+
+    def repeated_shapes(self, threshold):
+        """执行次数不少于 threshold 的语句形状 [(形状, 次数)]"""
+        counts = Counter(statement_shape(sql) for sql, _ in self.statements)
+        return [(shape, count) for shape, count in counts.most_common() if count >= threshold]
+
+    def server_timing(self):
+        """Server-Timing 响应头（毫秒）"""
+        header = (f'db;dur={self.db_time * 1000:.1f};desc="{self.query_count} queries", '
+                  f'template;dur={self.template_time * 1000:.1f}, '
+                  f'total;dur={self.elapsed * 1000:.1f}')
+        return ''.join([header] + [f', {name};desc="{description}"' for name, description in self.marks])
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """记录耗时的游标：执行和取结果的时间都累加到该游标执行的那条语句上"""
+
+    _record = None
+
+    def _timed(self, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            if self._record is not None:
+                self._record[1] += time.perf_counter() - started
+
+    def _execute(self, func, *args):
+        profile = getattr(self.connection, 'profile', None)
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            # trace 回调在执行时已经登记了这条语句
+            self._record = profile.current if profile is not None else None
+            if self._record is not None:
+                self._record[1] += time.perf_counter() - started
+
+    def execute(self, sql, parameters=()):
+        return self._execute(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._execute(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._execute(super().executescript, sql_script)
+
+    def fetchone(self):
+        return self._timed(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._timed(super().fetchall)
+
+    def __next__(self):
+        return self._timed(super().__next__)
+
+
+def mark(name, description):
+    """在当前请求的 Server-Timing 中附加一项说明；未开启统计时不做任何事"""
+    profile = g.get('sql_profile')
+    if profile is not None:
+        profile.marks.append((name, description))
+
+
+def _start_profile():
+    if current_app.config.get('SQL_INSTRUMENTATION'):
+        g.sql_profile = RequestProfile()
+
+
+def _add_server_timing(response):
+    profile = g.get('sql_profile')
+    if profile is not None:
+        response.headers['Server-Timing'] = profile.server_timing()
+    return response
+
+
+def _finish_profile(exception=None):
+    profile = g.pop('sql_profile', None)
+    if profile is None:
+        return
+    logger.debug('%s %s: %s 条查询, 数据库 %.1fms, 模板 %.1fms, 总计 %.1fms',
+                 request.method, request.path, profile.query_count, profile.db_time * 1000,
+                 profile.template_time * 1000, profile.elapsed * 1000)
+    threshold = current_app.config.get('SQL_N_PLUS_ONE_THRESHOLD')
+    if threshold:
+        for shape, count in profile.repeated_shapes(threshold):
+            logger.warning('%s %s 可能存在 N+1 查询，同一语句执行了 %s 次: %s',
+                           request.method, request.path, count, shape)
+
+
+def _template_started(sender, template, context, **extra):
+    profile = g.get('sql_profile')
+    if profile is not None:
+        profile._template_started = time.perf_counter()
+
+
+def _template_finished(sender, template, context, **extra):
+    profile = g.get('sql_profile')
+    if profile is not None and profile._template_started is not None:
+        profile.template_time += time.perf_counter() - profile._template_started
+        profile._template_started = None
+
+
+def init_app(app):
+    """注册请求级 SQL 统计（需在应用自己的 before_request 之前调用，才能把它们计入总耗时）"""
+    app.before_request(_start_profile)
+    app.after_request(_add_server_timing)
+    app.teardown_request(_finish_profile)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
@@ -0,0 +1,239 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, request, session
+
+from utils.log import get_logger
+
+logger = get_logger(__name__)
+
+
+def report_key(user_id, lang, start_date, end_date, data_version):
+    """缓存键：用户、语言、日期窗口和数据版本；数据有写入时版本变化，旧条目自然失效"""
+    return f'{user_id}:{lang}:{start_date}:{end_date}:{data_version}'
+
+
+def _user_prefix(user_id):
+    return f'{user_id}:'
+
+
+class MemoryBackend:
+    """进程内的 LRU + TTL 缓存，容量满时淘汰最久未使用的条目"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # 键 -> (过期时间, 值)
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        """返回 (值, 是否过期)；不存在时返回 (None, False)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            if entry[0] <= now:
+                del self._entries[key]
+                return None, True
+            self._entries.move_to_end(key)
+            return entry[1], False
+
+    def set(self, key, value, expires_at):
+        """写入条目，返回因容量限制淘汰的条目数"""
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def delete_user(self, user_id):
+        prefix = _user_prefix(user_id)
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """多个工作进程共享的缓存：值以 JSON 保存在单独的 SQLite 文件中（不占用业务库的写锁）
+
+    每个线程使用自己的连接；容量满时淘汰 last_used 最小的条目。
+    读取只加读锁：last_used 只在写入时设置（按最近写入淘汰），避免每次命中都争抢缓存文件的写锁。
+    """
+
+    def __init__(self, path, max_entries=512):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        # 建表使用临时连接：init_app 在导入时执行，预加载后 fork 的工作进程不能继承这里的连接
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS report_cache (
+                key TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                value TEXT NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_report_cache_user ON report_cache (user_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_report_cache_last_used ON report_cache (last_used)')
+        conn.commit()
+        conn.close()
+
+    def _connection(self):
+        # 与 ConnectionPool.acquire 相同：fork 后的子进程（包括继承了父进程线程局部变量的主线程）重新连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, now):
+        conn = self._connection()
+        row = conn.execute('SELECT expires_at, value FROM report_cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None, False
+        if row[0] <= now:
+            # 过期条目留给下一次 set() 统一清理，读取路径不加写锁
+            return None, True
+        return json.loads(row[1]), False
+
+    def set(self, key, value, expires_at):
+        conn = self._connection()
+        now = time.time()
+        conn.execute('''
+            INSERT OR REPLACE INTO report_cache (key, user_id, expires_at, last_used, value)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (key, int(key.split(':', 1)[0]), expires_at, now, json.dumps(value, ensure_ascii=False)))
+        conn.execute('DELETE FROM report_cache WHERE expires_at <= ?', (now,))
+        evicted = conn.execute('''
+            DELETE FROM report_cache WHERE key IN (
+                SELECT key FROM report_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,)).rowcount
+        conn.commit()
+        return evicted
+
+    def delete_user(self, user_id):
+        conn = self._connection()
+        deleted = conn.execute('DELETE FROM report_cache WHERE user_id = ?', (user_id,)).rowcount
+        conn.commit()
+        return deleted
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM report_cache').fetchone()[0]
+
+
+class ReportCache:
+    """计算结果缓存（报告页等），统计命中、未命中、过期、淘汰和失效次数
+
+    计数器只统计当前进程；使用共享后端时条目本身在各工作进程之间共享。
+    """
+
+    def __init__(self, backend, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.metrics = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0, 'errors': 0}
+
+    def _count(self, name, amount=1):
+        if amount:
+            with self._lock:
+                self.metrics[name] += amount
+
+    def get(self, key):
+        value, expired = self.backend.get(key, time.time())
+        self._count('expired', int(expired))
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value):
+        self._count('evictions', self.backend.set(key, value, time.time() + self.ttl))
+
+    def get_or_build(self, key, builder):
+        """命中时返回缓存的值，否则调用 builder() 生成并写入缓存；返回 (值, 是否命中)
+
+        缓存后端出错（例如共享缓存文件被锁住）时按未命中处理，直接返回 builder() 的结果。
+        """
+        try:
+            value = self.get(key)
+        except Exception as e:
+            self._count('errors')
+            logger.warning('读取报告缓存失败，直接计算: %s', e)
+            value = None
+        if value is not None:
+            return value, True
+        value = builder()
+        try:
+            self.set(key, value)
+        except Exception as e:
+            self._count('errors')
+            logger.warning('写入报告缓存失败: %s', e)
+        return value, False
+
+    def invalidate_user(self, user_id):
+        """删除某个用户的全部条目（该用户的数据有写入时调用）"""
+        removed = self.backend.delete_user(user_id)
+        self._count('invalidations', removed)
+        return removed
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.metrics)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['entries'] = len(self.backend)
+        return stats
+
+
+def create_cache(config):
+    """按配置创建缓存；REPORT_CACHE_BACKEND 为 none 时返回 None（不缓存）"""
+    backend = config.get('REPORT_CACHE_BACKEND', 'memory')
+    size = config.get('REPORT_CACHE_SIZE', 512)
+    if backend == 'none':
+        return None
+    if backend == 'sqlite':
+        return ReportCache(SQLiteBackend(config['REPORT_CACHE_PATH'], size), config.get('REPORT_CACHE_TTL', 300))
+    if backend != 'memory':
+        raise ValueError(f'Unknown REPORT_CACHE_BACKEND: {backend}')
+    return ReportCache(MemoryBackend(size), config.get('REPORT_CACHE_TTL', 300))
+
+
+_SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+def _invalidate_after_write(response):
+    # 写请求成功后清除该用户的缓存条目（键中的数据版本已保证不会读到旧数据，这里及时释放空间）
+    if request.method not in _SAFE_METHODS and response.status_code < 400 and 'user_id' in session:
+        cache = current_app.extensions.get('report_cache')
+        if cache is not None:
+            # 写入已经提交，清理失败不影响响应
+            try:
+                cache.invalidate_user(session['user_id'])
+            except Exception as e:
+                logger.warning('清除用户 %s 的报告缓存失败: %s', session['user_id'], e)
+    return response
+
+
+def init_app(app):
+    cache = create_cache(app.config)
+    app.extensions['report_cache'] = cache
+    app.after_request(_invalidate_after_write)
+    if cache is not None:
+        logger.info('报告缓存: %s 后端，容量 %s，有效期 %s 秒', app.config.get('REPORT_CACHE_BACKEND', 'memory'),
+                    app.config.get('REPORT_CACHE_SIZE', 512), cache.ttl)
+    return cache
@@ -0,0 +1,262 @@
+import math
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask_bcrypt import generate_password_hash
+
+from database import DailyStatsDB, StatsDB
+from utils.db import connect
+from utils.log import get_logger
+from utils.migrations import migrate
+
+logger = get_logger(__name__)
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schema.sql')
+
+# 生成的用户手机号为 SEED_PHONE_PREFIX + 8 位用户 ID，密码相同，便于压测脚本登录
+SEED_PHONE_PREFIX = '139'
+DEFAULT_PASSWORD = 'focusflow123'
+
+FIRST_NAMES = ['Wei', 'Fang', 'Min', 'Jing', 'Lei', 'Yan', 'Hao', 'Xin', 'Anna', 'Lucas', 'Mia', 'Noah', 'Sofia', 'Arjun']
+LAST_NAMES = ['Wang', 'Li', 'Zhang', 'Liu', 'Chen', 'Yang', 'Smith', 'Garcia', 'Martin', 'Sato', 'Kumar', 'Dubois']
+SCHOOLS = ['North High School', 'City University', 'Riverside Middle School', 'Tech Institute', 'Lakeside Academy']
+COURSES = ['Mathematics', 'Physics', 'Chemistry', 'Biology', 'History', 'English', 'Computer Science', 'Economics']
+TASK_VERBS = ['Review', 'Finish', 'Read', 'Practice', 'Summarize', 'Prepare', 'Revise', 'Write']
+TASK_OBJECTS = ['chapter', 'problem set', 'lab report', 'essay draft', 'flashcards', 'lecture notes', 'past paper']
+TAGS = ['exam', 'homework', 'reading', 'project', 'review', 'group', 'urgent', 'lab', 'essay', 'practice']
+SUBTASK_TITLES = ['Outline', 'First pass', 'Check answers', 'Take notes', 'Ask teacher', 'Final review']
+ASSESSMENT_TYPES = [('quiz', 0.5), ('homework', 0.5), ('midterm', 1.5), ('final', 2.0)]
+
+# 加权取值：(取值, 权重)
+PRIORITIES = [('high', 2), ('medium', 5), ('low', 3)]
+REPEATS = [('', 17), ('daily', 1), ('weekly', 2)]
+ESTIMATES = [(30, 3), (45, 2), (60, 4), (90, 2), (120, 1)]
+SESSION_MINUTES = [(25, 10), (50, 3), (15, 2), (45, 2), (90, 1)]
+# 专注开始的小时分布：午后和晚间是高峰
+SESSION_HOURS = [(7, 1), (8, 2), (9, 3), (10, 3), (11, 2), (13, 2), (14, 3), (15, 3), (16, 3), (17, 2),
+                 (19, 5), (20, 6), (21, 5), (22, 3), (23, 1)]
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def _poisson(rng, mean):
+    """泊松分布取样（均值较大时用正态近似）"""
+    if mean <= 0:
+        return 0
+    if mean > 30:
+        return max(0, round(rng.gauss(mean, math.sqrt(mean))))
+    limit, count, product = math.exp(-mean), 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def _stamp(day, hour=0, minute=0, second=0):
+    return datetime(day.year, day.month, day.day, hour, minute, second).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class SeedProfile:
+    """生成数据的分布参数；每个用户再乘以一个对数正态的活跃度系数（少数重度用户、多数轻度用户）"""
+
+    def __init__(self, months=6, tasks_per_week=8.0, sessions_per_day=2.5, checkin_rate=0.7,
+                 max_tags=3, max_subtasks=4, grades_per_month=3.0, activity_spread=0.6):
+        self.months = months
+        self.tasks_per_week = tasks_per_week
+        self.sessions_per_day = sessions_per_day
+        self.checkin_rate = checkin_rate
+        self.max_tags = max_tags
+        self.max_subtasks = max_subtasks
+        self.grades_per_month = grades_per_month
+        self.activity_spread = activity_spread
+
+    @property
+    def days(self):
+        return max(1, round(self.months * 30.4))
+
+
+class _Rows:
+    """按表缓存待写入的行，以 executemany 批量写入"""
+
+    INSERTS = {
+        'users': '''INSERT INTO users (id, phone, first_name, last_name, email, gender, birth_date, school,
+                                       education_level, grade, password, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        'tasks': '''INSERT INTO tasks (id, user_id, title, description, course, priority, status, due_date,
+                                       repeat, estimated_time, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        'subtasks': 'INSERT INTO subtasks (task_id, title, completed) VALUES (?, ?, ?)',
+        'task_tags': 'INSERT INTO task_tags (task_id, tag) VALUES (?, ?)',
+        'focus_sessions': '''INSERT INTO focus_sessions (user_id, task_id, duration, start_time, end_time)
+                             VALUES (?, ?, ?, ?, ?)''',
+        'checkins': 'INSERT INTO checkins (user_id, date, created_at) VALUES (?, ?, ?)',
+        'grades': '''INSERT INTO grades (user_id, course, assessment_type, score, weight, date)
+                     VALUES (?, ?, ?, ?, ?, ?)''',
+    }
+
+    def __init__(self, next_task_id):
+        self.pending = {table: [] for table in self.INSERTS}
+        self.counts = dict.fromkeys(self.INSERTS, 0)
+        self.next_task_id = next_task_id  # 任务 ID 预先分配，标签、子任务和专注记录才能引用
+
+    def add(self, table, row):
+        self.pending[table].append(row)
+
+    def flush(self, conn):
+        # 按外键依赖顺序写入（字典顺序即 users -> tasks -> 子表）
+        for table, rows in self.pending.items():
+            if rows:
+                conn.executemany(self.INSERTS[table], rows)
+                self.counts[table] += len(rows)
+                rows.clear()
+
+
+def _generate_user(rng, rows, user_id, profile, start_day, password_hash):
+    """生成一个用户及其全部活动数据"""
+    activity = rng.lognormvariate(0, profile.activity_spread)
+    level = rng.choice('1234')
+    first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    # 用户在前三分之一的时间内陆续注册
+    joined = start_day + timedelta(days=rng.randrange(max(1, profile.days // 3)))
+    rows.add('users', (
+        user_id, f'{SEED_PHONE_PREFIX}{user_id:08d}', first_name, last_name, f'seed{user_id}@example.com',
+        rng.choice(['male', 'female', None]), f'{rng.randint(1998, 2014)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+        rng.choice(SCHOOLS), level, rng.choice('1234'), password_hash, _stamp(joined, 9)))
+
+    courses = rng.sample(COURSES, rng.randint(3, 6))
+    end_day = start_day + timedelta(days=profile.days - 1)
+    # 签到是一条马尔可夫链：昨天签到过的用户今天更可能继续签到，平稳分布的签到率等于 checkin_rate
+    rate = min(profile.checkin_rate, 1.0)
+    keep = min(0.95, rate + 0.2)
+    resume = 1.0 if rate >= 1 else min(1.0, rate * (1 - keep) / (1 - rate))
+    checked_in = False
+    task_ids = []
+    day = joined
+    while day <= end_day:
+        checked_in = rng.random() < (keep if checked_in else resume)
+        if checked_in:
+            rows.add('checkins', (user_id, day.strftime('%Y-%m-%d'), _stamp(day, rng.randint(7, 22), rng.randrange(60))))
+
+        for _ in range(_poisson(rng, profile.tasks_per_week / 7 * activity)):
+            created = _stamp(day, rng.randint(7, 22), rng.randrange(60), rng.randrange(60))
+            due_day = day + timedelta(days=rng.randint(0, 14))
+            if due_day <= end_day:
+                status = _weighted(rng, [('completed', 8), ('in_progress', 1), ('pending', 1)])
+            else:
+                status = _weighted(rng, [('completed', 2), ('in_progress', 3), ('pending', 5)])
+            updated = created
+            if status == 'completed':
+                done_day = min(day + timedelta(days=rng.randint(0, (due_day - day).days)), end_day)
+                updated = max(created, _stamp(done_day, rng.randint(8, 23), rng.randrange(60), rng.randrange(60)))
+            task_id = rows.next_task_id
+            rows.next_task_id += 1
+            task_ids.append(task_id)
+            course = rng.choice(courses)
+            rows.add('tasks', (
+                task_id, user_id, f'{rng.choice(TASK_VERBS)} {course} {rng.choice(TASK_OBJECTS)}',
+                rng.choice(['', f'Notes for {course}']), course, _weighted(rng, PRIORITIES), status,
+                due_day.strftime('%Y-%m-%d'), _weighted(rng, REPEATS), _weighted(rng, ESTIMATES), created, updated))
+            for tag in rng.sample(TAGS, rng.randint(0, profile.max_tags)):
+                rows.add('task_tags', (task_id, tag))
+            for title in rng.sample(SUBTASK_TITLES, rng.randint(0, min(profile.max_subtasks, len(SUBTASK_TITLES)))):
+                rows.add('subtasks', (task_id, title, int(status == 'completed' or rng.random() < 0.3)))
+
+        # 没签到的日子也偶尔专注
+        sessions_mean = profile.sessions_per_day * activity * (1.0 if checked_in else 0.15)
+        for _ in range(_poisson(rng, sessions_mean)):
+            minutes = _weighted(rng, SESSION_MINUTES)
+            started = datetime(day.year, day.month, day.day, _weighted(rng, SESSION_HOURS), rng.randrange(60))
+            task_id = rng.choice(task_ids[-20:]) if task_ids and rng.random() < 0.7 else None
+            rows.add('focus_sessions', (user_id, task_id, minutes, started.strftime('%Y-%m-%d %H:%M:%S'),
+                                        (started + timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M:%S')))
+
+        if rng.random() < profile.grades_per_month / 30.4:
+            assessment, weight = rng.choice(ASSESSMENT_TYPES)
+            score = round(min(100.0, max(0.0, rng.gauss(78, 12))), 1)
+            rows.add('grades', (user_id, rng.choice(courses), assessment, score, weight, day.strftime('%Y-%m-%d')))
+        day += timedelta(days=1)
+
+
+def _ensure_schema(conn):
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'").fetchone() is None:
+        with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
+            conn.executescript(f.read())
+    migrate(conn)
+
+
+def generate(conn, users, profile, seed=42, end_date=None, password_hash='x', batch_users=200):
+    """向 conn 写入 users 个模拟用户及其 profile.months 个月的数据，返回各表写入的行数
+
+    相同的 seed、end_date 和参数在空库上生成完全相同的数据。用户和任务 ID 从现有最大值之后连续分配；
+    每 batch_users 个用户一个事务，最后重算 user_stats 和 daily_user_stats。
+    """
+    _ensure_schema(conn)
+    rng = random.Random(seed)
+    end_day = end_date or datetime.now().date()
+    start_day = end_day - timedelta(days=profile.days - 1)
+    first_user_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM users').fetchone()[0]
+    rows = _Rows(conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM tasks').fetchone()[0])
+    for offset in range(users):
+        _generate_user(rng, rows, first_user_id + offset, profile, start_day, password_hash)
+        if (offset + 1) % batch_users == 0:
+            rows.flush(conn)
+            conn.commit()
+    rows.flush(conn)
+    StatsDB.rebuild(None, conn)
+    DailyStatsDB.rebuild(None, conn)
+    conn.commit()
+    conn.execute('ANALYZE')
+    return rows.counts
+
+
+@click.command('seed')
+@click.option('--users', default=100, show_default=True, help='Users to generate.')
+@click.option('--months', default=6.0, show_default=True, help='Months of history per user.')
+@click.option('--seed', 'seed', default=42, show_default=True, help='Random seed (same seed, same data).')
+@click.option('--end-date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Last day of generated activity (default: today).')
+@click.option('--tasks-per-week', default=8.0, show_default=True, help='Mean tasks created per user per week.')
+@click.option('--sessions-per-day', default=2.5, show_default=True, help='Mean focus sessions on check-in days.')
+@click.option('--checkin-rate', default=0.7, show_default=True, help='Share of days with a check-in.')
+@click.option('--max-tags', default=3, show_default=True, help='Tags per task are uniform in [0, max].')
+@click.option('--max-subtasks', default=4, show_default=True, help='Subtasks per task are uniform in [0, max].')
+@click.option('--grades-per-month', default=3.0, show_default=True)
+@click.option('--activity-spread', default=0.6, show_default=True,
+              help='Sigma of the per-user log-normal activity factor (0 = identical users).')
+@click.option('--batch-users', default=200, show_default=True, help='Users per transaction.')
+@click.option('--password', default=DEFAULT_PASSWORD, show_default=True, help='Password of every generated user.')
+@click.option('--database', type=click.Path(dir_okay=False), default=None,
+              help='Target SQLite file (default: the configured DATABASE); created if missing.')
+@with_appcontext
+def seed_command(users, months, seed, end_date, tasks_per_week, sessions_per_day, checkin_rate, max_tags,
+                 max_subtasks, grades_per_month, activity_spread, batch_users, password, database):
+    """Generate a deterministic synthetic dataset for load and scale testing."""
+    database = database or current_app.config['DATABASE']
+    profile = SeedProfile(months, tasks_per_week, sessions_per_day, checkin_rate, max_tags, max_subtasks,
+                          grades_per_month, activity_spread)
+    conn = connect(database, current_app.config.get('SQLITE_PRAGMAS'))
+    conn.row_factory = sqlite3.Row
+    started = time.perf_counter()
+    try:
+        # 所有用户共用一个密码哈希（bcrypt 很慢，逐个计算会占满生成时间）
+        password_hash = generate_password_hash(password).decode('utf-8')
+        counts = generate(conn, users, profile, seed, end_date.date() if end_date else None, password_hash,
+                          batch_users)
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    for table, count in counts.items():
+        click.echo(f'{table:<16}{count:>10}')
+    click.echo(f'{total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s) -> {database}')
+    click.echo(f'Users log in with phone {SEED_PHONE_PREFIX} + 8-digit user id and password {password!r}.')
+    logger.info('生成模拟数据: %s 个用户, %s 行, 耗时 %.1f 秒', counts['users'], total, elapsed)